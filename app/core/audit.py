@@ -0,0 +1,343 @@
+import functools
+import logging
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Frames in these modules are plumbing; the call site is whoever called into them
+PLUMBING = ("app.core.audit", "app.core.db", "app.core.resilience", "app.core.singleflight")
+# Flagged sites written to the log per periodic report
+REPORT_TOP = 10
+# Response keys that mark a JSON object as one returned document
+ITEM_KEYS = ("id", "uid")
+# Response bodies parsed to count documents
+COUNTED_TYPES = ("application/json", "application/x-ndjson")
+
+@dataclass
+class _Request:
+    """Reads and writes of one sampled request, shared with its threadpool work via the context."""
+    sites: Set[Tuple[str, str]] = field(default_factory=set)
+    read: Set[str] = field(default_factory=set)
+    written: Set[str] = field(default_factory=set)
+
+_SKIP = _Request()
+# Set per request by QueryAuditMiddleware: a _Request, _SKIP when not sampled, None outside requests
+_current: ContextVar[Optional[_Request]] = ContextVar("query_audit", default=None)
+
+@dataclass
+class _Site:
+    calls: int = 0
+    # Documents read in total, and by requests (what `returned` is measured against)
+    read: int = 0
+    request_read: int = 0
+    returned: int = 0
+    wall_ms: float = 0.0
+    max_ms: float = 0.0
+    # Reads of a document this request already wrote / already read
+    rereads: int = 0
+    repeats: int = 0
+
+def _call_site() -> str:
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("app.") and not module.startswith(PLUMBING):
+            return f"{module}:{frame.f_code.co_qualname}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "<external>"
+
+def _filter_shape(f) -> str:
+    if "composite_filter" in f:
+        op = " AND " if f.composite_filter.op.name == "AND" else " OR "
+        return op.join(_filter_shape(part) for part in f.composite_filter.filters)
+    if "unary_filter" in f:
+        return f"{f.unary_filter.field.field_path} {f.unary_filter.op.name}"
+    return f"{f.field_filter.field.field_path} {f.field_filter.op.name} ?"
+
+def query_shape(query) -> str:
+    """Collection, filter fields and operators (values elided), order and limit of a query."""
+    try:
+        pb = query._to_protobuf()
+    except Exception:
+        return type(query).__name__
+    source = pb.from_[0]
+    parts = [("group " if source.all_descendants else "") + source.collection_id]
+    if "where" in pb:
+        parts.append("where " + _filter_shape(pb.where))
+    if pb.order_by:
+        parts.append("order " + ", ".join(f"{o.field.field_path} {o.direction.name}" for o in pb.order_by))
+    if "limit" in pb:
+        parts.append(f"limit {pb.limit}")
+    return " ".join(parts)
+
+def _collection(ref) -> str:
+    return ref.parent.id
+
+def returned_items(body: bytes, content_type: str) -> int:
+    """Documents in a response body: objects carrying an id (at least 1 for a non-empty body)."""
+    if not body:
+        return 0
+    if content_type.startswith("application/x-ndjson"):
+        return body.count(b"\n") or 1
+    if not content_type.startswith("application/json"):
+        return 1
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        return 1
+    count, stack = 0, [payload]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, dict):
+            count += any(key in value for key in ITEM_KEYS)
+            stack.extend(value.values())
+    return max(count, 1)
+
+class QueryAudit:
+    """
+    Read-amplification audit for Firestore. Once installed, every query stream,
+    document get and get_all is timed and attributed to its call site (the first
+    app frame outside the Firestore plumbing) and query shape. Per sampled request,
+    the documents each site read are weighed against the documents the response
+    returned, so a search that streams 1000 docs to return 3 stands out, as do
+    reads of documents the same request just wrote or already read.
+
+    A site serving several requests is charged each request's full response, so
+    the ratio is an upper bound on how much of its read was wasted. Reads run on
+    the shared executor (app.core.db) happen outside the request's context and
+    only count towards `read`.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sites: Dict[Tuple[str, str], _Site] = {}
+        self._since = datetime.utcnow()
+        self._installed = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.fraction = 1.0
+        self.threshold = 10.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._installed
+
+    def install(self, fraction: float = 1.0, threshold: float = 10.0, query_cls=None, document_cls=None,
+                client_cls=None, batch_cls=None):
+        """Patch the Firestore client classes (the real ones unless given) in this process."""
+        if self._installed:
+            return
+        if query_cls is None:
+            from google.cloud.firestore_v1.base_batch import BaseBatch
+            from google.cloud.firestore_v1.client import Client
+            from google.cloud.firestore_v1.document import DocumentReference
+            from google.cloud.firestore_v1.query import Query
+            query_cls, document_cls, client_cls, batch_cls = Query, DocumentReference, Client, BaseBatch
+        self.fraction, self.threshold = fraction, threshold
+        query_cls.stream = self._wrap_stream(query_cls.stream)
+        document_cls.get = self._wrap_get(document_cls.get)
+        client_cls.get_all = self._wrap_get_all(client_cls.get_all)
+        for name in ("create", "set", "update", "delete"):
+            setattr(batch_cls, name, self._wrap_write(getattr(batch_cls, name)))
+        self._installed = True
+
+    # --- per request ---
+
+    def begin(self):
+        """Start auditing the current request (sampled); returns the token for end()."""
+        sampled = self.fraction >= 1 or random.random() < self.fraction
+        return _current.set(_Request() if sampled else _SKIP)
+
+    def end(self, token, returned: int):
+        request = _current.get()
+        _current.reset(token)
+        if request is None or request is _SKIP:
+            return
+        with self._lock:
+            for key in request.sites:
+                stats = self._sites.get(key)
+                if stats is not None:
+                    stats.returned += returned
+
+    # --- wrappers ---
+
+    def _record(self, request: Optional[_Request], site: str, shape: str, read: int, started: float, paths=()):
+        elapsed = (time.perf_counter() - started) * 1000
+        key = (site, shape)
+        with self._lock:
+            stats = self._sites.get(key)
+            if stats is None:
+                stats = self._sites[key] = _Site()
+            stats.calls += 1
+            stats.read += read
+            stats.wall_ms += elapsed
+            stats.max_ms = max(stats.max_ms, elapsed)
+            if request is not None:
+                request.sites.add(key)
+                stats.request_read += read
+                for path in paths:
+                    if path in request.written:
+                        stats.rereads += 1
+                    elif path in request.read:
+                        stats.repeats += 1
+                    request.read.add(path)
+
+    def _wrap_stream(self, stream):
+        audit = self
+
+        @functools.wraps(stream)
+        def audited_stream(self, *args, **kwargs):
+            request = _current.get()
+            if request is _SKIP:
+                return stream(self, *args, **kwargs)
+            site, shape, started = _call_site(), query_shape(self), time.perf_counter()
+
+            def counted():
+                # A query bills at least one read even when it matches nothing
+                read = 0
+                try:
+                    for snap in stream(self, *args, **kwargs):
+                        read += 1
+                        yield snap
+                finally:
+                    audit._record(request, site, shape, max(read, 1), started)
+            return counted()
+        return audited_stream
+
+    def _wrap_get(self, get):
+        audit = self
+
+        @functools.wraps(get)
+        def audited_get(self, *args, **kwargs):
+            request = _current.get()
+            if request is _SKIP:
+                return get(self, *args, **kwargs)
+            site, started = _call_site(), time.perf_counter()
+            snapshot = get(self, *args, **kwargs)
+            audit._record(request, site, f"get {_collection(self)}", 1, started, (self.path,))
+            return snapshot
+        return audited_get
+
+    def _wrap_get_all(self, get_all):
+        audit = self
+
+        @functools.wraps(get_all)
+        def audited_get_all(self, references, *args, **kwargs):
+            request = _current.get()
+            if request is _SKIP:
+                return get_all(self, references, *args, **kwargs)
+            references = list(references)
+            site, started = _call_site(), time.perf_counter()
+            collections = sorted({_collection(ref) for ref in references})
+            shape = f"get_all {','.join(collections)}"
+
+            def counted():
+                try:
+                    yield from get_all(self, references, *args, **kwargs)
+                finally:
+                    audit._record(request, site, shape, len(references), started, [ref.path for ref in references])
+            return counted()
+        return audited_get_all
+
+    @staticmethod
+    def _wrap_write(write):
+        @functools.wraps(write)
+        def audited_write(self, reference, *args, **kwargs):
+            request = _current.get()
+            if request is not None and request is not _SKIP:
+                request.written.add(reference.path)
+            return write(self, reference, *args, **kwargs)
+        return audited_write
+
+    # --- reporting ---
+
+    def report(self, flagged_only: bool = False) -> dict:
+        """Per (call site, query shape) totals, heaviest readers first."""
+        with self._lock:
+            items = list(self._sites.items())
+            since = self._since
+        sites = []
+        for (site, shape), stats in items:
+            ratio = stats.request_read / max(stats.returned, 1) if stats.request_read else None
+            flagged = ratio is not None and ratio > self.threshold
+            if flagged_only and not flagged:
+                continue
+            sites.append({
+                "site": site, "shape": shape, "calls": stats.calls,
+                "read": stats.read, "request_read": stats.request_read, "returned": stats.returned,
+                "ratio": round(ratio, 1) if ratio is not None else None, "flagged": flagged,
+                "wall_ms": round(stats.wall_ms, 1), "avg_ms": round(stats.wall_ms / stats.calls, 2),
+                "max_ms": round(stats.max_ms, 1), "rereads": stats.rereads, "repeats": stats.repeats,
+            })
+        sites.sort(key=lambda s: s["request_read"] or s["read"], reverse=True)
+        return {"enabled": self.enabled, "threshold": self.threshold, "fraction": self.fraction,
+                "since": since, "sites": sites}
+
+    def reset(self):
+        with self._lock:
+            self._sites = {}
+            self._since = datetime.utcnow()
+
+    def start_reporter(self, interval: float):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._report_loop, args=(interval,), name="query-audit", daemon=True)
+        self._thread.start()
+
+    def stop_reporter(self):
+        self._stop.set()
+        self._thread = None
+
+    def _report_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            flagged = self.report(flagged_only=True)["sites"]
+            for site in flagged[:REPORT_TOP]:
+                logger.warning(
+                    "Read amplification %.1fx at %s [%s]: %d read for %d returned over %d calls, %.2f ms avg, %d rereads, %d repeats",
+                    site["ratio"], site["site"], site["shape"], site["request_read"], site["returned"],
+                    site["calls"], site["avg_ms"], site["rereads"], site["repeats"],
+                )
+            if len(flagged) > REPORT_TOP:
+                logger.warning("%d more flagged call sites, see GET /admin/query-audit", len(flagged) - REPORT_TOP)
+
+query_audit = QueryAudit()
+
+class QueryAuditMiddleware:
+    """Scopes each sampled HTTP request for the audit and counts the documents its response returned."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not query_audit.enabled:
+            await self.app(scope, receive, send)
+            return
+        token = query_audit.begin()
+        status, content_type, chunks = 0, "", []
+
+        async def capture(message):
+            nonlocal status, content_type
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"").decode("latin-1")
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                # Only JSON is parsed; for anything else (images) whether there was a body is enough
+                chunks.append(body if content_type.startswith(COUNTED_TYPES) else body[:1])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            returned = returned_items(b"".join(chunks), content_type) if 200 <= status < 300 else 0
+            query_audit.end(token, returned)
@@ -0,0 +1,59 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+from app.core.config import settings
+
+class ResponseCache:
+    """
+    Small LRU of already-encoded response bodies (and their ETags) with a TTL.
+    Sync endpoints run in the threadpool, so every access goes through a lock.
+    Invalidation is process-local; the TTL bounds staleness across workers.
+    """
+    def __init__(self, maxsize: int = 256, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every clear() so a slow producer can't store a pre-write result
+        self._generation = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, body = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return body
+
+    def set(self, key: Hashable, body: Any, generation: Optional[int] = None):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, body)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key: Hashable, produce: Callable[[], Any]) -> Any:
+        body = self.get(key)
+        if body is not None:
+            return body
+        generation = self._generation
+        body = produce()
+        self.set(key, body, generation)
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+# Encoded listing feeds, keyed by filter set. Cleared on every listing write.
+feed_cache = ResponseCache(maxsize=settings.RESPONSE_CACHE_SIZE, ttl=settings.RESPONSE_CACHE_TTL)
@@ -1,4 +1,5 @@
 import os
+import logging
 from dotenv import load_dotenv
 import firebase_admin
 from firebase_admin import credentials, firestore
@@ -6,6 +7,8 @@ from firebase_admin import credentials, firestore
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class Settings:
     PROJECT_NAME = os.getenv("PROJECT_NAME", "HSD Proje API")
     API_V1_STR = "/api/v1"
@@ -21,46 +24,121 @@ class Settings:
     FIREBASE_AUTH_PROVIDER_CERT_URL = os.getenv("FIREBASE_AUTH_PROVIDER_CERT_URL")
     FIREBASE_CLIENT_CERT_URL = os.getenv("FIREBASE_CLIENT_CERT_URL")
 
+    # Encoded list responses (seconds / entries). TTL 0 disables the cache.
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+    # How long startup waits for the Firestore warm-up before accepting traffic anyway
+    WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "20"))
+
+    # Admission control: per-caller token bucket (tokens/second, bucket size)
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", "5"))
+    RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "40"))
+    # "memory" (per worker) or "sqlite" (shared by all workers on the host)
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "/tmp/hsd_ratelimit.sqlite3")
+    # Requests in flight per worker before shedding with 503 (0 disables)
+    MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "100"))
+    # Bearer token for scraping /metrics; without one only admin users may read it
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+    # Shards per facet counter doc; each adds ~1 write/s of headroom per dimension
+    FACET_SHARDS = int(os.getenv("FACET_SHARDS", "8"))
+
+    # Sub-requests per POST /batch
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "20"))
+
+    # Delta sync: how long deletions are remembered, and the window re-read on every
+    # sync to cover clock skew between workers
+    TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+    SYNC_OVERLAP_SECONDS = float(os.getenv("SYNC_OVERLAP_SECONDS", "5"))
+
+    # New chats append messages to bucket docs instead of one doc per message
+    # (existing chats: python -m app.jobs.bucket_messages). A bucket closes after
+    # this many messages or hours.
+    CHAT_MESSAGE_BUCKETS = os.getenv("CHAT_MESSAGE_BUCKETS", "false").lower() == "true"
+    CHAT_BUCKET_SIZE = int(os.getenv("CHAT_BUCKET_SIZE", "100"))
+    CHAT_BUCKET_HOURS = float(os.getenv("CHAT_BUCKET_HOURS", "24"))
+
+    # Firestore read policy (app/core/resilience.py): deadline per document get and per
+    # query (retries included), attempts per idempotent read, and retries + hedges
+    # allowed as a share of first attempts
+    FIRESTORE_GET_TIMEOUT = float(os.getenv("FIRESTORE_GET_TIMEOUT", "2"))
+    FIRESTORE_QUERY_TIMEOUT = float(os.getenv("FIRESTORE_QUERY_TIMEOUT", "5"))
+    FIRESTORE_READ_ATTEMPTS = int(os.getenv("FIRESTORE_READ_ATTEMPTS", "3"))
+    FIRESTORE_RETRY_BUDGET = float(os.getenv("FIRESTORE_RETRY_BUDGET", "0.1"))
+    # Deadline per write RPC (commit, set, update, ...). Writes are not retried:
+    # a commit that timed out may still have applied
+    FIRESTORE_WRITE_TIMEOUT = float(os.getenv("FIRESTORE_WRITE_TIMEOUT", "5"))
+    # Send a second read when the first runs past the operation's recent p95
+    FIRESTORE_HEDGE = os.getenv("FIRESTORE_HEDGE", "false").lower() == "true"
+    # Per-operation circuit breaker: opens at this error rate over the window (given
+    # enough calls) and probes again after the cooldown
+    FIRESTORE_BREAKER_ERROR_RATE = float(os.getenv("FIRESTORE_BREAKER_ERROR_RATE", "0.5"))
+    FIRESTORE_BREAKER_MIN_CALLS = int(os.getenv("FIRESTORE_BREAKER_MIN_CALLS", "20"))
+    FIRESTORE_BREAKER_WINDOW = float(os.getenv("FIRESTORE_BREAKER_WINDOW", "10"))
+    FIRESTORE_BREAKER_COOLDOWN = float(os.getenv("FIRESTORE_BREAKER_COOLDOWN", "5"))
+
+    # Read-amplification audit (app/core/audit.py): share of requests audited, docs read per
+    # doc returned past which a call site is flagged, and how often flagged sites are logged
+    QUERY_AUDIT = os.getenv("QUERY_AUDIT", "false").lower() == "true"
+    QUERY_AUDIT_FRACTION = float(os.getenv("QUERY_AUDIT_FRACTION", "1.0"))
+    QUERY_AUDIT_RATIO = float(os.getenv("QUERY_AUDIT_RATIO", "10"))
+    QUERY_AUDIT_REPORT_SECONDS = float(os.getenv("QUERY_AUDIT_REPORT_SECONDS", "300"))
+
+    # Keep an in-memory copy of the listings collection in each worker (on_snapshot listener)
+    LISTING_REPLICA = os.getenv("LISTING_REPLICA", "false").lower() == "true"
+
+    # Worker processes for image transcoding
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+    # Prefix for image URLs in responses, e.g. https://hsd-proje.onrender.com (empty = relative)
+    PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
+    # Multipart image uploads: files per request, bytes per file, bytes per request
+    UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "10"))
+    UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(15 * 1024 * 1024)))
+    UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(60 * 1024 * 1024)))
+
 settings = Settings()
 
 def init_firebase():
-    """Initializes Firebase App using Environment Variables."""
-    try:
-        # Eğer uygulama zaten başlatılmadıysa
-        if not firebase_admin._apps:
-            
-            # En kritik değişkenlerin varlığını kontrol edelim
-            if settings.FIREBASE_PRIVATE_KEY and settings.FIREBASE_CLIENT_EMAIL:
-                
-                # .env'den gelen string içindeki kaçış karakterlerini (\n) gerçek satır sonuna çeviriyoruz
-                # Bu adım çok önemlidir, yoksa "Invalid Private Key" hatası alırsınız.
-                private_key = settings.FIREBASE_PRIVATE_KEY.replace('\\n', '\n')
-                # JSON dosyası yerine bu sözlük yapısını kullanıyoruz
-                cred_dict = {
-                    "type": "service_account",
-                    "project_id": settings.FIREBASE_PROJECT_ID,
-                    "private_key_id": settings.FIREBASE_PRIVATE_KEY_ID,
-                    "private_key": private_key,
-                    "client_email": settings.FIREBASE_CLIENT_EMAIL,
-                    "client_id": settings.FIREBASE_CLIENT_ID,
-                    "auth_uri": settings.FIREBASE_AUTH_URI,
-                    "token_uri": settings.FIREBASE_TOKEN_URI,
-                    "auth_provider_x509_cert_url": settings.FIREBASE_AUTH_PROVIDER_CERT_URL,
-                    "client_x509_cert_url": settings.FIREBASE_CLIENT_CERT_URL
-                }
-
-                cred = credentials.Certificate(cred_dict)
-                firebase_admin.initialize_app(cred)
-                print("Firebase initialized from Environment Variables successfully.")
-            
-            else:
-                # Env değişkenleri yoksa fallback olarak default (Google Cloud ortamı) dene
-                print("Firebase Env variables not found, trying default credentials...")
-                firebase_admin.initialize_app()
-                print("Firebase initialized from default credentials.")
-
-    except Exception as e:
-        print(f"Error initializing Firebase: {e}")
+    """
+    Initializes Firebase App using Environment Variables.
+    Raises on failure; callers decide whether that is fatal.
+    """
+    # Eğer uygulama zaten başlatılmadıysa
+    if firebase_admin._apps:
+        return
+
+    # En kritik değişkenlerin varlığını kontrol edelim
+    if settings.FIREBASE_PRIVATE_KEY and settings.FIREBASE_CLIENT_EMAIL:
+        
+        # .env'den gelen string içindeki kaçış karakterlerini (\n) gerçek satır sonuna çeviriyoruz
+        # Bu adım çok önemlidir, yoksa "Invalid Private Key" hatası alırsınız.
+        private_key = settings.FIREBASE_PRIVATE_KEY.replace('\\n', '\n')
+        # JSON dosyası yerine bu sözlük yapısını kullanıyoruz
+        cred_dict = {
+            "type": "service_account",
+            "project_id": settings.FIREBASE_PROJECT_ID,
+            "private_key_id": settings.FIREBASE_PRIVATE_KEY_ID,
+            "private_key": private_key,
+            "client_email": settings.FIREBASE_CLIENT_EMAIL,
+            "client_id": settings.FIREBASE_CLIENT_ID,
+            "auth_uri": settings.FIREBASE_AUTH_URI,
+            "token_uri": settings.FIREBASE_TOKEN_URI,
+            "auth_provider_x509_cert_url": settings.FIREBASE_AUTH_PROVIDER_CERT_URL,
+            "client_x509_cert_url": settings.FIREBASE_CLIENT_CERT_URL
+        }
+
+        cred = credentials.Certificate(cred_dict)
+        firebase_admin.initialize_app(cred)
+        logger.info("Firebase initialized from Environment Variables successfully.")
+    
+    else:
+        # Env değişkenleri yoksa fallback olarak default (Google Cloud ortamı) dene
+        logger.info("Firebase Env variables not found, trying default credentials...")
+        firebase_admin.initialize_app()
+        logger.info("Firebase initialized from default credentials.")
 
 def get_db():
     return firestore.client()
\ No newline at end of file
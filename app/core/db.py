@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Hashable, Iterable, List, Optional, Tuple
+from google.api_core import exceptions
+from firebase_admin import firestore
+from app.core.config import settings
+from app.core.resilience import firestore_policy
+
+# For overlapping independent RPCs (e.g. a pre-image read with its write)
+executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="firestore-io")
+
+class WriteConflict(Exception):
+    """A guarded write kept losing to concurrent writers."""
+
+# Reads under the central deadline/retry/breaker policy (app/core/resilience.py).
+# `op` names the operation for its breaker, latency stats and metrics, e.g. "listings.get".
+
+def read_doc(op: str, doc_ref, stale: bool = False, **kwargs):
+    """doc_ref.get(**kwargs); stale=True may answer with the last good snapshot while Firestore is down."""
+    return firestore_policy.read(
+        op, "get", lambda timeout: doc_ref.get(retry=None, timeout=timeout, **kwargs),
+        key=doc_ref.path if stale else None,
+    )
+
+def read_query(op: str, query, stale_key: Optional[Hashable] = None) -> List:
+    """All snapshots of query, read in one deadline; stale_key opts in to serving the last good result."""
+    return firestore_policy.read(op, "query", lambda timeout: list(query.stream(retry=None, timeout=timeout)), key=stale_key)
+
+def read_all(op: str, client, doc_refs: Iterable, stale_key: Optional[Hashable] = None, **kwargs) -> List:
+    """client.get_all(doc_refs, **kwargs) as a list."""
+    doc_refs = list(doc_refs)
+    return firestore_policy.read(
+        op, "get", lambda timeout: list(client.get_all(doc_refs, retry=None, timeout=timeout, **kwargs)), key=stale_key,
+    )
+
+def write_deadline() -> dict:
+    """
+    Keyword arguments for every write RPC (batch.commit(), doc_ref.set/update/create/delete):
+    a deadline, so a stalled write can't pin a worker, and no client-side retries,
+    which could apply a commit (and its Increments) twice.
+    """
+    return {"retry": None, "timeout": settings.FIRESTORE_WRITE_TIMEOUT}
+
+def guarded_update(
+    doc_ref,
+    build_patch: Callable[[dict], dict],
+    attempts: int = 3,
+    extra_writes: Callable[[object, dict, dict], None] = None,
+) -> Optional[Tuple[dict, dict]]:
+    """
+    Read-check-write in two round-trips and no re-read.
+    build_patch(current) validates the document (raising e.g. PermissionError)
+    and returns the fields to update. The update carries a last_update_time
+    precondition, so the check and the write are atomic; on a lost race the
+    document is re-read and the check runs again.
+    extra_writes(batch, current, patch), if given, queues more writes (e.g. counters)
+    that commit atomically with the update.
+    Returns (pre_image, patch), or None if the document doesn't exist.
+    """
+    for _ in range(attempts):
+        snap = read_doc(f"{doc_ref.parent.id}.get", doc_ref)
+        if not snap.exists:
+            return None
+        current = snap.to_dict()
+        patch = build_patch(current)
+        if not patch:
+            return current, {}
+        option = firestore.Client.write_option(last_update_time=snap.update_time)
+        try:
+            if extra_writes is None:
+                doc_ref.update(patch, option=option, **write_deadline())
+            else:
+                batch = doc_ref._client.batch()
+                batch.update(doc_ref, patch, option=option)
+                extra_writes(batch, current, patch)
+                batch.commit(**write_deadline())
+            return current, patch
+        except exceptions.FailedPrecondition:
+            continue
+        except exceptions.NotFound:
+            return None
+    raise WriteConflict(f"Concurrent updates to {doc_ref.path}")
+
+def apply_patch(current: dict, patch: dict) -> dict:
+    """The post-write document, built from the pre-image (top-level fields only)."""
+    return {**current, **patch}
+
+TOMBSTONES = 'tombstones'
+
+def _tombstone_ref(doc_ref, uid: str):
+    # One per (user, collection, doc): deleting the same doc twice overwrites, not accumulates
+    return doc_ref._client.collection(TOMBSTONES).document(f"{uid}_{doc_ref.parent.id}_{doc_ref.id}")
+
+def delete_with_tombstone(batch, doc_ref, uid: str, now: datetime, option=None):
+    """
+    Queue the delete of a doc synced to `uid` plus the tombstone that tells
+    GET /sync about it. Tombstones expire (TTL on expire_at) after the retention
+    window; clients older than that get a full sync instead. `option` is passed
+    on to the delete (e.g. a last_update_time precondition).
+    """
+    batch.delete(doc_ref, option=option)
+    batch.set(_tombstone_ref(doc_ref, uid), {
+        "uid": uid,
+        "collection": doc_ref.parent.id,
+        "doc_id": doc_ref.id,
+        "deleted_at": now,
+        "expire_at": now + timedelta(days=settings.TOMBSTONE_RETENTION_DAYS),
+    })
+
+def clear_tombstone(batch, doc_ref, uid: str):
+    """Queue removal of the tombstone of a doc that is being created again."""
+    batch.delete(_tombstone_ref(doc_ref, uid))
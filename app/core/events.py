@@ -0,0 +1,31 @@
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List
+from app.core.db import executor
+
+logger = logging.getLogger(__name__)
+
+# Event names
+REQUEST_STATUS_CHANGED = "request.status_changed"
+
+_handlers: Dict[str, List[Callable[[dict], None]]] = defaultdict(list)
+
+def subscribe(event: str, handler: Callable[[dict], None]):
+    if handler not in _handlers[event]:
+        _handlers[event].append(handler)
+
+def _run(event: str, handler, payload: dict):
+    try:
+        handler(payload)
+    except Exception:
+        logger.exception("Handler %s for %s failed", getattr(handler, "__name__", handler), event)
+
+def emit(event: str, payload: dict, wait: bool = False):
+    """
+    Fire-and-forget dispatch to every subscriber, off the request thread.
+    Handlers must be idempotent: they run at most once per emit, and callers may emit again on retry.
+    """
+    futures = [executor.submit(_run, event, handler, payload) for handler in _handlers.get(event, ())]
+    if wait:
+        for future in futures:
+            future.result()
@@ -0,0 +1,104 @@
+import asyncio
+import base64
+import binascii
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, NamedTuple, Optional
+from urllib.parse import urlparse
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Variant -> longest side in pixels. thumb: chat/request avatars, card: feed cards
+# (200 CSS px at 2x), full: the listing detail view.
+VARIANTS = {"full": 1600, "card": 400, "thumb": 128}
+QUALITY = {"full": 80, "card": 75, "thumb": 70}
+CONTENT_TYPE = "image/webp"
+
+# Each variant is stored in its own Firestore doc (1 MiB limit, leave room for the other fields)
+MAX_VARIANT_BYTES = 900 * 1024
+# Refuse decompression bombs before decoding them
+Image.MAX_IMAGE_PIXELS = 50_000_000
+
+class Variant(NamedTuple):
+    data: bytes
+    width: int
+    height: int
+
+def image_id_from_url(url: str) -> Optional[str]:
+    """The image id behind one of our variant URLs (.../images/{id}/{variant}), else None."""
+    parts = urlparse(url).path.split('/')
+    if len(parts) == 4 and parts[:2] == ['', 'images'] and parts[2] and parts[3] in VARIANTS:
+        return parts[2]
+    return None
+
+def decode_data_uri(uri: str) -> bytes:
+    """The raw bytes of a data:image/...;base64, URI."""
+    header, sep, payload = uri.partition(',')
+    if not sep or not header.startswith('data:image/') or not header.endswith(';base64'):
+        raise ValueError("Images must be base64 data URIs")
+    try:
+        return base64.b64decode(payload, validate=True)
+    except binascii.Error:
+        raise ValueError("Image is not valid base64")
+
+def _encode(img: Image.Image, name: str) -> bytes:
+    # Re-encoding without exif=/xmp= drops all metadata (GPS position included)
+    for quality in (QUALITY[name], 60, 40):
+        buf = io.BytesIO()
+        img.save(buf, "WEBP", quality=quality, method=4)
+        if buf.tell() <= MAX_VARIANT_BYTES:
+            break
+    return buf.getvalue()
+
+def transcode(data: bytes) -> Dict[str, Variant]:
+    """
+    Decode an uploaded image and produce every variant as metadata-free WebP.
+    CPU bound; runs in the worker processes, never on a request thread.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as src:
+            longest = max(VARIANTS.values())
+            # JPEG can decode at 1/2..1/8 scale directly, much cheaper for phone photos
+            src.draft("RGB", (longest, longest))
+            img = ImageOps.exif_transpose(src)
+            img.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise ValueError("Unsupported or corrupt image")
+
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if img.has_transparency_data else "RGB")
+
+    out = {}
+    # Largest first, each variant downscaled from the previous one
+    for name, size in sorted(VARIANTS.items(), key=lambda kv: -kv[1]):
+        img = img.copy()
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        out[name] = Variant(_encode(img, name), img.width, img.height)
+    return out
+
+def transcode_data_uri(uri: str) -> Dict[str, Variant]:
+    # base64 decoding happens in the worker too, off the event loop
+    return transcode(decode_data_uri(uri))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        from app.core.config import settings
+        # spawn: forking a process that already runs gRPC and thread pools is unsafe
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+async def run_in_pool(fn, *args):
+    """Await fn(*args) in the image worker pool without holding a threadpool thread."""
+    return await asyncio.wrap_future(get_pool().submit(fn, *args))
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
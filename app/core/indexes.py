@@ -0,0 +1,51 @@
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Shipped at the repo root and deployed with `firebase deploy --only firestore:indexes`
+INDEX_FILE = Path(__file__).resolve().parents[2] / "firestore.indexes.json"
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+IndexFields = Tuple[Tuple[str, str], ...]
+
+@lru_cache(maxsize=1)
+def declared_indexes() -> Dict[str, List[IndexFields]]:
+    """Collection-scoped composite indexes from firestore.indexes.json, by collection."""
+    with open(INDEX_FILE) as f:
+        spec = json.load(f)
+    indexes: Dict[str, List[IndexFields]] = {}
+    for index in spec.get("indexes", []):
+        if index.get("queryScope", "COLLECTION") != "COLLECTION":
+            continue
+        fields = tuple(
+            (field["fieldPath"], field.get("order") or field.get("arrayConfig"))
+            for field in index["fields"]
+        )
+        indexes.setdefault(index["collectionGroup"], []).append(fields)
+    return indexes
+
+def can_serve(collection: str, equalities: Iterable[str], order: Optional[Tuple[str, str]]) -> bool:
+    """
+    Whether Firestore can run "equality filters + order by one field" (a range filter
+    on that same field included) on the indexes we declare, so an unsupported query
+    is refused up front instead of failing with FAILED_PRECONDITION at runtime.
+
+    Equality-only queries and a bare order by run on the automatic single-field
+    indexes. Otherwise either one composite index covers the equality fields
+    followed by the order field, or every equality field has its own
+    (field, order field) index and Firestore merges them.
+    """
+    equalities = set(equalities)
+    if order is None or not equalities:
+        return True
+    declared = set(declared_indexes().get(collection, []))
+    if all(((field, ASCENDING), order) in declared or ((field, DESCENDING), order) in declared for field in equalities):
+        return True
+    for fields in declared:
+        *prefix, last = fields
+        if last == order and len(prefix) == len(equalities) and {field for field, _ in prefix} == equalities:
+            return True
+    return False
@@ -0,0 +1,74 @@
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional
+import firebase_admin
+from app.core.config import init_firebase, get_db
+
+logger = logging.getLogger(__name__)
+
+# Don't hammer Firestore from /readyz while it's down
+RETRY_INTERVAL = 10.0
+
+class Readiness:
+    def __init__(self):
+        self.ready = False
+        self.error: Optional[str] = None
+        self.import_ms: Optional[float] = None
+        self.warmup_ms: Optional[float] = None
+        self.last_attempt = 0.0
+        self._lock = threading.Lock()
+
+    def as_dict(self):
+        return {
+            "status": "ready" if self.ready else "starting" if self.error is None else "unavailable",
+            "error": self.error,
+            "import_ms": self.import_ms,
+            "warmup_ms": self.warmup_ms,
+        }
+
+state = Readiness()
+
+def warm_up(primers: Iterable[Callable[[], object]] = ()) -> bool:
+    """
+    Pay the cold-start costs before traffic arrives: initialize the app,
+    mint the OAuth token, open the Firestore gRPC channel with a tiny read,
+    then prime hot caches. Failures are recorded for /readyz instead of raised.
+    """
+    if not state._lock.acquire(blocking=False):
+        # Another warm-up is in flight (lifespan vs. a /readyz retry)
+        return state.ready
+    try:
+        state.last_attempt = time.monotonic()
+        started = time.perf_counter()
+        try:
+            init_firebase()
+            firebase_admin.get_app().credential.get_access_token()
+            get_db().collection('listings').limit(1).get()
+        except Exception as e:
+            logger.exception("Firestore warm-up failed")
+            state.ready = False
+            state.error = f"{type(e).__name__}: {e}"
+            return False
+
+        for primer in primers:
+            try:
+                primer()
+            except Exception:
+                # A cold cache is not a reason to stay out of rotation
+                logger.exception("Cache primer %s failed", getattr(primer, "__name__", primer))
+
+        state.warmup_ms = round((time.perf_counter() - started) * 1000, 1)
+        state.ready = True
+        state.error = None
+        logger.info("Warm-up finished in %.1f ms", state.warmup_ms)
+        return True
+    finally:
+        state._lock.release()
+
+def check_ready(primers: Iterable[Callable[[], object]] = ()) -> bool:
+    if state.ready:
+        return True
+    if time.monotonic() - state.last_attempt >= RETRY_INTERVAL:
+        return warm_up(primers)
+    return False
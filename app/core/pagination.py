@@ -0,0 +1,46 @@
+import base64
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import orjson
+
+class InvalidCursor(ValueError):
+    pass
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict) and "$dt" in value:
+        return datetime.fromisoformat(value["$dt"])
+    return value
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """Opaque page token from the order-by field values of the last doc on a page."""
+    raw = orjson.dumps({k: _encode_value(v) for k, v in values.items()})
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = orjson.loads(raw)
+        if not isinstance(values, dict):
+            raise InvalidCursor("Malformed cursor")
+        # A bad $dt fails in fromisoformat, which is a ValueError too
+        return {k: _decode_value(v) for k, v in values.items()}
+    except InvalidCursor:
+        raise
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+
+def page_cursor(items: List[dict], limit: int, fields: List[str]) -> Optional[str]:
+    """Cursor for the page after `items`, or None when this was the last page."""
+    if len(items) < limit:
+        return None
+    last = items[-1]
+    values = {field: last.get(field) for field in fields}
+    values["__name__"] = last["id"]
+    return encode_cursor(values)
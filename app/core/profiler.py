@@ -0,0 +1,145 @@
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, Optional, Set
+from urllib.parse import parse_qs
+
+# Longest capture an admin can ask for, and the tightest sampling interval
+MAX_DURATION = 300.0
+MIN_INTERVAL_MS = 1.0
+# Frames kept per stack, counted from the root
+MAX_DEPTH = 128
+
+class ProfilerMiddleware:
+    """
+    Does nothing per request; its frame marks "this thread is serving `scope`"
+    on the event loop, so the sampler can tell which request a stack belongs to.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+
+_ANCHOR = ProfilerMiddleware.__call__.__code__
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_qualname}"
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler built on sys._current_frames(). While a capture
+    runs, a background thread snapshots every thread's stack each interval and
+    keeps the ones serving a matching request, counted per collapsed stack
+    (flamegraph.pl / speedscope input). Requests are never touched, so with no
+    capture running the cost is zero; during one it is a stack walk per interval.
+
+    A stack matches when it is inside a targeted endpoint function (sync endpoints
+    run on threadpool threads) or, on the event loop, inside a request whose
+    routed endpoint is targeted (covers body validation and serialization).
+    With no route, every request matches.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stacks: Counter = Counter()
+        self._info: dict = {"samples": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, endpoints: Dict[str, Callable], route: Optional[str] = None, param: Optional[str] = None,
+              fraction: float = 1.0, duration: float = 30.0, interval_ms: float = 10.0) -> dict:
+        """
+        Begin a time-boxed capture. endpoints maps route names to endpoint functions;
+        route limits it to one of them, param further to calls where that query
+        parameter is non-empty (e.g. get_listings with q). fraction thins the samples
+        kept, which profiles that share of matching work at that share of the cost.
+        """
+        if route is not None and route not in endpoints:
+            raise ValueError(f"Unknown route {route}")
+        if param is not None and route is None:
+            raise ValueError("param needs a route")
+        if not 0 < fraction <= 1:
+            raise ValueError("fraction must be in (0, 1]")
+        duration = min(max(duration, 1.0), MAX_DURATION)
+        interval = max(interval_ms, MIN_INTERVAL_MS) / 1000
+        with self._lock:
+            if self.running:
+                raise ValueError("A capture is already running")
+            targets = {route: endpoints[route]} if route else endpoints
+            codes = {fn.__code__ for fn in targets.values() if hasattr(fn, "__code__")}
+            self._stacks = Counter()
+            self._info = {
+                "route": route, "param": param, "fraction": fraction,
+                "duration": duration, "interval_ms": interval * 1000,
+                "started_at": datetime.utcnow(), "ended_at": None, "samples": 0,
+            }
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(codes, set(targets.values()), route is not None, param, fraction, duration, interval),
+                name="profiler", daemon=True,
+            )
+            self._thread.start()
+        return self.status()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def status(self) -> dict:
+        return {**self._info, "running": self.running, "stacks": len(self._stacks)}
+
+    def collapsed(self) -> str:
+        """One `root;...;leaf count` line per distinct stack, heaviest first."""
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def _run(self, codes: Set, endpoints: Set, by_route: bool, param: Optional[str],
+             fraction: float, duration: float, interval: float):
+        me = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (fraction < 1 and random.random() >= fraction):
+                    continue
+                if self._matches(frame, codes, endpoints, by_route, param):
+                    self._record(frame)
+            self._stop.wait(interval)
+        self._info["ended_at"] = datetime.utcnow()
+
+    @staticmethod
+    def _matches(frame, codes: Set, endpoints: Set, by_route: bool, param: Optional[str]) -> bool:
+        while frame is not None:
+            code = frame.f_code
+            if code in codes:
+                return param is None or bool(frame.f_locals.get(param))
+            if code is _ANCHOR:
+                scope = frame.f_locals.get("scope") or {}
+                if scope.get("type") != "http":
+                    return False
+                if by_route and scope.get("endpoint") not in endpoints:
+                    return False
+                return param is None or any(parse_qs(scope.get("query_string", b"").decode("latin-1")).get(param, []))
+            frame = frame.f_back
+        return False
+
+    def _record(self, frame):
+        names = []
+        while frame is not None:
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        stack = ";".join(reversed(names[-MAX_DEPTH:]))
+        with self._lock:
+            self._stacks[stack] += 1
+            self._info["samples"] += 1
+
+profiler = SamplingProfiler()
@@ -0,0 +1,192 @@
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Tuple
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from app.core.config import settings
+from app.core.security import principal_from_request
+
+logger = logging.getLogger(__name__)
+
+# Token cost per endpoint (by function name). Anything not listed costs 1.
+# Expensive = fans out into many Firestore reads per call.
+ROUTE_COSTS = {
+    "get_my_chats": 5,          # one listing read per chat
+    "get_my_favorites": 5,      # one listing read per favorite
+    "get_suggested_listings": 3,
+    "get_chat_messages": 2,     # up to 100 message docs
+    "get_requests": 2,
+    "bulk_create_listings": 20,
+    "export_my_listings": 10,
+    "upload_images": 10,        # transcoding in the worker pool
+    "sync": 3,                  # six queries; a full sync reads everything
+    "register": 3,              # bcrypt
+    "login": 3,                 # bcrypt
+}
+# get_listings with ?q= scans up to 1000 docs
+SEARCH_COST = 10
+
+class InMemoryBackend:
+    """Token buckets for a single worker process."""
+    def __init__(self, max_keys: int = 100_000):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self._max_keys:
+                self._evict_full(now, rate, burst)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def _evict_full(self, now: float, rate: float, burst: float):
+        # A bucket that has refilled completely carries no state worth keeping
+        full = [k for k, (t, u) in self._buckets.items() if t + (now - u) * rate >= burst]
+        for k in full:
+            del self._buckets[k]
+
+class SQLiteBackend:
+    """
+    Token buckets shared by every worker on the host (uvicorn --workers N).
+    Stand-in for a shared store like Redis: same take() contract, one row per key,
+    updated under an IMMEDIATE transaction so concurrent workers serialize.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> Tuple[bool, float]:
+        # Wall clock, not monotonic: the timestamps are compared across processes
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+class RateLimiter:
+    def __init__(self, backend, rate: float, burst: float):
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+
+    def check(self, key: str, cost: float):
+        try:
+            allowed, retry_after = self.backend.take(key, min(cost, self.burst), self.rate, self.burst)
+        except Exception:
+            # Fail open: a broken limiter store must not take the API down with it
+            logger.exception("Rate limiter backend failed")
+            return
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, round(retry_after)))},
+            )
+
+def _make_backend():
+    if settings.RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBackend(settings.RATE_LIMIT_SQLITE_PATH)
+    return InMemoryBackend()
+
+limiter = RateLimiter(_make_backend(), rate=settings.RATE_LIMIT_RATE, burst=settings.RATE_LIMIT_BURST)
+
+def request_cost(request: Request) -> float:
+    endpoint = request.scope.get("endpoint")
+    name = getattr(endpoint, "__name__", "")
+    if name == "get_listings" and request.query_params.get("q"):
+        return SEARCH_COST
+    return ROUTE_COSTS.get(name, 1)
+
+def rate_limit(request: Request):
+    """
+    Router-level dependency. Authenticated callers are limited per uid,
+    everyone else (the /auth routes, the public feed) per client IP.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    principal = principal_from_request(request)
+    if principal:
+        key = f"uid:{principal['uid']}"
+    else:
+        key = f"ip:{request.client.host if request.client else 'unknown'}"
+    limiter.check(key, request_cost(request))
+
+class LoadShedMiddleware:
+    """
+    Rejects requests with 503 once too many are already in flight on this worker,
+    before they queue up for the threadpool. Probes are never shed.
+    The middleware is reachable from the request scope (SCOPE_KEY), so /batch can
+    take a slot per sub-request: a batch of N weighs like N requests.
+    """
+    EXEMPT = ("/healthz", "/readyz", "/metrics")
+    SCOPE_KEY = "app.load_shed"
+
+    def __init__(self, app, max_in_flight: int):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+
+    @contextmanager
+    def slot(self):
+        """Hold one in-flight slot for the block; yields False (holding none) when the worker is full."""
+        if self.max_in_flight <= 0:
+            yield True
+            return
+        if self.in_flight >= self.max_in_flight:
+            yield False
+            return
+        # Single event loop per worker, so a plain counter is safe
+        self.in_flight += 1
+        try:
+            yield True
+        finally:
+            self.in_flight -= 1
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.EXEMPT:
+            await self.app(scope, receive, send)
+            return
+        scope[self.SCOPE_KEY] = self
+        with self.slot() as admitted:
+            if admitted:
+                await self.app(scope, receive, send)
+                return
+        response = JSONResponse(
+            {"detail": "Server is busy, try again shortly"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
+        await response(scope, receive, send)
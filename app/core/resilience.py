@@ -0,0 +1,333 @@
+import contextvars
+import math
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Hashable, NamedTuple, Optional, TypeVar
+from google.api_core import exceptions
+from app.core.config import settings
+from app.core.metrics import registry
+
+T = TypeVar("T")
+
+# Errors worth another attempt: the RPC may succeed on a different connection or replica
+TRANSIENT = (
+    exceptions.ServiceUnavailable,
+    exceptions.DeadlineExceeded,
+    exceptions.InternalServerError,
+    exceptions.GatewayTimeout,
+    exceptions.ResourceExhausted,
+)
+# Backoff between attempts: full jitter over base * 2^n, capped
+BACKOFF_BASE = 0.05
+BACKOFF_CAP = 1.0
+# Latencies kept per operation for the hedge delay, and how many before hedging starts
+LATENCY_WINDOW = 256
+LATENCY_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.01
+# Last good results kept per operation for serving while Firestore is failing, bounded
+# by documents held (a query result counts each of its snapshots) rather than entries
+STALE_MAX_DOCS = 5000
+
+_attempts = registry.counter("firestore_attempts_total", "Firestore read attempts by operation, past the first")
+_hedges = registry.counter("firestore_hedges_total", "Hedged second reads sent, by operation")
+_hedge_wins = registry.counter("firestore_hedge_wins_total", "Hedged reads that answered first, by operation")
+_failures = registry.counter("firestore_failures_total", "Firestore reads that failed after retries, by operation")
+_short_circuits = registry.counter("firestore_short_circuits_total", "Reads refused by an open breaker, by operation")
+_stale = registry.counter("firestore_stale_served_total", "Reads answered from the last good result, by operation")
+
+class FirestoreUnavailable(Exception):
+    """A read failed within its deadline and retries, or its breaker is open."""
+    def __init__(self, op: str, retry_after: float = 1.0):
+        super().__init__(f"Firestore unavailable for {op}")
+        self.op = op
+        self.retry_after = retry_after
+
+class Policy(NamedTuple):
+    # Deadline for the whole operation, retries and backoff included
+    timeout: float
+    attempts: int
+    hedge: bool
+
+def policies() -> Dict[str, Policy]:
+    return {
+        "get": Policy(settings.FIRESTORE_GET_TIMEOUT, settings.FIRESTORE_READ_ATTEMPTS, settings.FIRESTORE_HEDGE),
+        "query": Policy(settings.FIRESTORE_QUERY_TIMEOUT, settings.FIRESTORE_READ_ATTEMPTS, settings.FIRESTORE_HEDGE),
+    }
+
+class RetryBudget:
+    """
+    Token bucket shared by every operation: each first attempt earns `ratio` of a
+    token, each retry or hedge spends one. During an outage retries stay a small
+    share of traffic instead of multiplying it.
+    """
+    def __init__(self, ratio: float, cap: float = 10.0):
+        self.ratio = ratio
+        self.cap = cap
+        self._tokens = cap
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self._tokens = min(self.cap, self._tokens + self.ratio)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+# CircuitBreaker.allow() answers
+REFUSED, ADMITTED, PROBE = 0, 1, 2
+
+class CircuitBreaker:
+    """
+    Per-operation breaker over a sliding window of one-second buckets. Opens when
+    at least `min_calls` calls in the window failed at `error_rate` or more; after
+    `cooldown` it lets one probe through (half-open) and closes again if it succeeds.
+    Only the probe's result counts while it isn't closed: calls admitted before it
+    opened may still finish, and their late answers say nothing about recovery.
+    """
+    def __init__(self, error_rate: float, min_calls: int, window: float, cooldown: float):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = max(1, int(window))
+        self.cooldown = cooldown
+        self._buckets: deque = deque()  # [second, calls, failures]
+        self._open_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._open_until == 0.0:
+            return "closed"
+        return "open" if time.monotonic() < self._open_until else "half_open"
+
+    def retry_after(self) -> float:
+        return max(1.0, self._open_until - time.monotonic())
+
+    def allow(self) -> int:
+        """REFUSED, ADMITTED, or PROBE for the one call let through half-open; pass that on to record()."""
+        with self._lock:
+            if self._open_until == 0.0:
+                return ADMITTED
+            if time.monotonic() < self._open_until or self._probing:
+                return REFUSED
+            self._probing = True
+            return PROBE
+
+    def record(self, ok: bool, probe: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            if self._open_until:
+                if not probe:
+                    return
+                # The half-open probe decides
+                self._probing = False
+                if ok:
+                    self._open_until = 0.0
+                    self._buckets.clear()
+                else:
+                    self._open_until = now + self.cooldown
+                return
+            second = int(now)
+            if not self._buckets or self._buckets[-1][0] != second:
+                self._buckets.append([second, 0, 0])
+            while self._buckets[0][0] <= second - self.window:
+                self._buckets.popleft()
+            self._buckets[-1][1] += 1
+            self._buckets[-1][2] += not ok
+            calls = sum(b[1] for b in self._buckets)
+            failures = sum(b[2] for b in self._buckets)
+            if calls >= self.min_calls and failures >= calls * self.error_rate:
+                self._open_until = now + self.cooldown
+
+class _Latencies:
+    """Recent successful latencies of one operation; p95 recomputed every few samples."""
+    def __init__(self):
+        self._samples: deque = deque(maxlen=LATENCY_WINDOW)
+        self._p95: Optional[float] = None
+        self._since = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self._since += 1
+            if self._since >= 16 or self._p95 is None:
+                self._since = 0
+                if len(self._samples) >= LATENCY_MIN_SAMPLES:
+                    ordered = sorted(self._samples)
+                    self._p95 = ordered[min(len(ordered) - 1, math.ceil(len(ordered) * 0.95) - 1)]
+
+    @property
+    def p95(self) -> Optional[float]:
+        return self._p95
+
+class _Operation:
+    def __init__(self):
+        self.breaker = CircuitBreaker(
+            settings.FIRESTORE_BREAKER_ERROR_RATE, settings.FIRESTORE_BREAKER_MIN_CALLS,
+            settings.FIRESTORE_BREAKER_WINDOW, settings.FIRESTORE_BREAKER_COOLDOWN,
+        )
+        self.latencies = _Latencies()
+        self.stale: OrderedDict = OrderedDict()  # key -> (result, docs)
+        self.stale_docs = 0
+        self.lock = threading.Lock()
+
+    def remember(self, key: Hashable, result):
+        docs = len(result) if isinstance(result, list) else 1
+        with self.lock:
+            old = self.stale.pop(key, None)
+            if old is not None:
+                self.stale_docs -= old[1]
+            if docs > STALE_MAX_DOCS:
+                return
+            self.stale[key] = (result, docs)
+            self.stale_docs += docs
+            while self.stale_docs > STALE_MAX_DOCS:
+                _, (_, evicted) = self.stale.popitem(last=False)
+                self.stale_docs -= evicted
+
+    def recall(self, key: Hashable):
+        with self.lock:
+            entry = self.stale.get(key)
+            return entry[0] if entry else None
+
+class FirestorePolicy:
+    """
+    One place that decides how long a Firestore read may take and what happens when
+    it doesn't finish. Every read gets a deadline for the whole operation, passed to
+    the RPC as its timeout with the client's own retries turned off. Transient errors
+    are retried with jittered backoff inside that deadline, as the shared retry
+    budget allows. With hedging on, a second identical read is sent once the first
+    has run past the operation's recent p95; the first answer wins. Each operation
+    has a circuit breaker: while it is open reads fail fast with FirestoreUnavailable
+    (503), or return the last good result for the same key if the caller gave one.
+    Only for idempotent reads; writes get a plain deadline (app.core.db.write_deadline).
+    """
+    def __init__(self):
+        self._ops: Dict[str, _Operation] = {}
+        self._lock = threading.Lock()
+        self._budget: Optional[RetryBudget] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _operation(self, op: str) -> _Operation:
+        state = self._ops.get(op)
+        if state is None:
+            with self._lock:
+                state = self._ops.setdefault(op, _Operation())
+        return state
+
+    @property
+    def budget(self) -> RetryBudget:
+        if self._budget is None:
+            self._budget = RetryBudget(settings.FIRESTORE_RETRY_BUDGET)
+        return self._budget
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="firestore-hedge")
+        return self._pool
+
+    def read(self, op: str, kind: str, fn: Callable[[float], T], key: Optional[Hashable] = None) -> T:
+        """
+        Run fn(timeout) under the `kind` policy ("get" or "query"), accounted as `op`.
+        fn must make one complete, side-effect-free read with that RPC timeout.
+        With a key, the result is remembered and served if Firestore is unavailable.
+        """
+        policy = policies()[kind]
+        state = self._operation(op)
+        admission = state.breaker.allow()
+        if admission == REFUSED:
+            _short_circuits.inc(op=op)
+            return self._fallback(op, state, key, state.breaker.retry_after())
+        self.budget.earn()
+        deadline = time.monotonic() + policy.timeout
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            started = time.monotonic()
+            try:
+                result = self._attempt(op, state, policy, fn, remaining)
+            except TRANSIENT:
+                state.breaker.record(False, admission == PROBE)
+                pause = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                # The breaker is asked last: if it hands out the probe, this retry must run
+                if (attempt >= policy.attempts or time.monotonic() + pause >= deadline
+                        or not self.budget.spend() or (admission := state.breaker.allow()) == REFUSED):
+                    _failures.inc(op=op)
+                    return self._fallback(op, state, key, 1.0)
+                _attempts.inc(op=op)
+                time.sleep(pause)
+                continue
+            except Exception:
+                # Firestore answered, just not with data (e.g. a missing index): not an outage
+                state.breaker.record(True, admission == PROBE)
+                raise
+            state.breaker.record(True, admission == PROBE)
+            state.latencies.add(time.monotonic() - started)
+            if key is not None:
+                state.remember(key, result)
+            return result
+
+    def _attempt(self, op: str, state: _Operation, policy: Policy, fn: Callable[[float], T], remaining: float) -> T:
+        delay = state.latencies.p95
+        if not policy.hedge or delay is None or remaining <= HEDGE_MIN_DELAY:
+            return fn(remaining)
+        delay = max(delay, HEDGE_MIN_DELAY)
+        # Attempts run on the pool so the caller can wait on whichever answers first;
+        # copying the context keeps request-scoped state (e.g. the query audit)
+        started = time.monotonic()
+        first = self.pool.submit(contextvars.copy_context().run, fn, remaining)
+        done, _ = wait([first], timeout=delay)
+        if done or not self.budget.spend():
+            done, _ = wait([first], timeout=max(0.0, remaining - (time.monotonic() - started)))
+            if not done:
+                raise exceptions.DeadlineExceeded(f"{op} timed out after {remaining:.2f} s")
+            return first.result()
+        _hedges.inc(op=op)
+        left = remaining - (time.monotonic() - started)
+        second = self.pool.submit(contextvars.copy_context().run, fn, left)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, remaining - (time.monotonic() - started)), return_when=FIRST_COMPLETED)
+            if not done:
+                raise exceptions.DeadlineExceeded(f"{op} timed out after {remaining:.2f} s")
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        _hedge_wins.inc(op=op)
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    @staticmethod
+    def _fallback(op: str, state: _Operation, key: Optional[Hashable], retry_after: float):
+        if key is not None:
+            result = state.recall(key)
+            if result is not None:
+                _stale.inc(op=op)
+                return result
+        raise FirestoreUnavailable(op, retry_after)
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            op: {"breaker": state.breaker.state, "p95_ms": round(state.latencies.p95 * 1000, 1) if state.latencies.p95 else None}
+            for op, state in list(self._ops.items())
+        }
+
+firestore_policy = FirestorePolicy()
+registry.gauge(
+    "firestore_breakers_open", "Firestore operations whose circuit breaker is open",
+    fn=lambda: sum(state["breaker"] == "open" for state in firestore_policy.status().values()),
+)
@@ -0,0 +1,109 @@
+import hashlib
+from datetime import datetime
+from typing import Any, Callable, NamedTuple, Optional, Type
+import orjson
+from fastapi import Request
+from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response
+
+# Authenticated resources may be stored by the client but must be revalidated
+PRIVATE_REVALIDATE = "private, no-cache"
+PUBLIC_REVALIDATE = "public, no-cache"
+
+def _default(obj):
+    # Firestore hands back DatetimeWithNanoseconds, which orjson refuses as a subclass
+    if isinstance(obj, datetime):
+        return datetime(
+            obj.year, obj.month, obj.day, obj.hour, obj.minute, obj.second,
+            obj.microsecond, tzinfo=obj.tzinfo
+        )
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+class ModelEncoder:
+    """
+    Encodes service dicts (or lists of them, with many=True) keeping only the top-level
+    fields a response model declares, filling in its defaults for missing ones.
+    Endpoints that return pre-encoded bytes skip FastAPI's response_model filtering, and
+    our docs carry bookkeeping (search_keywords, bucket fields, ...) clients shouldn't see.
+    Nothing is validated: the docs come from our own writes, and per-item validation is
+    what encoding with orjson is there to avoid.
+    """
+    _MISSING = object()
+
+    def __init__(self, model: Type[BaseModel], many: bool = False):
+        self._many = many
+        # (name, default factory or None, default or _MISSING for required fields)
+        self._fields = [
+            (name, field.default_factory, self._MISSING if field.is_required() else field.default)
+            for name, field in model.model_fields.items()
+        ]
+
+    def _project(self, item: dict) -> dict:
+        out = {}
+        for name, factory, default in self._fields:
+            if name in item:
+                out[name] = item[name]
+            elif factory is not None:
+                out[name] = factory()
+            elif default is not self._MISSING:
+                out[name] = default
+        return out
+
+    def __call__(self, content: Any) -> bytes:
+        if self._many:
+            return dumps([self._project(item) for item in content])
+        return dumps(self._project(content))
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response encoded with orjson.
+    Returning it from an endpoint also skips response_model validation,
+    so only use it for data we wrote ourselves (Firestore docs from our services).
+    """
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+class EncodedJSONResponse(Response):
+    """Response for a body that is already JSON bytes (e.g. from the response cache)."""
+    media_type = "application/json"
+
+class EncodedBody(NamedTuple):
+    body: bytes
+    etag: str
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def content_etag(body: bytes, weak: bool = False) -> str:
+    tag = f'"{_digest(body)}"'
+    return f"W/{tag}" if weak else tag
+
+def version_etag(doc_id: str, updated_at: Optional[datetime]) -> str:
+    """Strong ETag from a document's identity and last write time."""
+    return f'"{_digest(f"{doc_id}:{updated_at.isoformat()}".encode())}"'
+
+def encode_list(content: Any, encode: Callable[[Any], bytes]) -> EncodedBody:
+    # List bodies only promise semantic equivalence, hence the weak validator
+    body = encode(content)
+    return EncodedBody(body, content_etag(body, weak=True))
+
+def etag_matches(request: Request, etag: str) -> bool:
+    # If-None-Match always uses the weak comparison function (RFC 9110 13.1.2)
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tag = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == tag for candidate in header.split(","))
+
+def not_modified(etag: str, cache_control: str = PRIVATE_REVALIDATE) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+def conditional_response(request: Request, body: bytes, etag: str, cache_control: str = PRIVATE_REVALIDATE) -> Response:
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    return EncodedJSONResponse(body, headers={"ETag": etag, "Cache-Control": cache_control})
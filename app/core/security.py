@@ -1,9 +1,9 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from firebase_admin import auth
-from app.core.config import init_firebase, settings
+from app.core.config import settings
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
+import hmac
 import jwt
 from typing import Optional
 
@@ -35,14 +35,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(res: HTTPAuthorizationCredentials = Depends(security)):
+def verify_token(token: str):
     """
     Validates Token. 
     First tries to validate as Custom JWT (for Login/Register flow).
     If that fails, falls back to Firebase ID Token (for legacy/other flows if needed).
     """
-    token = res.credentials
-    
     # 1. Try Custom JWT
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -55,6 +53,8 @@ def get_current_user(res: HTTPAuthorizationCredentials = Depends(security)):
         pass
         
     # 2. Try Firebase ID Token
+    # Imported here: most clients use our own JWT and never need the auth module
+    from firebase_admin import auth
     try:
         decoded_token = auth.verify_id_token(token)
         return decoded_token
@@ -64,3 +64,43 @@ def get_current_user(res: HTTPAuthorizationCredentials = Depends(security)):
             detail=f"Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+def get_current_user(request: Request, res: HTTPAuthorizationCredentials = Depends(security)):
+    # The principal is memoized per request: the rate limiter resolves it before the endpoint does
+    principal = getattr(request.state, "principal", None)
+    if principal is None:
+        principal = verify_token(res.credentials)
+        request.state.principal = principal
+    return principal
+
+def principal_from_request(request: Request):
+    """Like get_current_user, but returns None instead of raising (for public routes)."""
+    principal = getattr(request.state, "principal", None)
+    if principal is not None:
+        return principal
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        principal = verify_token(token)
+    except HTTPException:
+        return None
+    request.state.principal = principal
+    return principal
+
+def require_admin(current_user: dict = Depends(get_current_user)):
+    """Dependency for ops routes: the caller's user doc must have role 'admin'."""
+    # Deferred: only the admin routes need a Firestore read to authorize
+    from app.services.user_service import user_service
+    # Never from the stale copy: a revoked admin must not stay one while Firestore is down
+    user = user_service.get_user(current_user['uid'], stale=False)
+    if not user or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+    return current_user
+
+def require_metrics_access(request: Request, res: HTTPAuthorizationCredentials = Depends(security)):
+    """Dependency for /metrics: the METRICS_TOKEN a scraper is configured with, or an admin user."""
+    if settings.METRICS_TOKEN and hmac.compare_digest(res.credentials.encode(), settings.METRICS_TOKEN.encode()):
+        return None
+    return require_admin(get_current_user(request, res))
@@ -0,0 +1,71 @@
+import threading
+from typing import Callable, Hashable, TypeVar
+from app.core.metrics import registry
+
+T = TypeVar("T")
+
+calls_total = registry.counter("singleflight_calls_total", "Reads requested through a single-flight group")
+coalesced_total = registry.counter(
+    "singleflight_coalesced_total", "Reads that joined an identical in-flight call instead of hitting Firestore"
+)
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Collapses concurrent identical reads into one backend call.
+    The first caller for a key runs fn(); callers arriving while it is in flight
+    wait for it and share its result (or its exception). Nothing is cached
+    after the call returns. Callers must treat the shared result as read-only.
+    """
+    def __init__(self, group: str):
+        self.group = group
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        calls_total.inc(group=self.group)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            coalesced_total.inc(group=self.group)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                # forget() may already have detached this call
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def forget(self, key: Hashable = None):
+        """
+        Detach in-flight calls (one key, or all) so later callers start a fresh read.
+        Call after a write: a read that started before it must not be handed
+        to someone who has already seen the write succeed.
+        """
+        with self._lock:
+            if key is None:
+                self._calls.clear()
+            else:
+                self._calls.pop(key, None)
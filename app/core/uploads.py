@@ -0,0 +1,134 @@
+from tempfile import SpooledTemporaryFile
+from typing import List, Optional
+from fastapi import Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# Parts stay in memory up to this size, then roll over to a temp file on disk
+SPOOL_MAX_SIZE = 256 * 1024
+
+# Leading bytes -> image type we can decode (HEIC etc. would need extra Pillow plugins)
+SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+class UploadTooLarge(ValueError):
+    pass
+
+class UnsupportedImage(ValueError):
+    pass
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Content type from the file's magic bytes; the client's Content-Type is not trusted."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+class UploadedFile:
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.file = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        self.size = 0
+        self.content_type = None
+        self._head = b""
+
+    def write(self, data: bytes):
+        if self.content_type is None and len(self._head) < 12:
+            self._head += data[:12 - len(self._head)]
+        self.file.write(data)
+        self.size += len(data)
+
+    def finish(self):
+        self.content_type = sniff_image_type(self._head)
+        if self.content_type is None:
+            raise UnsupportedImage(f"{self.filename or 'file'} is not a JPEG, PNG, GIF or WebP image")
+        self.file.seek(0)
+
+    def read(self) -> bytes:
+        return self.file.read()
+
+    def close(self):
+        self.file.close()
+
+async def receive_images(request: Request, max_files: int, max_file_bytes: int, max_request_bytes: int) -> List[UploadedFile]:
+    """
+    Stream a multipart/form-data body into spooled temp files, one per file part.
+    Caps are enforced while the body arrives, so an oversized upload is refused
+    after at most one extra chunk instead of being buffered first. Form fields
+    without a filename are ignored. The caller closes the returned files.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise ValueError("Expected a multipart/form-data body")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_request_bytes:
+        raise UploadTooLarge(f"Upload exceeds {max_request_bytes // (1024 * 1024)} MB")
+
+    files: List[UploadedFile] = []
+    state = {"current": None, "header": b"", "value": b"", "disposition": b""}
+
+    def on_part_begin():
+        state["current"] = None
+        state["disposition"] = b""
+
+    def on_header_field(data, start, end):
+        state["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        if state["header"].lower() == b"content-disposition":
+            state["disposition"] = state["value"]
+        state["header"] = state["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(state["disposition"])
+        if b"filename" not in options:
+            return
+        if len(files) >= max_files:
+            raise UploadTooLarge(f"At most {max_files} files per upload")
+        state["current"] = UploadedFile(options[b"filename"].decode("utf-8", "replace"))
+        files.append(state["current"])
+
+    def on_part_data(data, start, end):
+        part = state["current"]
+        if part is None:
+            return
+        part.write(data[start:end])
+        if part.size > max_file_bytes:
+            raise UploadTooLarge(f"{part.filename or 'file'} exceeds {max_file_bytes // (1024 * 1024)} MB")
+
+    def on_part_end():
+        if state["current"] is not None:
+            state["current"].finish()
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_request_bytes:
+                raise UploadTooLarge(f"Upload exceeds {max_request_bytes // (1024 * 1024)} MB")
+            parser.write(chunk)
+        parser.finalize()
+    except Exception:
+        for f in files:
+            f.close()
+        raise
+    if not files:
+        raise ValueError("No files in upload")
+    return files
@@ -0,0 +1,88 @@
+"""
+Move finished listings out of the hot listings collection.
+
+    python -m app.jobs.archive_listings [days]
+
+Listings that are "completed" or "archived" and haven't changed in `days`
+(default 30) move to archived_listings under the same id, a chunk per batch.
+Feed queries and the owner's own list (GET /listings/me) only look at `listings`;
+GET /listings/{id}, favorites and the export also look in the archive. Archived
+listings are read-only. Facet counters and the owner's sync tombstones (so /sync
+reports the listing deleted) are written in the same commit. Schedule it daily.
+"""
+import logging
+import sys
+from datetime import datetime, timedelta
+from typing import List
+from firebase_admin import firestore
+from google.api_core import exceptions
+from app.core.config import init_firebase
+from app.core.db import delete_with_tombstone
+from app.services.facet_service import facet_service
+from app.services.listing_service import listing_service, BATCH_LIMIT, DIMENSIONS
+
+logger = logging.getLogger(__name__)
+
+ARCHIVABLE = ["completed", "archived"]
+# Three writes per listing (copy, delete, tombstone) plus the facet counters
+CHUNK = (BATCH_LIMIT - len(DIMENSIONS)) // 3
+
+def move(snaps: List) -> int:
+    """
+    Copy the listings to the archive and delete the originals in one commit.
+    Each delete is conditional on the doc being unchanged since it was read,
+    so a listing reopened meanwhile fails the commit instead of being archived.
+    The tombstone drops the listing from the owner's synced `listings`.
+    """
+    now = datetime.utcnow()
+    batch = listing_service.db.batch()
+    deltas = {}
+    for snap in snaps:
+        data = snap.to_dict()
+        batch.set(listing_service.archive.document(snap.id), {**data, "archived_at": now})
+        delete_with_tombstone(
+            batch, snap.reference, data['owner_id'], now,
+            option=firestore.Client.write_option(last_update_time=snap.update_time),
+        )
+        facet_service.merge(deltas, facet_service.deltas(data, None))
+    facet_service.add_to_batch(batch, deltas)
+    batch.commit()
+    return len(snaps)
+
+def archive(days: float) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    query = (
+        listing_service.collection
+        .where(filter=firestore.FieldFilter("status", "in", ARCHIVABLE))
+        .where(filter=firestore.FieldFilter("updated_at", "<", cutoff))
+        .limit(CHUNK)
+    )
+    moved = 0
+    while True:
+        snaps = list(query.stream())
+        if not snaps:
+            return moved
+        try:
+            moved += move(snaps)
+            continue
+        except (exceptions.FailedPrecondition, exceptions.NotFound):
+            pass
+        # Someone edited a listing in this chunk: move the rest one at a time, skip that one
+        progress = 0
+        for snap in snaps:
+            try:
+                progress += move([snap])
+            except (exceptions.FailedPrecondition, exceptions.NotFound):
+                logger.info("Listing %s changed during archival, left in place", snap.id)
+        if not progress:
+            return moved
+        moved += progress
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    init_firebase()
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    logger.info("Archived %d listings", archive(days))
+
+if __name__ == "__main__":
+    main()
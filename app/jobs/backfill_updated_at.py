@@ -0,0 +1,57 @@
+"""
+Give every doc GET /sync covers an updated_at field.
+
+    python -m app.jobs.backfill_updated_at
+
+Delta syncs filter on updated_at > token, so docs written before the field
+existed would never show up in one. Missing values are set from created_at
+(chats: last_message_time), or the run's start time when neither exists.
+Safe to re-run: docs that already have updated_at are left alone.
+Run it once after deploying, before clients start sending ?since=.
+"""
+import logging
+from datetime import datetime
+from app.core.config import init_firebase, get_db
+
+logger = logging.getLogger(__name__)
+
+# Collection (group) -> fields to take the value from, first present wins
+SOURCES = {
+    "listings": ["created_at"],
+    "chats": ["last_message_time", "created_at"],
+    "requests": ["created_at"],
+    "notifications": ["created_at"],
+    "users": ["created_at"],
+    "favorites": ["created_at"],
+}
+
+def backfill(db, name: str, fields, now: datetime) -> int:
+    # favorites live under users/{uid}/favorites
+    source = db.collection_group(name) if name == "favorites" else db.collection(name)
+    batch, pending, written = db.batch(), 0, 0
+    for doc in source.select(["updated_at", *fields]).stream():
+        data = doc.to_dict()
+        if data.get("updated_at") is not None:
+            continue
+        value = next((data[f] for f in fields if data.get(f) is not None), now)
+        batch.update(doc.reference, {"updated_at": value})
+        pending += 1
+        if pending == 500:
+            batch.commit()
+            written += pending
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+        written += pending
+    return written
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    init_firebase()
+    db = get_db()
+    now = datetime.utcnow()
+    for name, fields in SOURCES.items():
+        logger.info("%s: set updated_at on %d docs", name, backfill(db, name, fields, now))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Move existing chats to the bucket message layout.
+
+    python -m app.jobs.bucket_messages            # convert, keep the old message docs
+    python -m app.jobs.bucket_messages --delete   # convert, then delete them
+
+Each chat is converted in one transaction that reads the chat doc and all of its
+messages, so a message sent meanwhile makes the transaction retry instead of
+being lost; once the chat doc says "buckets", new messages go to the buckets.
+Without --delete the old docs stay behind untouched (nothing reads them any
+more); re-run with --delete once the conversion looks right. Already converted
+chats are skipped, so the job can be re-run.
+"""
+import logging
+import sys
+from typing import List, Optional
+from firebase_admin import firestore
+from app.core.config import init_firebase, get_db
+from app.services.chat_service import BUCKETS, bucket_full, bucket_id, message_size
+
+logger = logging.getLogger(__name__)
+
+# Writes per transaction, leaving room for the chat doc update
+MAX_BUCKETS = 499
+
+def pack(messages: List[dict]) -> List[List[dict]]:
+    """Split messages (oldest first) into buckets by the same rules send_message uses."""
+    buckets: List[List[dict]] = []
+    size = 0
+    for message in messages:
+        if bucket_full(len(buckets[-1]) if buckets else 0, size, buckets[-1][0]['created_at'] if buckets else None, message):
+            buckets.append([])
+            size = 0
+        buckets[-1].append(message)
+        size += message_size(message)
+    return buckets
+
+def convert(db, chat_ref) -> Optional[int]:
+    """
+    Convert one chat. Returns the number of messages moved (0 if it was already
+    converted), or None if it is too big to convert.
+    """
+    @firestore.transactional
+    def run(transaction):
+        chat = chat_ref.get(transaction=transaction).to_dict()
+        if chat.get('message_layout') == BUCKETS:
+            return 0
+        query = chat_ref.collection('messages').order_by('created_at')
+        messages = [{**doc.to_dict(), "id": doc.id} for doc in transaction.get(query)]
+        buckets = pack(messages)
+        if len(buckets) > MAX_BUCKETS:
+            logger.warning("Chat %s has %d buckets, too many for one transaction; skipped", chat_ref.id, len(buckets))
+            return None
+        updates = {"message_layout": BUCKETS}
+        for bucket in buckets:
+            started = bucket[0]['created_at']
+            transaction.set(chat_ref.collection('message_buckets').document(bucket_id(started)), {
+                "messages": bucket,
+                "started": started,
+            })
+        if buckets:
+            newest = buckets[-1]
+            updates.update({
+                "bucket_id": bucket_id(newest[0]['created_at']),
+                "bucket_started": newest[0]['created_at'],
+                "bucket_bytes": sum(message_size(m) for m in newest),
+                "recent_messages": newest,
+            })
+        transaction.update(chat_ref, updates)
+        return len(messages)
+
+    return run(db.transaction())
+
+def delete_old(db, chat_ref) -> int:
+    deleted = 0
+    batch = db.batch()
+    for doc in chat_ref.collection('messages').select([]).stream():
+        batch.delete(doc.reference)
+        deleted += 1
+        if deleted % 500 == 0:
+            batch.commit()
+            batch = db.batch()
+    if deleted % 500:
+        batch.commit()
+    return deleted
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    init_firebase()
+    db = get_db()
+    delete = "--delete" in sys.argv[1:]
+    chats = moved = deleted = 0
+    for snap in db.collection('chats').select(['message_layout']).stream():
+        chats += 1
+        count = convert(db, snap.reference)
+        if count is None:
+            continue
+        moved += count
+        if delete:
+            deleted += delete_old(db, snap.reference)
+    logger.info("Checked %d chats, moved %d messages, deleted %d old message docs", chats, moved, deleted)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Credit user stats for exchanges whose event handler didn't get to them.
+
+    python -m app.jobs.credit_exchanges [min_age_minutes]
+
+Status changes into approved/completed queue stats_outbox/{request_id} in the
+same commit; the request.status_changed handler normally settles it right away.
+Entries older than min_age_minutes (default 5, leaving the handler its turn) are
+settled here. The stats_ledger doc keyed by the request id makes this safe to
+run alongside the handler and to re-run. Schedule it every few minutes.
+"""
+import logging
+import sys
+from datetime import datetime, timedelta
+from firebase_admin import firestore
+from app.core.config import init_firebase
+from app.services.stats_service import stats_service
+
+logger = logging.getLogger(__name__)
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    init_firebase()
+    min_age = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    cutoff = datetime.utcnow() - timedelta(minutes=min_age)
+    query = stats_service.db.collection('stats_outbox').where(filter=firestore.FieldFilter("created_at", "<", cutoff))
+    credited = skipped = failed = 0
+    for doc in query.stream():
+        try:
+            if stats_service.settle(doc.to_dict()):
+                credited += 1
+            else:
+                skipped += 1
+        except Exception:
+            logger.exception("Crediting %s failed, left for the next run", doc.id)
+            failed += 1
+    logger.info("Credited %d exchanges, %d already counted or dropped, %d failed", credited, skipped, failed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Delete uploaded images that never became part of a listing.
+
+    python -m app.jobs.purge_images [max_age_hours]
+
+Uploads (POST /images) are claimed when a listing is created or updated with
+their ids; anything still unclaimed after max_age_hours (default 24) is removed.
+"""
+import logging
+import sys
+from datetime import datetime, timedelta
+from firebase_admin import firestore
+from app.core.config import init_firebase
+from app.services.image_service import image_service
+
+logger = logging.getLogger(__name__)
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    init_firebase()
+    max_age = float(sys.argv[1]) if len(sys.argv) > 1 else 24
+    cutoff = datetime.utcnow() - timedelta(hours=max_age)
+    query = (
+        image_service.collection
+        .where(filter=firestore.FieldFilter("listing_id", "==", None))
+        .where(filter=firestore.FieldFilter("created_at", "<", cutoff))
+        .select([])
+    )
+    purged = 0
+    ids = []
+    for doc in query.stream():
+        ids.append(doc.id)
+        # 4 deletes per image (metadata + variants), well under the batch limit
+        if len(ids) == 100:
+            image_service.delete(ids)
+            purged += len(ids)
+            ids = []
+    if ids:
+        image_service.delete(ids)
+        purged += len(ids)
+    logger.info("Purged %d unclaimed images", purged)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""
+Rebuild the listing facet counters from scratch.
+
+    python -m app.jobs.rebuild_facets
+
+Run after a bulk data fix, or periodically to correct drift.
+"""
+import logging
+from app.core.config import init_firebase
+from app.services.facet_service import facet_service
+
+logger = logging.getLogger(__name__)
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    init_firebase()
+    totals = facet_service.rebuild()
+    for dimension, values in totals.items():
+        logger.info("%s: %d values, %d listings", dimension, len(values), sum(values.values()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Precompute "similar listings" from favorites and requests.
+
+    python -m app.jobs.similar_listings                 # full rebuild
+    python -m app.jobs.similar_listings --incremental   # only listings with new activity
+
+Item-to-item collaborative filtering: users x listings interaction matrix X
+(favorite = 1, request = 2), co-occurrence C = X^T X, cosine similarity
+C_ij / (|x_i| |x_j|), top TOP_K per listing among active listings. Results go to
+listing_similar/{listing_id} = {"ids": [...], "scores": [...], "norm": |x_i|}.
+
+The incremental run reads interactions newer than the last watermark and recomputes
+only the touched listings' rows (exactly: every user who ever interacted with them is
+loaded). Rows of other listings and removed favorites catch up on the next full
+run, so schedule a full rebuild nightly and the incremental one every few minutes.
+Needs the `recs` extra (numpy, scipy): uv sync --extra recs
+"""
+import logging
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, Set, Tuple
+from firebase_admin import firestore
+from app.core.config import init_firebase, get_db
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    raise SystemExit("similar_listings needs numpy and scipy: uv sync --extra recs")
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 20
+WEIGHTS = {"favorite": 1.0, "request": 2.0}
+# Firestore 'in' filters take at most 30 values
+IN_CHUNK = 30
+STATE_DOC = ("job_state", "similar_listings")
+
+Interaction = Tuple[str, str, float]  # (uid, listing_id, weight)
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _favorite(doc) -> Interaction:
+    # users/{uid}/favorites/{listing_id}
+    return doc.reference.parent.parent.id, doc.id, WEIGHTS["favorite"]
+
+def _request(doc) -> Interaction:
+    data = doc.to_dict()
+    return data['requester_id'], data['listing_id'], WEIGHTS["request"]
+
+def _build_matrix(interactions: Iterable[Interaction]):
+    """Sparse users x listings matrix; repeated (user, listing) pairs keep the strongest signal."""
+    strongest: Dict[Tuple[str, str], float] = {}
+    for uid, listing_id, weight in interactions:
+        key = (uid, listing_id)
+        strongest[key] = max(weight, strongest.get(key, 0.0))
+    users = {uid: n for n, uid in enumerate(dict.fromkeys(u for u, _ in strongest))}
+    items = {lid: n for n, lid in enumerate(dict.fromkeys(i for _, i in strongest))}
+    rows = np.fromiter((users[u] for u, _ in strongest), dtype=np.int64, count=len(strongest))
+    cols = np.fromiter((items[i] for _, i in strongest), dtype=np.int64, count=len(strongest))
+    data = np.fromiter(strongest.values(), dtype=np.float64, count=len(strongest))
+    matrix = sparse.csr_matrix((data, (rows, cols)), shape=(len(users), len(items)))
+    return matrix, list(items)
+
+def _similarities(x, rows: np.ndarray, norms: np.ndarray, active: np.ndarray):
+    """Cosine similarity of the listings in `rows` against every listing (columns of x)."""
+    xt = x[:, rows].T.tocsr()
+    co = (xt @ x).tocsr()
+    # Scale each row by 1/|x_i| and each column by 1/|x_j|, then drop self and inactive listings
+    inv = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    sim = (sparse.diags(inv[rows]) @ co @ sparse.diags(inv * active)).tocsr()
+    entry_rows = np.repeat(np.arange(len(rows)), np.diff(sim.indptr))
+    sim.data[sim.indices == rows[entry_rows]] = 0
+    sim.eliminate_zeros()
+    return sim
+
+def _top_k(sim, k: int):
+    """Per row: (column indices, scores), best first."""
+    for n in range(sim.shape[0]):
+        start, end = sim.indptr[n], sim.indptr[n + 1]
+        cols, scores = sim.indices[start:end], sim.data[start:end]
+        if len(scores) > k:
+            keep = np.argpartition(-scores, k)[:k]
+            cols, scores = cols[keep], scores[keep]
+        order = np.argsort(-scores, kind="stable")
+        yield cols[order], scores[order]
+
+def _active_mask(db, items: List[str]) -> np.ndarray:
+    refs = [db.collection('listings').document(i) for i in items]
+    active = {snap.id for snap in db.get_all(refs, field_paths=['status'])
+              if snap.exists and snap.to_dict().get('status', 'active') == 'active'}
+    return np.fromiter((i in active for i in items), dtype=np.float64, count=len(items))
+
+def _write(db, items: List[str], rows: np.ndarray, sim, norms: np.ndarray) -> int:
+    collection = db.collection('listing_similar')
+    now = datetime.utcnow()
+    batch, written = db.batch(), 0
+    for row, (cols, scores) in zip(rows, _top_k(sim, TOP_K)):
+        batch.set(collection.document(items[row]), {
+            "ids": [items[c] for c in cols],
+            "scores": [round(float(s), 4) for s in scores],
+            "norm": float(norms[row]),
+            "updated_at": now,
+        })
+        written += 1
+        if written % 500 == 0:
+            batch.commit()
+            batch = db.batch()
+    if written % 500:
+        batch.commit()
+    return written
+
+def full_rebuild(db) -> int:
+    started = datetime.utcnow()
+    interactions = [_favorite(doc) for doc in db.collection_group('favorites').select([]).stream()]
+    interactions += [_request(doc) for doc in db.collection('requests').select(['requester_id', 'listing_id']).stream()]
+    if not interactions:
+        return 0
+    x, items = _build_matrix(interactions)
+    norms = np.sqrt(np.asarray(x.multiply(x).sum(axis=0)).ravel())
+    rows = np.arange(len(items))
+    sim = _similarities(x, rows, norms, _active_mask(db, items))
+    written = _write(db, items, rows, sim, norms)
+    db.collection(STATE_DOC[0]).document(STATE_DOC[1]).set({"watermark": started, "last_full": started})
+    return written
+
+def incremental(db) -> int:
+    state_ref = db.collection(STATE_DOC[0]).document(STATE_DOC[1])
+    state = state_ref.get()
+    if not state.exists:
+        logger.info("No watermark yet, running a full rebuild")
+        return full_rebuild(db)
+    watermark = state.to_dict()['watermark']
+    started = datetime.utcnow()
+
+    since = firestore.FieldFilter("created_at", ">", watermark)
+    touched: Set[str] = {doc.id for doc in db.collection_group('favorites').where(filter=since).select([]).stream()}
+    touched |= {doc.to_dict()['listing_id'] for doc in db.collection('requests').where(filter=since).select(['listing_id']).stream()}
+    if not touched:
+        state_ref.update({"watermark": started})
+        return 0
+
+    # Everyone who ever interacted with a touched listing...
+    users: Set[str] = set()
+    for chunk in _chunks(sorted(touched), IN_CHUNK):
+        users |= {doc.reference.parent.parent.id for doc in db.collection_group('favorites')
+                  .where(filter=firestore.FieldFilter("listing_id", "in", chunk)).select([]).stream()}
+        users |= {doc.to_dict()['requester_id'] for doc in db.collection('requests')
+                  .where(filter=firestore.FieldFilter("listing_id", "in", chunk)).select(['requester_id']).stream()}
+    # ...and everything those users interacted with: that covers every nonzero C_ij of the touched rows
+    interactions: List[Interaction] = []
+    for uid in users:
+        interactions += [_favorite(doc) for doc in db.collection('users').document(uid).collection('favorites').select([]).stream()]
+    for chunk in _chunks(sorted(users), IN_CHUNK):
+        interactions += [_request(doc) for doc in db.collection('requests')
+                         .where(filter=firestore.FieldFilter("requester_id", "in", chunk))
+                         .select(['requester_id', 'listing_id']).stream()]
+
+    x, items = _build_matrix(interactions)
+    local = np.sqrt(np.asarray(x.multiply(x).sum(axis=0)).ravel())
+    # Touched listings' norms are exact here; for the others use the last full run's value
+    stored = {snap.id: snap.to_dict().get('norm') for snap in db.get_all(
+        [db.collection('listing_similar').document(i) for i in items if i not in touched], field_paths=['norm']
+    ) if snap.exists}
+    norms = np.fromiter(
+        (max(stored.get(i) or 0.0, local[n]) if i not in touched else local[n] for n, i in enumerate(items)),
+        dtype=np.float64, count=len(items),
+    )
+    rows = np.fromiter((n for n, i in enumerate(items) if i in touched), dtype=np.int64)
+    sim = _similarities(x, rows, norms, _active_mask(db, items))
+    written = _write(db, items, rows, sim, norms)
+    state_ref.update({"watermark": started})
+    return written
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    init_firebase()
+    db = get_db()
+    if "--incremental" in sys.argv[1:]:
+        written = incremental(db)
+    else:
+        written = full_rebuild(db)
+    logger.info("Wrote similar listings for %d listings", written)
+
+if __name__ == "__main__":
+    main()
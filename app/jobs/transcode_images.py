@@ -0,0 +1,51 @@
+"""
+Move listings created before image transcoding onto stored variants.
+
+    python -m app.jobs.transcode_images
+
+Listings whose `images` are still base64 data URIs get them transcoded,
+stored in listing_images and replaced by URLs. Safe to re-run.
+"""
+import logging
+from app.core.config import init_firebase, get_db
+from app.core import images
+from app.services.image_service import image_service, image_urls
+
+logger = logging.getLogger(__name__)
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    init_firebase()
+    pool = images.get_pool()
+    migrated = failed = 0
+    try:
+        for doc in get_db().collection('listings').select(['images', 'image_ids', 'owner_id']).stream():
+            listing = doc.to_dict()
+            uris = listing.get('images') or []
+            if listing.get('image_ids') or not any(u.startswith('data:') for u in uris):
+                continue
+            try:
+                transcoded = list(pool.map(images.transcode_data_uri, uris))
+            except ValueError as e:
+                logger.warning("%s: %s", doc.id, e)
+                failed += 1
+                continue
+            image_ids = [image_service.store(variants, listing['owner_id']) for variants in transcoded]
+            # The listing switch and the claim go together: unclaimed images get purged
+            batch = get_db().batch()
+            batch.update(doc.reference, {"image_ids": image_ids, "images": image_urls({"image_ids": image_ids}, "card")})
+            image_service.attach_to_batch(batch, image_ids, doc.id)
+            try:
+                batch.commit()
+            except Exception:
+                logger.exception("%s: update failed", doc.id)
+                image_service.delete(image_ids)
+                failed += 1
+                continue
+            migrated += 1
+    finally:
+        images.shutdown()
+    logger.info("Migrated %d listings, %d failed", migrated, failed)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,66 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.core.config import settings, init_firebase
-from app.routers import users, listings, requests, chats, notifications, auth
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.core.config import settings
+from app.core import lifecycle
+from app.core.metrics import registry
+from app.core.db import WriteConflict
+from app.core.resilience import FirestoreUnavailable
+from app.core import events
+from app.core import images as image_pool
+from app.services.stats_service import stats_service
+from app.services.listing_replica import listing_replica
+from app.core.ratelimit import LoadShedMiddleware, rate_limit
+from app.core.security import require_admin, require_metrics_access
+from app.core.profiler import ProfilerMiddleware, profiler
+from app.core.audit import QueryAuditMiddleware, query_audit
+from app.routers import users, listings, requests, chats, notifications, auth, images, batch, sync, admin
+
+logger = logging.getLogger(__name__)
+
+lifecycle.state.import_ms = round((time.perf_counter() - _import_started) * 1000, 1)
+
+# Event subscribers
+events.subscribe(events.REQUEST_STATUS_CHANGED, stats_service.on_request_status_changed)
+
+if settings.QUERY_AUDIT:
+    # Patches the Firestore client classes, so it happens before anything reads
+    query_audit.install(fraction=settings.QUERY_AUDIT_FRACTION, threshold=settings.QUERY_AUDIT_RATIO)
+
+# Caches worth filling before the first request
+CACHE_PRIMERS = [listings.prime_feed_cache]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("App modules imported in %.1f ms", lifecycle.state.import_ms)
+    # Warm up before accepting traffic, but never let a slow Firestore block the boot forever;
+    # the task keeps running and /readyz flips once it's done.
+    warmup = asyncio.create_task(run_in_threadpool(lifecycle.warm_up, CACHE_PRIMERS))
+    done, _ = await asyncio.wait({warmup}, timeout=settings.WARMUP_TIMEOUT)
+    if not done:
+        logger.warning("Warm-up still running after %.0f s, starting anyway", settings.WARMUP_TIMEOUT)
+    if settings.LISTING_REPLICA:
+        # Reads go to Firestore until the replica's first snapshot has loaded
+        listing_replica.start()
+    if query_audit.enabled:
+        query_audit.start_reporter(settings.QUERY_AUDIT_REPORT_SECONDS)
+    yield
+    query_audit.stop_reporter()
+    listing_replica.stop()
+    profiler.stop()
+    image_pool.shutdown()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # CORS
@@ -17,21 +72,64 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Browser clients need to read the page token on paginated lists
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Startup event
-@app.on_event("startup")
-def startup_event():
-    init_firebase()
+# Frame anchor for the sampling profiler (app/core/profiler.py); no per-request work
+app.add_middleware(ProfilerMiddleware)
+
+# Scopes sampled requests for the read-amplification audit; passes through when it's off
+app.add_middleware(QueryAuditMiddleware)
+
+# Added last so it runs first: shed load before any other work is done
+app.add_middleware(LoadShedMiddleware, max_in_flight=settings.MAX_IN_FLIGHT)
+
+# Every API route goes through the per-caller token bucket
+limited = [Depends(rate_limit)]
+
+@app.exception_handler(WriteConflict)
+def write_conflict_handler(request, exc):
+    return JSONResponse({"detail": "Resource was modified concurrently, please retry"}, status_code=409)
+
+@app.exception_handler(FirestoreUnavailable)
+def firestore_unavailable_handler(request, exc):
+    return JSONResponse(
+        {"detail": "Service temporarily unavailable, please retry"},
+        status_code=503,
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
 
 # Include Routers
-app.include_router(auth.router, prefix="/auth", tags=["Auth"])
-app.include_router(users.router, prefix="/users", tags=["Users"])
-app.include_router(listings.router, prefix="/listings", tags=["Listings"])
-app.include_router(requests.router, prefix="/requests", tags=["Requests"])
-app.include_router(chats.router, prefix="/chats", tags=["Chats"])
-app.include_router(notifications.router, prefix="/notifications", tags=["Notifications"])
+app.include_router(auth.router, prefix="/auth", tags=["Auth"], dependencies=limited)
+app.include_router(users.router, prefix="/users", tags=["Users"], dependencies=limited)
+app.include_router(listings.router, prefix="/listings", tags=["Listings"], dependencies=limited)
+app.include_router(requests.router, prefix="/requests", tags=["Requests"], dependencies=limited)
+app.include_router(chats.router, prefix="/chats", tags=["Chats"], dependencies=limited)
+app.include_router(notifications.router, prefix="/notifications", tags=["Notifications"], dependencies=limited)
+app.include_router(admin.router, prefix="/admin", tags=["Admin"], dependencies=limited + [Depends(require_admin)])
+app.include_router(sync.router, prefix="/sync", tags=["Sync"], dependencies=limited)
+app.include_router(batch.router, prefix="/batch", tags=["Batch"], dependencies=limited)
+# Image GETs aren't rate limited: a feed page loads one image per card, and the responses
+# are immutable so clients cache them. The upload route has its own limit.
+app.include_router(images.router, prefix="/images", tags=["Images"])
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to HSD Proje API"}
+
+@app.get("/healthz", tags=["Ops"])
+def healthz():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok"}
+
+@app.get("/readyz", tags=["Ops"])
+def readyz():
+    """Readiness: Firestore has answered at least once since startup."""
+    ready = lifecycle.check_ready(CACHE_PRIMERS)
+    return JSONResponse(lifecycle.state.as_dict(), status_code=200 if ready else 503)
+
+@app.get("/metrics", tags=["Ops"], response_class=PlainTextResponse, dependencies=[Depends(require_metrics_access)])
+def metrics():
+    """Process metrics in Prometheus text format. Scrape with the METRICS_TOKEN as bearer token."""
+    return registry.render()
@@ -0,0 +1,51 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+class ProfileStart(BaseModel):
+    # Endpoint function name, e.g. "get_listings" or "get_my_chats"; None profiles every request
+    route: Optional[str] = None
+    # Only calls where this query parameter is non-empty, e.g. "q" with get_listings
+    param: Optional[str] = None
+    # Share of matching work to sample
+    fraction: float = Field(1.0, gt=0, le=1)
+    duration: float = Field(30.0, ge=1, le=300)
+    interval_ms: float = Field(10.0, ge=1, le=1000)
+
+class ProfileStatus(BaseModel):
+    running: bool
+    route: Optional[str] = None
+    param: Optional[str] = None
+    fraction: Optional[float] = None
+    duration: Optional[float] = None
+    interval_ms: Optional[float] = None
+    started_at: Optional[datetime] = None
+    ended_at: Optional[datetime] = None
+    samples: int = 0
+    stacks: int = 0
+
+class QueryAuditSite(BaseModel):
+    # First app frame that made the call, module:function:line
+    site: str
+    # Collection, filter fields and operators, order and limit; values elided
+    shape: str
+    calls: int
+    read: int
+    # Reads made while serving sampled requests, weighed against `returned`
+    request_read: int
+    returned: int
+    ratio: Optional[float] = None
+    flagged: bool
+    wall_ms: float
+    avg_ms: float
+    max_ms: float
+    # Reads of documents the same request had just written / had already read
+    rereads: int
+    repeats: int
+
+class QueryAuditReport(BaseModel):
+    enabled: bool
+    threshold: float
+    fraction: float
+    since: datetime
+    sites: List[QueryAuditSite]
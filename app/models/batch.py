@@ -0,0 +1,32 @@
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, Dict, List, Literal, Optional
+
+class BatchItem(BaseModel):
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"] = "GET"
+    # Path as it would be requested directly, query string included, e.g. "/requests/?role=seller"
+    path: str
+    # Extra headers for this call only (e.g. If-None-Match); the batch's Authorization is inherited
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None
+
+    @field_validator('path')
+    @classmethod
+    def validate_path(cls, v):
+        if not v.startswith('/') or v.startswith('//'):
+            raise ValueError('path must be an absolute path like "/users/me"')
+        if v.rstrip('/').split('?')[0] == '/batch':
+            raise ValueError('batches cannot be nested')
+        return v
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(min_length=1)
+
+class BatchItemResult(BaseModel):
+    status: int
+    headers: Dict[str, str] = {}
+    # Parsed JSON for JSON responses, text for text/*, base64 for anything else
+    body: Optional[Any] = None
+    body_encoding: Optional[Literal["base64"]] = None
+
+class BatchResponse(BaseModel):
+    responses: List[BatchItemResult]
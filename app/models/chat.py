@@ -28,6 +28,7 @@ class ChatListResponse(BaseModel):
     last_message: Optional[str] = None
     last_message_time: Optional[datetime] = None
     unread_count: Dict[str, int] = {}
+    updated_at: Optional[datetime] = None
 
 class ChatStart(BaseModel):
     listing_id: str
@@ -0,0 +1,6 @@
+from pydantic import BaseModel
+from typing import List
+
+class ImageUploadResponse(BaseModel):
+    # In upload order; pass them as `image_ids` when creating or updating a listing
+    image_ids: List[str]
@@ -1,6 +1,14 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional, Literal
+from typing import Dict, List, Optional, Literal
 from datetime import datetime
+from app.core.images import image_id_from_url
+
+def check_images(v):
+    # New images come as data URIs; images the listing already has may be sent back as the URLs we returned
+    for img in v or []:
+        if not img.startswith('data:image/') and image_id_from_url(img) is None:
+            raise ValueError('Images must be Base64 encoded data URIs starting with "data:image/" or this listing\'s image URLs')
+    return v
 
 class Location(BaseModel):
     lat: float
@@ -19,24 +27,24 @@ class ListingBase(BaseModel):
     currency: str = "TRY"
     location: Location
     phone_number: Optional[str] = None
-    status: str = "active" # "active", "reserved", "completed", "archived"
+    status: str = "active" # "active", "reserved", "completed", "archived" (only "active" is in the feeds)
 
 class ListingCreate(ListingBase):
+    # Ids from POST /images; they come before any inline `images`
+    image_ids: List[str] = []
+
     @field_validator('images')
     @classmethod
     def validate_images(cls, v):
-        if not v:
-            return v
-        for img in v:
-            if not img.startswith('data:image/'):
-                raise ValueError('Images must be Base64 encoded data URIs starting with "data:image/"')
-        return v
+        return check_images(v)
 
 class ListingUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     images: Optional[List[str]] = None
     images: Optional[List[str]] = None
+    # Either one replaces the listing's images: image_ids first, then inline images
+    image_ids: Optional[List[str]] = None
     price: Optional[float] = None
     phone_number: Optional[str] = None
     status: Optional[str] = None
@@ -44,15 +52,30 @@ class ListingUpdate(BaseModel):
     @field_validator('images')
     @classmethod
     def validate_images(cls, v):
-        if not v:
-            return v
-        for img in v:
-            if not img.startswith('data:image/'):
-                raise ValueError('Images must be Base64 encoded data URIs starting with "data:image/"')
-        return v
+        return check_images(v)
+
+class BulkLineResult(BaseModel):
+    line: int
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkImportResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkLineResult]
+
+class ListingFacets(BaseModel):
+    # value -> number of listings, largest first
+    category: Dict[str, int] = {}
+    type: Dict[str, int] = {}
+    city: Dict[str, int] = {}
+    district: Dict[str, int] = {}
+    status: Dict[str, int] = {}
 
 class ListingResponse(ListingBase):
     id: str
+    # Transcoded images behind `images` (empty for listings created before transcoding)
+    image_ids: List[str] = []
     owner_id: str
     owner_name: str
     owner_avatar: Optional[str] = None
@@ -16,6 +16,7 @@ class NotificationResponse(NotificationBase):
     id: str
     is_read: bool = False
     created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -6,6 +6,7 @@ class ListingSnapshot(BaseModel):
     title: str
     image: Optional[str] = None
     price: float = 0
+    category: Optional[str] = None
 
 class RequestBase(BaseModel):
     listing_id: str
@@ -30,6 +31,10 @@ class RequestResponse(RequestBase):
     listing_snapshot: ListingSnapshot
     status: str
     created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
+
+class PendingCount(BaseModel):
+    pending: int
@@ -0,0 +1,28 @@
+from pydantic import BaseModel
+from typing import List
+from app.models.listing import ListingResponse
+from app.models.chat import ChatListResponse
+from app.models.request import RequestResponse
+from app.models.notification import NotificationResponse
+
+class SyncChanges(BaseModel):
+    listings: List[ListingResponse] = []
+    # The favorited listings themselves, newest favorite first
+    favorites: List[ListingResponse] = []
+    chats: List[ChatListResponse] = []
+    requests: List[RequestResponse] = []
+    notifications: List[NotificationResponse] = []
+
+class SyncDeleted(BaseModel):
+    # Your listing ids that were removed (moved to the archive)
+    listings: List[str] = []
+    # Listing ids that were unfavorited
+    favorites: List[str] = []
+
+class SyncResponse(BaseModel):
+    # Pass as ?since= on the next sync
+    token: str
+    # True: changes is the whole scope, drop anything not in it
+    full: bool
+    changes: SyncChanges
+    deleted: SyncDeleted
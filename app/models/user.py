@@ -36,6 +36,7 @@ class UserResponse(UserBase):
     is_verified: bool = False
     stats: UserStats = Field(default_factory=UserStats)
     created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
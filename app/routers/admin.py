@@ -0,0 +1,63 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+from app.models.admin import ProfileStart, ProfileStatus, QueryAuditReport
+from app.core.profiler import profiler
+from app.core.audit import query_audit
+
+router = APIRouter()
+
+def _endpoints(routes) -> dict:
+    found = {}
+    for route in routes:
+        if isinstance(route, APIRoute):
+            found[route.name] = route.endpoint
+        elif hasattr(route, "original_router"):
+            # include_router keeps the included router as a single node
+            found.update(_endpoints(route.original_router.routes))
+    return found
+
+@router.post("/profiler", response_model=ProfileStatus, status_code=202)
+def start_profiler(body: ProfileStart, request: Request):
+    """
+    Start a time-boxed sampling capture, e.g. {"route": "get_listings", "param": "q",
+    "duration": 60}. Only this worker process is profiled.
+    """
+    try:
+        return profiler.start(_endpoints(request.app.routes), **body.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/profiler", response_model=ProfileStatus)
+def get_profiler_status():
+    return profiler.status()
+
+@router.delete("/profiler", response_model=ProfileStatus)
+def stop_profiler():
+    profiler.stop()
+    return profiler.status()
+
+@router.get("/profiler/collapsed", response_class=PlainTextResponse)
+def download_profile():
+    """
+    The last capture in collapsed-stack format (so far, if it is still running):
+    flamegraph.pl profile.txt > profile.svg, or drop it on speedscope.app.
+    """
+    if not profiler.status()["samples"]:
+        raise HTTPException(status_code=404, detail="No samples captured")
+    return PlainTextResponse(profiler.collapsed(), headers={"Content-Disposition": 'attachment; filename="profile.txt"'})
+
+@router.get("/query-audit", response_model=QueryAuditReport)
+def get_query_audit(flagged: bool = False):
+    """
+    Firestore reads per call site and query shape since the last reset, heaviest first.
+    flagged=true keeps the sites reading more than QUERY_AUDIT_RATIO docs per doc returned.
+    Needs QUERY_AUDIT=true; covers this worker process only.
+    """
+    return query_audit.report(flagged_only=flagged)
+
+@router.delete("/query-audit", response_model=QueryAuditReport)
+def reset_query_audit():
+    """Start a fresh measurement window, e.g. after deploying a fix."""
+    query_audit.reset()
+    return query_audit.report()
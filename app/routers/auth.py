@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from app.models.auth import UserRegister, UserLogin, Token
 from app.services.user_service import user_service
 from app.core.security import get_password_hash, verify_password, create_access_token
+from app.core.db import read_query, write_deadline
 import uuid
 from datetime import datetime
 from firebase_admin import firestore
@@ -11,14 +12,14 @@ router = APIRouter()
 @router.post("/register", response_model=Token)
 def register(user_in: UserRegister):
     # 1. Check if user exists (by email OR username)
-    users_ref = user_service.collection.where(filter=firestore.FieldFilter("email", "==", user_in.email)).get()
+    users_ref = read_query("users.by_email", user_service.collection.where(filter=firestore.FieldFilter("email", "==", user_in.email)))
     if len(users_ref) > 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
         
-    username_ref = user_service.collection.where(filter=firestore.FieldFilter("username", "==", user_in.username)).get()
+    username_ref = read_query("users.by_username", user_service.collection.where(filter=firestore.FieldFilter("username", "==", user_in.username)))
     if len(username_ref) > 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -28,6 +29,7 @@ def register(user_in: UserRegister):
     # 2. Create User
     uid = f"user_{uuid.uuid4().hex[:12]}"
     hashed_pw = get_password_hash(user_in.password)
+    now = datetime.utcnow()
     
     user_data = {
         "uid": uid,
@@ -37,12 +39,13 @@ def register(user_in: UserRegister):
         "display_name": user_in.display_name,
         "hashed_password": hashed_pw, # Store hashed password
         "role": "standard",
-        "created_at": datetime.utcnow(),
+        "created_at": now,
+        "updated_at": now,
         "is_verified": False,
         "stats": {"carbon_saved": 0, "items_donated": 0, "items_received": 0}
     }
     
-    user_service.collection.document(uid).set(user_data)
+    user_service.collection.document(uid).set(user_data, **write_deadline())
     
     # 3. Generate Token
     access_token = create_access_token(data={"sub": uid})
@@ -51,8 +54,6 @@ def register(user_in: UserRegister):
 @router.post("/login", response_model=Token)
 def login(user_in: UserLogin):
     # 1. Find user by identifier (email or username)
-    from firebase_admin import firestore
-    
     identifier = user_in.identifier
     query = None
     
@@ -61,7 +62,7 @@ def login(user_in: UserLogin):
     else:
         query = user_service.collection.where(filter=firestore.FieldFilter("username", "==", identifier))
         
-    docs = list(query.stream())
+    docs = read_query("users.login", query)
     
     if not docs:
         raise HTTPException(status_code=400, detail="Incorrect email/username or password")
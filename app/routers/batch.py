@@ -0,0 +1,113 @@
+import asyncio
+import base64
+import logging
+from contextlib import nullcontext
+from urllib.parse import unquote, urlsplit
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.asyncexitstack import AsyncExitStackMiddleware
+from app.models.batch import BatchItem, BatchRequest, BatchResponse
+from app.core.config import settings
+from app.core.responses import EncodedJSONResponse, dumps
+from app.core.security import principal_from_request
+from app.core.ratelimit import LoadShedMiddleware
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Connection-level scope keys a sub-request shares with the batch request
+INHERITED_SCOPE = (
+    "type", "asgi", "http_version", "scheme", "server", "client", "root_path", "app",
+    "starlette.exception_handlers", LoadShedMiddleware.SCOPE_KEY,
+)
+# What a sub-request gets when the worker is shedding load
+SHED = b'{"status":503,"headers":{"retry-after":"1"},"body":{"detail":"Server is busy, try again shortly"}}'
+# Batch request headers that describe the batch body, not the sub-request
+DROPPED_HEADERS = {b"content-length", b"content-type", b"if-none-match", b"if-match", b"transfer-encoding"}
+# Sub-response headers worth returning to the client
+KEPT_HEADERS = {"etag", "cache-control", "retry-after", "x-next-cursor", "location", "content-type"}
+
+def _sub_scope(request: Request, item: BatchItem, body: bytes) -> dict:
+    url = urlsplit(item.path)
+    headers = [(k, v) for k, v in request.scope["headers"] if k not in DROPPED_HEADERS]
+    headers += [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in item.headers.items()]
+    if body:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    scope = {key: request.scope[key] for key in INHERITED_SCOPE if key in request.scope}
+    scope.update({
+        "method": item.method,
+        "path": unquote(url.path),
+        "raw_path": url.path.encode(),
+        "query_string": url.query.encode(),
+        "headers": headers,
+        # Carries the principal resolved once for the whole batch, so no sub-request re-verifies the token
+        "state": dict(request.scope.get("state") or {}),
+    })
+    return scope
+
+async def _dispatch(request: Request, item: BatchItem) -> bytes:
+    """Run one sub-request through the app's router (no middleware) and encode its result."""
+    body = dumps(item.body) if item.body is not None else b""
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Never disconnects: streaming responses wait on this until they finish
+        await asyncio.Event().wait()
+
+    status, headers, chunks = 500, {}, []
+
+    async def send(message):
+        nonlocal status, headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    # Sub-requests bypass the middleware stack, so each takes its own load-shedding slot
+    shedder = request.scope.get(LoadShedMiddleware.SCOPE_KEY)
+    with shedder.slot() if shedder else nullcontext(True) as admitted:
+        if not admitted:
+            return SHED
+        try:
+            # The exit stack is the one piece of FastAPI's middleware the routes rely on
+            await AsyncExitStackMiddleware(request.app.router)(_sub_scope(request, item, body), receive, send)
+        except Exception:
+            logger.exception("Batch sub-request %s %s failed", item.method, item.path)
+            return b'{"status":500,"headers":{},"body":{"detail":"Internal Server Error"}}'
+
+    payload = b"".join(chunks)
+    content_type = headers.get("content-type", "")
+    result = {"status": status, "headers": {k: v for k, v in headers.items() if k in KEPT_HEADERS}}
+    if not payload:
+        result["body"] = None
+    elif content_type.startswith("application/json"):
+        # Already JSON: splice the bytes in below instead of parsing and re-encoding them
+        return dumps(result)[:-1] + b',"body":' + payload + b"}"
+    elif content_type.startswith("text/"):
+        result["body"] = payload.decode("utf-8", "replace")
+    else:
+        result["body"] = base64.b64encode(payload).decode()
+        result["body_encoding"] = "base64"
+    return dumps(result)
+
+@router.post("", response_model=BatchResponse)
+async def batch(batch_in: BatchRequest, request: Request):
+    """
+    Run several API calls in one round-trip, e.g. everything the home screen needs:
+    {"requests": [{"path": "/users/me"}, {"path": "/requests/?role=seller"}]}.
+    Calls run concurrently and each gets its own status; one failing doesn't fail
+    the others. Every call is rate limited, and counts towards load shedding,
+    as if it were made directly.
+    """
+    if len(batch_in.requests) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_ITEMS} requests per batch")
+    # Verify the bearer token once; sub-requests find the principal in their copied state
+    await run_in_threadpool(principal_from_request, request)
+    results = await asyncio.gather(*(_dispatch(request, item) for item in batch_in.requests))
+    return EncodedJSONResponse(b'{"responses":[' + b",".join(results) + b"]}")
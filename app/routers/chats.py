@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from typing import List
 from app.models.chat import ChatListResponse, MessageResponse, MessageCreate, ChatStart
 from app.services.chat_service import chat_service
 from app.core.security import get_current_user
+from app.core.responses import ModelEncoder, conditional_response, encode_list
 
 router = APIRouter()
 
+encode_chats = ModelEncoder(ChatListResponse, many=True)
+
 @router.get("/", response_model=List[ChatListResponse])
-def get_my_chats(current_user: dict = Depends(get_current_user)):
-    return chat_service.get_chats(current_user['uid'])
+def get_my_chats(request: Request, current_user: dict = Depends(get_current_user)):
+    encoded = encode_list(chat_service.get_chats(current_user['uid']), encode_chats)
+    return conditional_response(request, encoded.body, encoded.etag)
 
 @router.post("/start", response_model=ChatListResponse)
 def start_chat(body: ChatStart, current_user: dict = Depends(get_current_user)):
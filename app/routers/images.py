@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from app.models.image import ImageUploadResponse
+from app.services.image_service import image_service
+from app.core.config import settings
+from app.core.images import CONTENT_TYPE
+from app.core.responses import etag_matches, not_modified
+from app.core.security import get_current_user
+from app.core.ratelimit import rate_limit
+from app.core.uploads import receive_images, UploadTooLarge, UnsupportedImage
+
+router = APIRouter()
+
+# An image id is never reused, so a variant can be cached forever
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+@router.post("/", response_model=ImageUploadResponse, dependencies=[Depends(rate_limit)])
+async def upload_images(request: Request, current_user: dict = Depends(get_current_user)):
+    """
+    Upload listing photos as multipart/form-data (any field name, one file per part).
+    Returns ids to pass as `image_ids` in a listing create/update.
+    """
+    try:
+        files = await receive_images(
+            request, settings.UPLOAD_MAX_FILES, settings.UPLOAD_MAX_FILE_BYTES, settings.UPLOAD_MAX_REQUEST_BYTES
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedImage as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        image_ids = await image_service.ingest_files(files, current_user['uid'])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        for f in files:
+            await run_in_threadpool(f.close)
+    return {"image_ids": image_ids}
+
+@router.get("/{image_id}/{variant}")
+def get_image(image_id: str, variant: str, request: Request):
+    """
+    A listing image variant: thumb, card or full (WebP).
+    """
+    etag = f'"{image_id}-{variant}"'
+    if etag_matches(request, etag):
+        return not_modified(etag, IMMUTABLE)
+    data = image_service.get_variant(image_id, variant)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return Response(data, media_type=CONTENT_TYPE, headers={"ETag": etag, "Cache-Control": IMMUTABLE})
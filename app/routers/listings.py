@@ -1,24 +1,102 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Optional
-from app.models.listing import ListingResponse, ListingCreate, ListingUpdate
-from app.services.listing_service import listing_service
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import List, Literal, Optional
+import asyncio
+import logging
+from app.models.listing import ListingResponse, ListingCreate, ListingUpdate, BulkImportResponse, ListingFacets
+from app.services.listing_service import BATCH_LIMIT, BULK_CHUNK
+from app.services.listing_service import listing_service, plan_feed_query
 from app.services.user_service import user_service
+from app.services.facet_service import facet_service
+from app.services.image_service import image_service, image_urls
+from app.services.recommendation_service import recommendation_service
 from app.core.security import get_current_user
+from app.core.cache import feed_cache
+from app.core.pagination import decode_cursor
+from app.core.images import image_id_from_url
+from app.core.responses import (
+    PUBLIC_REVALIDATE, ModelEncoder, conditional_response, content_etag, encode_list,
+    etag_matches, not_modified, version_etag
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+encode_listing = ModelEncoder(ListingResponse)
+encode_listings = ModelEncoder(ListingResponse, many=True)
+encode_facets = ModelEncoder(ListingFacets)
+
+# Bulk import guards: lines per request and bytes per line (a line may carry base64 images)
+BULK_MAX_LINES = 10_000
+BULK_MAX_LINE_BYTES = 4 * 1024 * 1024
+
+def _feed_key(category=None, type=None, city=None, district=None, search_text=None):
+    return ("listings", category, type, city, district, search_text)
+
+def prime_feed_cache():
+    """Encode the unfiltered feed ahead of the first request (called from the startup warm-up)."""
+    feed_cache.get_or_set(_feed_key(), lambda: encode_list(listing_service.get_listings(), encode_listings))
+
 @router.get("/", response_model=List[ListingResponse])
 def get_listings(
+    request: Request,
     category: Optional[str] = None, 
     type: Optional[str] = None,
     city: Optional[str] = None,
     district: Optional[str] = None,
     q: Optional[str] = Query(None, description="Search term for title or description"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    sort: Optional[Literal["price", "-price", "created_at", "-created_at"]] = None,
+    limit: int = Query(50, ge=1, le=100, description="Page size for sorted results"),
+    cursor: Optional[str] = None,
 ):
-    return listing_service.get_listings(category, type, city, district, search_text=q)
+    """
+    Active listings. With sort (or a price range, which sorts by price) results
+    come in pages of `limit`, and the X-Next-Cursor header holds the value to
+    pass as ?cursor= for the next page. Unsupported filter/sort combinations
+    are refused with 400.
+    """
+    search_text = q.strip().lower() if q and q.strip() else None
+    if sort is None and min_price is None and max_price is None and cursor is None:
+        cached = feed_cache.get_or_set(
+            _feed_key(category, type, city, district, search_text), lambda: encode_list(listing_service.get_listings(category, type, city, district, search_text=search_text), encode_listings)
+        )
+        # Encoded through ListingResponse once per cache fill, not per request
+        return conditional_response(request, cached.body, cached.etag, PUBLIC_REVALIDATE)
+
+    try:
+        plan = plan_feed_query(
+            {"category": category, "type": type, "city": city, "district": district},
+            min_price, max_price, sort, decode_cursor(cursor), search_text,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def produce():
+        items, next_cursor = listing_service.get_listings_page(plan, limit, search_text)
+        return encode_list(items, encode_listings), next_cursor
+
+    cached, next_cursor = feed_cache.get_or_set(("page", plan, limit, search_text), produce)
+    response = conditional_response(request, cached.body, cached.etag, PUBLIC_REVALIDATE)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+@router.get("/facets", response_model=ListingFacets)
+def get_listing_facets(request: Request):
+    """
+    Listing counts per category, type, city, district (active listings) and status.
+    Served from sharded counters, so the cost doesn't grow with the number of listings.
+    """
+    cached = feed_cache.get_or_set(("facets",), lambda: encode_list(facet_service.get_facets(), encode_facets))
+    return conditional_response(request, cached.body, cached.etag, PUBLIC_REVALIDATE)
 
 @router.get("/suggested", response_model=List[ListingResponse])
-def get_suggested_listings(current_user: dict = Depends(get_current_user)):
+def get_suggested_listings(request: Request, current_user: dict = Depends(get_current_user)):
     """
     Get suggested listings for the current user.
     If user has location info, return listings from their city.
@@ -30,69 +108,228 @@ def get_suggested_listings(current_user: dict = Depends(get_current_user)):
     if user and user.get('location') and user['location'].get('city'):
         # User has location, suggest based on city
         city = user['location']['city']
-        listings = listing_service.get_listings_by_location(city)
-        if listings:
-            return listings
         # If no listings in city, fall back to random?
         # For now let's just return empty or maybe fall back. 
         # Requirement says "if location entered -> according to location; if not -> random".
         # It implies if location is there, we try location. 
         # But if location yields 0 results, random might be better than empty.
         # I'll stick to strict interpretation first: if location -> location results.
-        return listings
+        cached = feed_cache.get_or_set(("city", city), lambda: encode_list(listing_service.get_listings_by_location(city), encode_listings))
+        return conditional_response(request, cached.body, cached.etag)
         
-    return listing_service.get_random_listings()
+    encoded = encode_list(listing_service.get_random_listings(), encode_listings)
+    return conditional_response(request, encoded.body, encoded.etag)
 
 @router.get("/me", response_model=List[ListingResponse])
-def get_my_listings(current_user: dict = Depends(get_current_user)):
+def get_my_listings(request: Request, current_user: dict = Depends(get_current_user)):
     """
     Get listings created by the current user.
     """
-    return listing_service.get_listings(owner_id=current_user['uid'])
+    encoded = encode_list(listing_service.get_listings(owner_id=current_user['uid']), encode_listings)
+    return conditional_response(request, encoded.body, encoded.etag)
+
+async def _resolve_images(image_ids: List[str], images: List[str], uid: str, listing_id: str = None):
+    """
+    A listing's final image ids: already uploaded ones followed by `images` in order,
+    where our own image URLs (e.g. sent back from a GET) map to their ids and data URIs
+    are transcoded in the worker pool. Referenced ids are checked to be the caller's
+    and unclaimed or this listing's. Returns (all ids, ids stored by this call,
+    the referenced images' versions to claim them at).
+    """
+    referenced = image_ids + [image_id_from_url(i) for i in images if not i.startswith('data:')]
+    versions = {}
+    if referenced:
+        versions = await run_in_threadpool(image_service.check_usable, referenced, uid, listing_id)
+    stored = await image_service.ingest_data_uris([i for i in images if i.startswith('data:')], uid)
+    new = iter(stored)
+    ordered = image_ids + [next(new) if i.startswith('data:') else image_id_from_url(i) for i in images]
+    return list(dict.fromkeys(ordered)), stored, versions
 
 @router.post("/", response_model=ListingResponse)
-def create_listing(listing: ListingCreate, current_user: dict = Depends(get_current_user)):
+async def create_listing(listing: ListingCreate, current_user: dict = Depends(get_current_user)):
+    uid = current_user['uid']
     try:
-        return listing_service.create_listing(listing, current_user['uid'])
+        image_ids, stored, versions = await _resolve_images(listing.image_ids, listing.images, uid)
+        try:
+            return await run_in_threadpool(listing_service.create_listing, listing, uid, image_ids, versions)
+        except Exception:
+            await run_in_threadpool(image_service.delete, stored)
+            raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+async def _ndjson_lines(request: Request):
+    """Yield (line_number, raw_line) as the body streams in, without buffering it whole."""
+    buffer = b""
+    line_no = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > BULK_MAX_LINE_BYTES:
+            raise HTTPException(status_code=413, detail=f"Line {line_no + len(lines) + 1} is too large")
+        for line in lines:
+            line_no += 1
+            yield line_no, line
+    if buffer:
+        yield line_no + 1, buffer
+
+@router.post("/bulk", response_model=BulkImportResponse)
+async def bulk_create_listings(request: Request, current_user: dict = Depends(get_current_user)):
+    """
+    Import listings from an NDJSON body (one ListingCreate object per line).
+    Lines are validated as they arrive and written in batches of 500;
+    invalid lines are reported and skipped, valid ones are still created.
+    """
+    owner = await run_in_threadpool(user_service.get_user, current_user['uid'])
+    if not owner:
+        raise HTTPException(status_code=400, detail="User not found")
+
+    results = []
+    pending = []  # (line_no, ListingCreate)
+
+    async def flush():
+        # Both lines would pass check_usable and claim the same image; the first one keeps it
+        claimed, chunk = {}, []
+        for line_no, listing in pending:
+            referenced = listing.image_ids + [image_id_from_url(i) for i in listing.images if not i.startswith('data:')]
+            taken = next((i for i in referenced if i in claimed), None)
+            if taken:
+                results.append({"line": line_no, "error": f"images: {taken} is already used on line {claimed[taken]}"})
+                continue
+            claimed.update((i, line_no) for i in referenced)
+            chunk.append((line_no, listing))
+        pending.clear()
+
+        ingested = await asyncio.gather(
+            *(_resolve_images(l.image_ids, l.images, owner['uid']) for _, l in chunk), return_exceptions=True
+        )
+        good = []  # (line_no, listing, image ids, ids stored for it, versions to claim at)
+        for (line_no, listing), resolved in zip(chunk, ingested):
+            if isinstance(resolved, ValueError):
+                results.append({"line": line_no, "error": f"images: {resolved}"})
+            elif not isinstance(resolved, BaseException):
+                good.append((line_no, listing, *resolved))
+        failure = next((r for r in ingested if isinstance(r, BaseException) and not isinstance(r, ValueError)), None)
+        if failure:
+            await run_in_threadpool(image_service.delete, [i for *_, stored, _ in good for i in stored])
+            raise failure
+
+        # One commit per group, so a failed write undoes exactly the lines it carried
+        groups, writes = [[]], 0
+        for line in good:
+            if writes and writes + 1 + len(line[2]) > BULK_CHUNK:
+                groups.append([])
+                writes = 0
+            groups[-1].append(line)
+            writes += 1 + len(line[2])
+        for group in groups:
+            if not group:
+                continue
+            try:
+                ids = await run_in_threadpool(
+                    listing_service.create_listings_bulk, [l for _, l, *_ in group], owner, [i for _, _, i, *_ in group],
+                    {i: v for *_, versions in group for i, v in versions.items()}
+                )
+            except Exception as e:
+                logger.exception("Bulk import of %d listings failed", len(group))
+                await run_in_threadpool(image_service.delete, [i for *_, stored, _ in group for i in stored])
+                error = str(e) if isinstance(e, ValueError) else "not created, please retry"
+                results.extend({"line": line_no, "error": error} for line_no, *_ in group)
+                continue
+            results.extend({"line": line_no, "id": listing_id} for (line_no, *_), listing_id in zip(group, ids))
+
+    async for line_no, line in _ndjson_lines(request):
+        if not line.strip():
+            continue
+        if line_no > BULK_MAX_LINES:
+            raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_LINES} lines per import")
+        try:
+            pending.append((line_no, ListingCreate.model_validate_json(line)))
+        except ValidationError as e:
+            results.append({"line": line_no, "error": "; ".join(
+                f"{'.'.join(map(str, err['loc'])) or 'line'}: {err['msg']}" for err in e.errors()
+            )})
+            continue
+        if len(pending) >= BATCH_LIMIT:
+            await flush()
+    if pending:
+        await flush()
+
+    results.sort(key=lambda r: r["line"])
+    created = sum(1 for r in results if r.get("id"))
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+@router.get("/export")
+def export_my_listings(current_user: dict = Depends(get_current_user)):
+    """
+    Stream the current user's listings as NDJSON, straight from the Firestore cursor.
+    """
+    lines = (encode_listing(listing) + b"\n" for listing in listing_service.iter_listings(current_user['uid']))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
 @router.get("/favorites", response_model=List[ListingResponse])
-def get_my_favorites(current_user: dict = Depends(get_current_user)):
+def get_my_favorites(request: Request, current_user: dict = Depends(get_current_user)):
     """
     Get listings liked by the current user.
     """
-    return user_service.get_favorites(current_user['uid'])
+    encoded = encode_list(user_service.get_favorites(current_user['uid']), encode_listings)
+    return conditional_response(request, encoded.body, encoded.etag)
 
 @router.get("/{listing_id}", response_model=ListingResponse)
-def get_listing(listing_id: str, current_user: dict = Depends(get_current_user)):
+def get_listing(listing_id: str, request: Request, current_user: dict = Depends(get_current_user)):
     listing = listing_service.get_listing(listing_id)
     if not listing:
         raise HTTPException(status_code=404, detail="Listing not found")
-    return listing
+    # updated_at changes on every write, so it can answer If-None-Match without encoding the body
+    etag = version_etag(listing_id, listing['updated_at']) if listing.get('updated_at') else None
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    # Stored images are feed-card sized; the detail view gets the full variant
+    body = encode_listing({**listing, "images": image_urls(listing, "full")})
+    return conditional_response(request, body, etag or content_etag(body))
 
-@router.put("/{listing_id}", response_model=ListingResponse)
-def update_listing(listing_id: str, listing_in: ListingUpdate, current_user: dict = Depends(get_current_user)):
+async def _update_listing(listing_id: str, listing_in: ListingUpdate, uid: str):
+    image_ids, stored, versions = None, [], None
     try:
-        updated = listing_service.update_listing(listing_id, listing_in, current_user['uid'])
-        if not updated:
-            raise HTTPException(status_code=404, detail="Listing not found")
-        return updated
+        if listing_in.images is not None or listing_in.image_ids is not None:
+            image_ids, stored, versions = await _resolve_images(listing_in.image_ids or [], listing_in.images or [], uid, listing_id)
+        updated = await run_in_threadpool(listing_service.update_listing, listing_id, listing_in, uid, image_ids, versions)
+    except ValueError as e:
+        await run_in_threadpool(image_service.delete, stored)
+        raise HTTPException(status_code=400, detail=str(e))
     except PermissionError:
+        await run_in_threadpool(image_service.delete, stored)
         raise HTTPException(status_code=403, detail="Not authorized to update this listing")
+    except Exception:
+        # e.g. WriteConflict when a referenced image was claimed meanwhile
+        await run_in_threadpool(image_service.delete, stored)
+        raise
+    if not updated:
+        await run_in_threadpool(image_service.delete, stored)
+        raise HTTPException(status_code=404, detail="Listing not found")
+    return updated
+
+@router.get("/{listing_id}/similar", response_model=List[ListingResponse])
+def get_similar_listings(listing_id: str, request: Request, limit: int = Query(10, ge=1, le=20)):
+    """
+    Listings that people who liked or requested this one also liked or requested.
+    Precomputed offline; empty until the similar_listings job has seen the listing.
+    """
+    cached = feed_cache.get_or_set(
+        ("similar", listing_id, limit), lambda: encode_list(recommendation_service.get_similar(listing_id, limit), encode_listings)
+    )
+    return conditional_response(request, cached.body, cached.etag, PUBLIC_REVALIDATE)
+
+@router.put("/{listing_id}", response_model=ListingResponse)
+async def update_listing(listing_id: str, listing_in: ListingUpdate, current_user: dict = Depends(get_current_user)):
+    return await _update_listing(listing_id, listing_in, current_user['uid'])
 
 @router.patch("/{listing_id}", response_model=ListingResponse)
-def patch_listing(listing_id: str, listing_in: ListingUpdate, current_user: dict = Depends(get_current_user)):
+async def patch_listing(listing_id: str, listing_in: ListingUpdate, current_user: dict = Depends(get_current_user)):
     """
     Partially update a listing.
     """
-    try:
-        updated = listing_service.update_listing(listing_id, listing_in, current_user['uid'])
-        if not updated:
-            raise HTTPException(status_code=404, detail="Listing not found")
-        return updated
-    except PermissionError:
-        raise HTTPException(status_code=403, detail="Not authorized to update this listing")
+    return await _update_listing(listing_id, listing_in, current_user['uid'])
 
 @router.post("/{listing_id}/favorite")
 def toggle_favorite(listing_id: str, current_user: dict = Depends(get_current_user)):
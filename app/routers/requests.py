@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Literal
-from app.models.request import RequestResponse, RequestCreate, RequestUpdate
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Literal, Optional
+from app.models.request import RequestResponse, RequestCreate, RequestUpdate, PendingCount
 from app.services.request_service import request_service
 from app.core.security import get_current_user
+from app.core.pagination import decode_cursor, InvalidCursor
 
 router = APIRouter()
 
@@ -15,14 +17,37 @@ def create_request(request: RequestCreate, current_user: dict = Depends(get_curr
 
 @router.get("/", response_model=List[RequestResponse])
 def get_requests(
+    response: Response,
     role: Literal["requester", "seller"],
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """
     role='requester': Get requests I made (Outbound)
     role='seller': Get requests for my items (Inbound)
+    Newest first. If there are more, the X-Next-Cursor header holds the
+    value to pass as ?cursor= for the next page.
     """
-    return request_service.get_requests(role, current_user['uid'])
+    try:
+        start = decode_cursor(cursor)
+        # A token from another endpoint decodes fine but doesn't fit this query's order
+        if start is not None and (set(start) != {"created_at", "__name__"}
+                                  or not isinstance(start["created_at"], datetime)
+                                  or not isinstance(start["__name__"], str)):
+            raise InvalidCursor("Cursor doesn't match this listing of requests")
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    items, next_cursor = request_service.get_requests(role, current_user['uid'], status, limit, start)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+@router.get("/pending-count", response_model=PendingCount)
+def get_pending_count(current_user: dict = Depends(get_current_user)):
+    """Pending requests on my items (the inbox badge)."""
+    return {"pending": request_service.get_pending_count(current_user['uid'])}
 
 @router.put("/{request_id}/status", response_model=RequestResponse)
 def update_request_status(
@@ -0,0 +1,25 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from app.models.sync import SyncResponse
+from app.services.sync_service import sync_service
+from app.core.security import get_current_user
+from app.core.pagination import decode_cursor, InvalidCursor
+
+router = APIRouter()
+
+@router.get("", response_model=SyncResponse)
+def sync(since: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """
+    Your listings, favorites, chats, requests and notifications changed since
+    the token from your last sync. Without ?since= (first launch), or when the
+    token is too old, everything is returned with full=true.
+    """
+    try:
+        token = decode_cursor(since)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    as_of = token.get("as_of") if token else None
+    if token is not None and not isinstance(as_of, datetime):
+        raise HTTPException(status_code=400, detail="Malformed sync token")
+    return sync_service.sync(current_user['uid'], as_of)
@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from app.models.user import UserResponse, UserCreate, UserUpdate
 from app.services.user_service import user_service
 from app.core.security import get_current_user
+from app.core.responses import conditional_response, content_etag
 
 router = APIRouter()
 
+def _profile_response(request: Request, user: dict):
+    # User docs carry hashed_password, so always go through UserResponse before hashing/sending
+    body = UserResponse.model_validate(user).model_dump_json().encode()
+    return conditional_response(request, body, content_etag(body))
+
 @router.post("/me", response_model=UserResponse)
 def create_or_update_me(user_in: UserCreate, current_user: dict = Depends(get_current_user)):
     """
@@ -14,6 +20,9 @@ def create_or_update_me(user_in: UserCreate, current_user: dict = Depends(get_cu
     """
     if current_user['uid'] != user_in.uid:
         raise HTTPException(status_code=403, detail="UID mismatch")
+    if user_in.role == "admin":
+        # Admins are promoted in Firestore by hand; they gate the /admin routes
+        raise HTTPException(status_code=403, detail="Cannot assign the admin role")
     
     existing = user_service.get_user(user_in.uid)
     if existing:
@@ -25,22 +34,24 @@ def create_or_update_me(user_in: UserCreate, current_user: dict = Depends(get_cu
     return user_service.create_user(user_in)
 
 @router.get("/me", response_model=UserResponse)
-def get_me(current_user: dict = Depends(get_current_user)):
+def get_me(request: Request, current_user: dict = Depends(get_current_user)):
     uid = current_user['uid']
     user = user_service.get_user(uid)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return _profile_response(request, user)
 
 @router.get("/{uid}", response_model=UserResponse)
-def get_user(uid: str, current_user: dict = Depends(get_current_user)):
+def get_user(uid: str, request: Request, current_user: dict = Depends(get_current_user)):
     user = user_service.get_user(uid)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return _profile_response(request, user)
 
 @router.put("/me", response_model=UserResponse)
 def update_me(user_in: UserUpdate, current_user: dict = Depends(get_current_user)):
     uid = current_user['uid']
     updated_user = user_service.update_user(uid, user_in)
+    if not updated_user:
+        raise HTTPException(status_code=404, detail="User not found")
     return updated_user
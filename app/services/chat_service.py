@@ -1,9 +1,48 @@
 from firebase_admin import firestore
-from app.core.config import get_db
+from google.api_core import exceptions
+from google.cloud.firestore_v1.field_path import FieldPath
+from app.core.config import get_db, settings
+from app.core.db import read_doc, read_query, write_deadline
 from app.models.chat import MessageCreate
-from datetime import datetime
+from app.services.listing_service import listing_service
+from app.services.image_service import listing_thumbnail
+from datetime import datetime, timedelta
+from typing import List, Optional
+import orjson
 import uuid
 
+# message_layout values: one doc per message (the default for old chats) or bucket docs
+DOCS = "docs"
+BUCKETS = "buckets"
+# Messages returned when a chat is opened
+MESSAGE_LIMIT = 100
+# Buckets read besides the one cached on the chat doc, so a chat open is 1-3 reads
+OLDER_BUCKETS = 2
+# Bucket docs and the chat doc's copy of the newest one must stay under Firestore's 1 MiB
+MAX_BUCKET_BYTES = 256 * 1024
+# What the chat list shows: never the cached bucket (up to MAX_BUCKET_BYTES) on the same doc
+LIST_FIELDS = ['id', 'participants', 'listing_id', 'status', 'last_message', 'last_message_time', 'unread_count', 'updated_at']
+
+def _naive(dt: datetime) -> datetime:
+    # Firestore hands back aware UTC datetimes; we write naive utcnow()
+    return dt.replace(tzinfo=None) if dt.tzinfo else dt
+
+def bucket_id(started: datetime) -> str:
+    # Sorts chronologically, so the newest buckets come first ordered by __name__ DESC
+    return _naive(started).strftime("%Y%m%dT%H%M%S%f")
+
+def message_size(message: dict) -> int:
+    return len(orjson.dumps(message))
+
+def bucket_full(count: int, size: int, started: Optional[datetime], message: dict) -> bool:
+    """Whether `message` has to open a new bucket rather than join the current one."""
+    return (
+        started is None
+        or count >= settings.CHAT_BUCKET_SIZE
+        or size + message_size(message) > MAX_BUCKET_BYTES
+        or _naive(message['created_at']) - _naive(started) >= timedelta(hours=settings.CHAT_BUCKET_HOURS)
+    )
+
 class ChatService:
     def __init__(self):
         self._db = None
@@ -35,11 +74,14 @@ class ChatService:
         chat_id = f"{listing_id}_{requester_id}"
         
         doc_ref = self.collection.document(chat_id)
-        if doc_ref.get().exists:
-            return doc_ref.get().to_dict()
+        existing = read_doc("chats.get", doc_ref)
+        if existing.exists:
+            return existing.to_dict()
             
+        now = datetime.utcnow()
         chat_data = {
             "id": chat_id,
+            "message_layout": BUCKETS if settings.CHAT_MESSAGE_BUCKETS else DOCS,
             "participants": [seller_id, requester_id],
             "listing_id": listing_id,
             "status": "open",
@@ -48,14 +90,19 @@ class ChatService:
             "unread_count": {
                 seller_id: 0,
                 requester_id: 0
-            }
+            },
+            "created_at": now,
+            "updated_at": now,
         }
-        doc_ref.set(chat_data)
+        try:
+            # create() rather than set(): a concurrent start must not reset the chat
+            doc_ref.create(chat_data, **write_deadline())
+        except exceptions.AlreadyExists:
+            return read_doc("chats.get", doc_ref).to_dict()
         return chat_data
 
     def start_chat(self, listing_id: str, requester_uid: str):
         # 1. Get listing to find owner
-        from app.services.listing_service import listing_service
         listing = listing_service.get_listing(listing_id)
         if not listing:
             raise ValueError("Listing not found")
@@ -72,12 +119,10 @@ class ChatService:
 
     def get_chats(self, uid: str):
         # Query where participants array contains uid
-        query = self.collection.where(filter=firestore.FieldFilter("participants", "array_contains", uid))
-        docs = query.stream()
+        query = self.collection.where(filter=firestore.FieldFilter("participants", "array_contains", uid)).select(LIST_FIELDS)
+        docs = read_query("chats.list", query, stale_key=uid)
         
         chat_list = []
-        from app.services.listing_service import listing_service
-        
         for doc in docs:
             data = doc.to_dict()
             listing_id = data.get('listing_id')
@@ -86,8 +131,7 @@ class ChatService:
                 if listing:
                     data['listing_title'] = listing.get('title')
                     # Get first image if available
-                    images = listing.get('images', [])
-                    data['listing_image'] = images[0] if images else None
+                    data['listing_image'] = listing_thumbnail(listing)
             
             chat_list.append(data)
             
@@ -96,25 +140,30 @@ class ChatService:
     def get_messages(self, chat_id: str, uid: str):
         # Verify participation
         chat_ref = self.collection.document(chat_id)
-        chat = chat_ref.get()
+        chat = read_doc("chats.get", chat_ref)
         if not chat.exists:
             return None
         
-        if uid not in chat.get('participants'):
+        data = chat.to_dict()
+        if uid not in data['participants']:
             raise PermissionError("Not a participant")
             
         # Optimization: Reset unread count for this user
         # Note: In a real app, this might be a separate "mark read" call
-        unread_map = chat.get('unread_count') or {}
+        unread_map = data.get('unread_count') or {}
         if unread_map.get(uid, 0) > 0:
-            unread_map[uid] = 0
-            chat_ref.update({"unread_count": unread_map})
+            # Only this user's entry: a concurrent send may be bumping the other one
+            chat_ref.update({
+                FieldPath('unread_count', uid).to_api_repr(): 0,
+                "updated_at": datetime.utcnow(),
+            }, **write_deadline())
+
+        if data.get('message_layout') == BUCKETS:
+            return self._bucketed_messages(chat_ref, data)
 
-        # Get messages subcollection
-        # Get messages subcollection
         # We want the LAST 100 messages.
         # So we order by created_at DESCENDING, limit 100, then reverse.
-        msgs = chat_ref.collection('messages').order_by('created_at', direction=firestore.Query.DESCENDING).limit(100).stream()
+        msgs = read_query("messages.recent", chat_ref.collection('messages').order_by('created_at', direction=firestore.Query.DESCENDING).limit(MESSAGE_LIMIT))
         
         # Convert to list
         results = [{**m.to_dict(), "id": m.id} for m in msgs]
@@ -123,38 +172,91 @@ class ChatService:
         results.reverse()
         return results
 
+    def _bucketed_messages(self, chat_ref, chat: dict) -> List[dict]:
+        # The newest bucket is cached on the chat doc, which was already read
+        messages = list(chat.get('recent_messages') or [])
+        if len(messages) < MESSAGE_LIMIT and chat.get('bucket_id'):
+            older = (
+                chat_ref.collection('message_buckets')
+                .order_by('__name__', direction=firestore.Query.DESCENDING)
+                .start_after({'__name__': chat['bucket_id']})
+                .limit(OLDER_BUCKETS)
+            )
+            for bucket in read_query("message_buckets.older", older):
+                messages = bucket.to_dict()['messages'] + messages
+                if len(messages) >= MESSAGE_LIMIT:
+                    break
+        return messages[-MESSAGE_LIMIT:]
+
+    def _append_to_bucket(self, transaction, chat_ref, chat: dict, msg_data: dict) -> dict:
+        """Queue the bucket write for one message; returns the chat doc fields to update."""
+        buckets = chat_ref.collection('message_buckets')
+        recent = chat.get('recent_messages') or []
+        if bucket_full(len(recent), chat.get('bucket_bytes', 0), chat.get('bucket_started'), msg_data):
+            new_id = bucket_id(msg_data['created_at'])
+            transaction.set(buckets.document(new_id), {"messages": [msg_data], "started": msg_data['created_at']})
+            return {
+                "bucket_id": new_id,
+                "bucket_started": msg_data['created_at'],
+                "bucket_bytes": message_size(msg_data),
+                "recent_messages": [msg_data],
+            }
+        # Each message has a unique id, so ArrayUnion never drops one as a duplicate
+        transaction.update(buckets.document(chat['bucket_id']), {"messages": firestore.ArrayUnion([msg_data])})
+        return {
+            "bucket_bytes": firestore.Increment(message_size(msg_data)),
+            "recent_messages": firestore.ArrayUnion([msg_data]),
+        }
+
     def send_message(self, chat_id: str, message: MessageCreate, sender_id: str):
         chat_ref = self.collection.document(chat_id)
-        chat = chat_ref.get()
-        if not chat.exists:
-            raise ValueError("Chat not found")
-        
-        participants = chat.get('participants')
-        if sender_id not in participants:
-            raise PermissionError("Not a participant")
-            
-        # Create message in subcollection
         msg_data = message.model_dump()
         msg_data['sender_id'] = sender_id
         msg_data['created_at'] = datetime.utcnow()
-        
-        msg_ref = chat_ref.collection('messages').document()
-        msg_ref.set(msg_data)
-        
-        # Update chat doc
-        recipient_id = next((p for p in participants if p != sender_id), None)
+        msg_data['id'] = chat_ref.collection('messages').document().id
         updates = {
             "last_message": message.text or ("Image" if message.type == "image" else "Location"),
-            "last_message_time": msg_data['created_at']
+            "last_message_time": msg_data['created_at'],
+            "updated_at": msg_data['created_at'],
         }
-        
-        # Increment unread for recipient
-        if recipient_id:
-            unread_map = chat.get('unread_count') or {}
-            unread_map[recipient_id] = unread_map.get(recipient_id, 0) + 1
-            updates["unread_count"] = unread_map
-            
-        chat_ref.update(updates)
-        return {**msg_data, "id": msg_ref.id}
+
+        def check(snap) -> dict:
+            if not snap.exists:
+                raise ValueError("Chat not found")
+            chat = snap.to_dict()
+            if sender_id not in chat['participants']:
+                raise PermissionError("Not a participant")
+            return chat
+
+        chat = check(read_doc("chats.get", chat_ref))
+        if chat.get('message_layout') != BUCKETS:
+            # One message doc per message: a single batch, with the unread bump as an
+            # Increment on the recipient's entry so concurrent senders can't lose one
+            recipient_id = next((p for p in chat['participants'] if p != sender_id), None)
+            if recipient_id:
+                updates[FieldPath('unread_count', recipient_id).to_api_repr()] = firestore.Increment(1)
+            batch = self.db.batch()
+            batch.set(chat_ref.collection('messages').document(msg_data['id']), {k: v for k, v in msg_data.items() if k != 'id'})
+            batch.update(chat_ref, updates)
+            batch.commit(**write_deadline())
+            return msg_data
+
+        @firestore.transactional
+        def append(transaction):
+            # The bucket append depends on the chat doc's copy of the open bucket, so it
+            # needs a transaction: two senders must not both extend (or open) the same one
+            # Begin and commit run on the client library's own deadlines; it takes none for them
+            current = check(chat_ref.get(transaction=transaction, **write_deadline()))
+            chat_updates = dict(updates)
+            recipient_id = next((p for p in current['participants'] if p != sender_id), None)
+            if recipient_id:
+                unread_map = current.get('unread_count') or {}
+                unread_map[recipient_id] = unread_map.get(recipient_id, 0) + 1
+                chat_updates["unread_count"] = unread_map
+            chat_updates.update(self._append_to_bucket(transaction, chat_ref, current, msg_data))
+            transaction.update(chat_ref, chat_updates)
+
+        append(self.db.transaction())
+        return msg_data
 
 chat_service = ChatService()
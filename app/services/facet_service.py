@@ -0,0 +1,127 @@
+from firebase_admin import firestore
+from app.core.config import get_db, settings
+from app.core.db import read_all, write_deadline
+from collections import defaultdict
+from typing import Dict, Optional
+import random
+
+# Facet dimension -> how to read its value from a listing doc
+DIMENSIONS = {
+    "category": lambda l: l.get('category'),
+    "type": lambda l: l.get('type'),
+    "city": lambda l: (l.get('location') or {}).get('city'),
+    "district": lambda l: (l.get('location') or {}).get('district'),
+    "status": lambda l: l.get('status'),
+}
+# Filter facets describe what a user can still find, so they only count active listings.
+# The status facet counts everything.
+ACTIVE_ONLY = {"category", "type", "city", "district"}
+
+class FacetService:
+    """
+    Listing counts per facet value, kept in sharded counter docs:
+    listing_facets/{dimension}_{shard} = {"counts": {value: n}}.
+    Writers increment a random shard so a hot category doesn't hit
+    Firestore's per-document write rate; readers sum all shards.
+    """
+    def __init__(self):
+        self._db = None
+        self._collection = None
+        self.shards = settings.FACET_SHARDS
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = get_db()
+        return self._db
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = self.db.collection('listing_facets')
+        return self._collection
+
+    def _shard_ref(self, dimension: str, shard: int):
+        return self.collection.document(f"{dimension}_{shard}")
+
+    @staticmethod
+    def _contributions(listing: Optional[dict]):
+        if not listing:
+            return {}
+        active = listing.get('status', 'active') == 'active'
+        out = {}
+        for dimension, read in DIMENSIONS.items():
+            if dimension in ACTIVE_ONLY and not active:
+                continue
+            value = read(listing)
+            if value:
+                out[dimension] = value
+        return out
+
+    def deltas(self, before: Optional[dict], after: Optional[dict]) -> Dict[str, Dict[str, int]]:
+        """Counter changes for a listing going from `before` to `after` (None = absent)."""
+        changes = defaultdict(lambda: defaultdict(int))
+        for dimension, value in self._contributions(before).items():
+            changes[dimension][value] -= 1
+        for dimension, value in self._contributions(after).items():
+            changes[dimension][value] += 1
+        return {
+            dimension: {value: n for value, n in values.items() if n}
+            for dimension, values in changes.items()
+            if any(values.values())
+        }
+
+    @staticmethod
+    def merge(total: Dict[str, Dict[str, int]], more: Dict[str, Dict[str, int]]):
+        for dimension, values in more.items():
+            bucket = total.setdefault(dimension, {})
+            for value, n in values.items():
+                bucket[value] = bucket.get(value, 0) + n
+        return total
+
+    def add_to_batch(self, batch, deltas: Dict[str, Dict[str, int]]):
+        """
+        Queue atomic increments on `batch` (one write per dimension), so the counters
+        commit together with the listing write that caused them.
+        """
+        for dimension, values in deltas.items():
+            increments = {value: firestore.Increment(n) for value, n in values.items() if n}
+            if increments:
+                # Nested dict + merge: facet values are map keys, never parsed as field paths
+                ref = self._shard_ref(dimension, random.randrange(self.shards))
+                batch.set(ref, {"counts": increments}, merge=True)
+
+    def get_facets(self) -> Dict[str, Dict[str, int]]:
+        refs = [self._shard_ref(d, s) for d in DIMENSIONS for s in range(self.shards)]
+        totals = {dimension: {} for dimension in DIMENSIONS}
+        # One batched read of dimensions x shards docs, regardless of listing count
+        for snap in read_all("facets.get", self.db, refs, stale_key="totals"):
+            if not snap.exists:
+                continue
+            dimension = snap.id.rsplit('_', 1)[0]
+            for value, n in (snap.to_dict().get('counts') or {}).items():
+                totals[dimension][value] = totals[dimension].get(value, 0) + n
+        return {
+            dimension: dict(sorted(((v, n) for v, n in values.items() if n > 0), key=lambda kv: -kv[1]))
+            for dimension, values in totals.items()
+        }
+
+    def rebuild(self) -> Dict[str, Dict[str, int]]:
+        """
+        Recount every facet from the listings collection and overwrite the shards.
+        Increments that land while this runs can be lost, so schedule it off-peak.
+        """
+        totals = {dimension: {} for dimension in DIMENSIONS}
+        fields = ['category', 'type', 'location', 'status']
+        for doc in self.db.collection('listings').select(fields).stream():
+            self.merge(totals, {d: {v: 1} for d, v in self._contributions(doc.to_dict()).items()})
+
+        batch = self.db.batch()
+        for dimension in DIMENSIONS:
+            for shard in range(self.shards):
+                counts = totals[dimension] if shard == 0 else {}
+                batch.set(self._shard_ref(dimension, shard), {"counts": counts})
+        batch.commit(**write_deadline())
+        return totals
+
+facet_service = FacetService()
@@ -0,0 +1,147 @@
+from firebase_admin import firestore
+from app.core.config import get_db, settings
+from app.core.db import read_all, read_doc, write_deadline
+from app.core import images
+from app.core.images import VARIANTS, CONTENT_TYPE
+from app.core.uploads import UploadedFile
+from fastapi.concurrency import run_in_threadpool
+from datetime import datetime
+from typing import Dict, List, Optional
+import asyncio
+import uuid
+
+def image_url(image_id: str, variant: str) -> str:
+    return f"{settings.PUBLIC_BASE_URL}/images/{image_id}/{variant}"
+
+def image_urls(listing: dict, variant: str) -> List[str]:
+    """Image URLs of a listing at the given size; legacy listings keep their stored images."""
+    if listing.get('image_ids'):
+        return [image_url(image_id, variant) for image_id in listing['image_ids']]
+    return listing.get('images', [])
+
+def listing_thumbnail(listing: dict) -> Optional[str]:
+    thumbs = image_urls(listing, "thumb")
+    return thumbs[0] if thumbs else None
+
+class ImageService:
+    """
+    Transcoded listing images:
+    listing_images/{id} = metadata, listing_images/{id}/variants/{name} = {"data": bytes}.
+    Ids are never reused, so a variant URL's content never changes.
+    """
+    def __init__(self):
+        self._db = None
+        self._collection = None
+        self._slots = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = get_db()
+        return self._db
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = self.db.collection('listing_images')
+        return self._collection
+
+    def _variant_ref(self, image_id: str, variant: str):
+        return self.collection.document(image_id).collection('variants').document(variant)
+
+    def store(self, variants: Dict[str, images.Variant], owner_uid: str) -> str:
+        image_id = f"img_{uuid.uuid4().hex[:12]}"
+        batch = self.db.batch()
+        batch.set(self.collection.document(image_id), {
+            "id": image_id,
+            "owner_id": owner_uid,
+            "content_type": CONTENT_TYPE,
+            "sizes": {name: [v.width, v.height] for name, v in variants.items()},
+            # Set once a listing uses the image; uploads never attached get purged
+            "listing_id": None,
+            "created_at": datetime.utcnow(),
+        })
+        for name, variant in variants.items():
+            batch.set(self._variant_ref(image_id, name), {"data": variant.data})
+        batch.commit(**write_deadline())
+        return image_id
+
+    async def _ingest(self, items, transcode_one, owner_uid: str) -> List[str]:
+        if self._slots is None:
+            # Bounds how many decoded images are in memory (and queued on the pool) at once
+            self._slots = asyncio.Semaphore(settings.IMAGE_WORKERS * 2)
+
+        async def one(item):
+            async with self._slots:
+                variants = await transcode_one(item)
+                return await run_in_threadpool(self.store, variants, owner_uid)
+        results = await asyncio.gather(*(one(item) for item in items), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            # All or nothing: don't leave the good ones behind unreferenced
+            await run_in_threadpool(self.delete, [r for r in results if isinstance(r, str)])
+            raise errors[0]
+        return results
+
+    async def ingest_data_uris(self, uris: List[str], owner_uid: str) -> List[str]:
+        """Transcode base64 data URIs in the worker pool and store them. Returns ids in input order."""
+        return await self._ingest(uris, lambda uri: images.run_in_pool(images.transcode_data_uri, uri), owner_uid)
+
+    async def ingest_files(self, files: List[UploadedFile], owner_uid: str) -> List[str]:
+        """Same for uploaded files; each is read from its spool only once a worker slot is free."""
+        async def transcode_file(f):
+            data = await run_in_threadpool(f.read)
+            return await images.run_in_pool(images.transcode, data)
+        return await self._ingest(files, transcode_file, owner_uid)
+
+    def check_usable(self, image_ids: List[str], owner_uid: str, listing_id: Optional[str] = None) -> Dict[str, datetime]:
+        """
+        Raise ValueError unless every id is an image uploaded by owner_uid that isn't
+        already part of another listing. Returns each image's update_time as read, for
+        attach_to_batch to claim them only if they are still in that state.
+        """
+        snaps = read_all("images.get_many", self.db, [self.collection.document(i) for i in dict.fromkeys(image_ids)], field_paths=['owner_id', 'listing_id'])
+        found = {snap.id: snap for snap in snaps if snap.exists}
+        for image_id in image_ids:
+            meta = found[image_id].to_dict() if image_id in found else None
+            # Someone else's image is reported as unknown, not as forbidden
+            if not meta or meta.get('owner_id') != owner_uid:
+                raise ValueError(f"Unknown image id: {image_id}")
+            if meta.get('listing_id') not in (None, listing_id):
+                raise ValueError(f"Image {image_id} belongs to another listing")
+        return {image_id: found[image_id].update_time for image_id in image_ids}
+
+    def attach_to_batch(self, batch, image_ids: List[str], listing_id: str, versions: Optional[Dict[str, datetime]] = None):
+        """
+        Queue the claim of image_ids by listing_id. Images with a version from check_usable
+        are claimed only if unchanged since, so two listings racing for one image can't both
+        win: the loser's commit fails with FailedPrecondition. Images without one were just
+        stored by the caller and can't be claimed by anyone else.
+        """
+        versions = versions or {}
+        for image_id in image_ids:
+            option = firestore.Client.write_option(last_update_time=versions[image_id]) if image_id in versions else None
+            batch.update(self.collection.document(image_id), {"listing_id": listing_id}, option=option)
+
+    def get_variant(self, image_id: str, variant: str) -> Optional[bytes]:
+        if variant not in VARIANTS:
+            return None
+        snap = read_doc("image_variants.get", self._variant_ref(image_id, variant))
+        if not snap.exists:
+            return None
+        return snap.to_dict().get('data')
+
+    def delete_to_batch(self, batch, image_ids: List[str]):
+        for image_id in image_ids:
+            for name in VARIANTS:
+                batch.delete(self._variant_ref(image_id, name))
+            batch.delete(self.collection.document(image_id))
+
+    def delete(self, image_ids: List[str]):
+        if not image_ids:
+            return
+        batch = self.db.batch()
+        self.delete_to_batch(batch, image_ids)
+        batch.commit(**write_deadline())
+
+image_service = ImageService()
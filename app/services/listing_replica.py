@@ -0,0 +1,181 @@
+import heapq
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from app.core.config import get_db
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Secondary indexes: name -> how to read the indexed value from a listing doc
+INDEXES = {
+    "owner_id": lambda l: l.get('owner_id'),
+    "status": lambda l: l.get('status'),
+    "category": lambda l: l.get('category'),
+    "type": lambda l: l.get('type'),
+    "city": lambda l: (l.get('location') or {}).get('city'),
+    "district": lambda l: (l.get('location') or {}).get('district'),
+}
+# Document field path -> index name, for filters written as Firestore paths
+FIELD_PATHS = {"location.city": "city", "location.district": "district"}
+# How often the supervisor checks the listener, and the longest wait between reconnects
+CHECK_INTERVAL = 5.0
+MAX_BACKOFF = 60.0
+
+_lag = registry.gauge("listing_replica_lag_seconds", "Delay between a listing write and the replica applying it")
+_resyncs = registry.counter("listing_replica_resyncs_total", "Full snapshots applied (startup and every reconnect)")
+_reconnects = registry.counter("listing_replica_reconnects_total", "Listener restarts after the stream died")
+
+class ListingReplica:
+    """
+    In-process copy of the listings collection, kept current by an on_snapshot listener.
+    The first snapshot after (re)subscribing is the bulk load and replaces everything;
+    after that only the changed docs are applied. A supervisor thread restarts the
+    listener if its stream dies, and the replica reports not-ready until the new
+    snapshot lands, so callers fall back to Firestore in the meantime.
+    Stored dicts are replaced on change, never mutated, so readers can hand them out.
+    """
+    def __init__(self):
+        self._docs: Dict[str, dict] = {}
+        self._index: Dict[str, Dict[str, Set[str]]] = {name: {} for name in INDEXES}
+        self._lock = threading.RLock()
+        self._watch = None
+        self._synced = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        registry.gauge("listing_replica_docs", "Listings held in the local replica", fn=lambda: len(self._docs))
+        registry.gauge("listing_replica_ready", "1 while the replica is serving reads", fn=lambda: int(self.ready))
+
+    @property
+    def ready(self) -> bool:
+        return self._synced and self._watch is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._supervise, name="listing-replica", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._unsubscribe()
+        self._thread = None
+
+    def _subscribe(self):
+        self._synced = False
+        self._watch = get_db().collection('listings').on_snapshot(self._on_snapshot)
+
+    def _unsubscribe(self):
+        watch, self._watch, self._synced = self._watch, None, False
+        if watch is not None:
+            try:
+                watch.unsubscribe()
+            except Exception:
+                logger.debug("Listener close failed", exc_info=True)
+
+    def _supervise(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            watch = self._watch
+            if watch is None or not getattr(watch, "is_active", True):
+                if watch is not None:
+                    logger.warning("Listing replica listener stopped, resubscribing")
+                    _reconnects.inc()
+                    self._unsubscribe()
+                try:
+                    self._subscribe()
+                    backoff = 1.0
+                except Exception:
+                    logger.exception("Listing replica subscribe failed, retrying in %.0f s", backoff)
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, MAX_BACKOFF)
+                    continue
+            self._stop.wait(CHECK_INTERVAL)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        # Runs on the listener's thread
+        with self._lock:
+            if not self._synced:
+                self._docs = {}
+                self._index = {name: {} for name in INDEXES}
+                for snap in docs:
+                    self._put(snap.id, snap.to_dict())
+                self._synced = True
+                _resyncs.inc()
+                logger.info("Listing replica loaded %d listings", len(self._docs))
+                return
+            for change in changes:
+                snap = change.document
+                if change.type.name == "REMOVED":
+                    self._drop(snap.id)
+                else:
+                    self._put(snap.id, snap.to_dict())
+        latest = max((c.document.update_time for c in changes if c.document.update_time), default=None)
+        if latest is not None:
+            _lag.set(max(0.0, datetime.now(timezone.utc).timestamp() - latest.timestamp()))
+
+    def _put(self, listing_id: str, data: dict):
+        self._drop(listing_id)
+        self._docs[listing_id] = data
+        for name, read in INDEXES.items():
+            value = read(data)
+            if value is not None:
+                self._index[name].setdefault(value, set()).add(listing_id)
+
+    def _drop(self, listing_id: str):
+        old = self._docs.pop(listing_id, None)
+        if old is None:
+            return
+        for name, read in INDEXES.items():
+            bucket = self._index[name].get(read(old))
+            if bucket is not None:
+                bucket.discard(listing_id)
+                if not bucket:
+                    del self._index[name][read(old)]
+
+    def get(self, listing_id: str) -> Optional[dict]:
+        return self._docs.get(listing_id)
+
+    def query(self, limit: int, **filters) -> List[dict]:
+        """
+        Equality filters on indexed fields, answered like the Firestore query
+        they replace: matches in document id order, first `limit`.
+        """
+        with self._lock:
+            return [self._docs[i] for i in sorted(self._matching(filters))[:limit]]
+
+    def ordered(self, limit: int, field: str, descending: bool, after: Optional[Tuple[Any, str]] = None,
+                low=None, high=None, filters: Optional[Dict[str, str]] = None) -> List[dict]:
+        """
+        Sorted page, answered like Firestore's order_by(field).order_by(__name__)
+        with an optional low <= field <= high range and start_after cursor.
+        filters use document field paths (location.city); docs without `field` are skipped.
+        """
+        by_index = {FIELD_PATHS.get(path, path): value for path, value in (filters or {}).items()}
+        with self._lock:
+            keys = []
+            for i in self._matching(by_index):
+                value = self._docs[i].get(field)
+                if value is None or (low is not None and value < low) or (high is not None and value > high):
+                    continue
+                keys.append((value, i))
+            if after is not None:
+                keys = [k for k in keys if (k < after if descending else k > after)]
+            top = heapq.nlargest(limit, keys) if descending else heapq.nsmallest(limit, keys)
+            return [self._docs[i] for _, i in top]
+
+    def _matching(self, filters: dict) -> Iterable[str]:
+        wanted = [self._index[name].get(value, set()) for name, value in filters.items() if value]
+        if not wanted:
+            return self._docs.keys()
+        wanted.sort(key=len)
+        return wanted[0].intersection(*wanted[1:])
+
+    def newest(self, n: int, status: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            docs = self._docs.values() if status is None else [self._docs[i] for i in self._index["status"].get(status, ())]
+            return heapq.nlargest(n, docs, key=lambda l: l.get('created_at') or datetime.min.replace(tzinfo=timezone.utc))
+
+listing_replica = ListingReplica()
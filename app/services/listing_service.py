@@ -1,15 +1,92 @@
 from firebase_admin import firestore
+from google.api_core import exceptions
 from app.core.config import get_db
 from app.models.listing import ListingCreate, ListingUpdate
 from app.services.user_service import user_service
+from app.services.facet_service import facet_service, DIMENSIONS
+from app.services.image_service import image_service, image_urls
+from app.services.listing_replica import listing_replica
+from app.core.cache import feed_cache
+from app.core.singleflight import SingleFlight
+from app.core.db import WriteConflict, guarded_update, apply_patch, read_all, read_doc, read_query, write_deadline
+from app.core.indexes import ASCENDING, DESCENDING, can_serve
+from app.core.pagination import InvalidCursor, page_cursor
 from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 import uuid
 import random
 
+# Feeds, search and suggestions only show listings in this status. Completed and
+# archived ones are moved to archived_listings by app/jobs/archive_listings.py.
+FEED_STATUS = "active"
+ARCHIVE = 'archived_listings'
+
+# ?sort= value -> (field, direction); __name__ in the same direction breaks ties
+SORTS = {
+    "price": ("price", ASCENDING),
+    "-price": ("price", DESCENDING),
+    "created_at": ("created_at", ASCENDING),
+    "-created_at": ("created_at", DESCENDING),
+}
+# Feed equality filter -> document field
+FEED_FILTERS = {"category": "category", "type": "type", "city": "location.city", "district": "location.district"}
+
+class FeedQuery(NamedTuple):
+    """A validated sorted feed query. Hashable, so it can key caches and single-flights."""
+    filters: Tuple[Tuple[str, str], ...]   # (field path, value), status included
+    field: str
+    direction: str
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    after: Optional[Tuple[Any, str]] = None  # (order field value, doc id) of the last item seen
+
+def plan_feed_query(filters: dict, min_price: Optional[float] = None, max_price: Optional[float] = None,
+                    sort: Optional[str] = None, cursor: Optional[dict] = None, search_text: Optional[str] = None) -> FeedQuery:
+    """
+    Turn feed parameters into a FeedQuery, or raise ValueError for a combination
+    Firestore can't serve with the indexes in firestore.indexes.json.
+    """
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise ValueError("min_price is greater than max_price")
+    ranged = min_price is not None or max_price is not None
+    if sort is None:
+        if cursor:
+            raise ValueError("cursor needs sort")
+        # The range field has to be the first sort key anyway
+        sort = "price"
+    if sort not in SORTS:
+        raise ValueError(f"sort must be one of {', '.join(SORTS)}")
+    field, direction = SORTS[sort]
+    if ranged and field != "price":
+        raise ValueError("min_price/max_price need sort=price or sort=-price")
+    if cursor and search_text:
+        raise ValueError("Search results come in a single page; drop cursor")
+
+    equalities = {FEED_FILTERS[name]: value for name, value in filters.items() if value}
+    equalities["status"] = FEED_STATUS
+    if not can_serve('listings', equalities, (field, direction)):
+        raise ValueError("This combination of filters and sort is not supported")
+
+    after = None
+    if cursor:
+        if set(cursor) != {field, "__name__"}:
+            raise InvalidCursor("Cursor doesn't match sort")
+        after = (cursor[field], cursor["__name__"])
+    return FeedQuery(tuple(sorted(equalities.items())), field, direction, min_price, max_price, after)
+
+# Firestore's limit on writes per batch commit
+BATCH_LIMIT = 500
+# Bulk commits also carry one facet counter write per dimension
+BULK_CHUNK = BATCH_LIMIT - len(DIMENSIONS)
+# Docs per read when streaming an export
+EXPORT_PAGE = 500
+
 class ListingService:
     def __init__(self):
         self._db = None
         self._collection = None
+        # Hot listings/feeds are requested by many clients at once; share one read per key
+        self._flights = SingleFlight('listings')
 
     @property
     def db(self):
@@ -23,10 +100,30 @@ class ListingService:
             self._collection = self.db.collection('listings')
         return self._collection
 
+    @property
+    def archive(self):
+        return self.db.collection(ARCHIVE)
+
     def get_listings(self, category: str = None, type: str = None, city: str = None, district: str = None, owner_id: str = None, search_text: str = None):
+        search_text = search_text.strip().lower() if search_text and search_text.strip() else None
+        key = ('query', owner_id, category, type, city, district, search_text)
+        return self._flights.do(key, lambda: self._query_listings(category, type, city, district, owner_id, search_text))
+
+    def _query_listings(self, category, type, city, district, owner_id, search_text):
+        # If searching, we fetch a bit more to ensure we find matches
+        limit = 1000 if search_text else 50
+        # An owner sees all of their live listings, whatever the status; everyone else the feed.
+        # Archived listings are left out, as /sync reports them deleted
+        status = None if owner_id else FEED_STATUS
+        if listing_replica.ready:
+            results = listing_replica.query(limit, owner_id=owner_id, status=status, category=category, type=type, city=city, district=district)
+            return self._search(results, search_text)
+
         query = self.collection
         if owner_id:
             query = query.where(filter=firestore.FieldFilter("owner_id", "==", owner_id))
+        if status:
+            query = query.where(filter=firestore.FieldFilter("status", "==", status))
         if category:
             query = query.where(filter=firestore.FieldFilter("category", "==", category))
         if type:
@@ -36,31 +133,75 @@ class ListingService:
         if district:
             query = query.where(filter=firestore.FieldFilter("location.district", "==", district))
         
-        # If searching, we fetch a bit more to ensure we find matches
-        limit = 1000 if search_text else 50
-        docs = query.limit(limit).stream()
+        # Stale results are keyed without the search text, which is applied afterwards
+        docs = read_query("listings.feed", query.limit(limit), stale_key=(owner_id, category, type, city, district, limit))
         results = [doc.to_dict() for doc in docs]
-        
+        return self._search(results, search_text)
+
+    @staticmethod
+    def _search(results, search_text):
         if search_text:
-            st = search_text.lower()
             results = [
                 item for item in results 
-                if st in item.get('title', '').lower() or st in item.get('description', '').lower()
+                if search_text in item.get('title', '').lower() or search_text in item.get('description', '').lower()
             ]
             
         return results
 
+    def get_listings_page(self, plan: FeedQuery, limit: int = 50, search_text: Optional[str] = None):
+        """
+        One page of a sorted feed: (items, next_cursor), next_cursor None on the last page.
+        Firestore does the filtering and ordering, so a page reads `limit` docs;
+        a search scans up to 1000 docs in sort order and returns the first matches.
+        """
+        search_text = search_text.strip().lower() if search_text and search_text.strip() else None
+        items = self._flights.do(('page', plan, limit, search_text), lambda: self._query_page(plan, limit, search_text))
+        return items, None if search_text else page_cursor(items, limit, [plan.field])
+
+    def _query_page(self, plan: FeedQuery, limit: int, search_text: Optional[str]):
+        window = 1000 if search_text else limit
+        if listing_replica.ready:
+            items = listing_replica.ordered(
+                window, plan.field, plan.direction == DESCENDING, plan.after,
+                low=plan.min_price, high=plan.max_price, filters=dict(plan.filters),
+            )
+        else:
+            query = self.collection
+            for path, value in plan.filters:
+                query = query.where(filter=firestore.FieldFilter(path, "==", value))
+            if plan.min_price is not None:
+                query = query.where(filter=firestore.FieldFilter("price", ">=", plan.min_price))
+            if plan.max_price is not None:
+                query = query.where(filter=firestore.FieldFilter("price", "<=", plan.max_price))
+            query = query.order_by(plan.field, direction=plan.direction).order_by("__name__", direction=plan.direction)
+            if plan.after:
+                query = query.start_after({plan.field: plan.after[0], "__name__": plan.after[1]})
+            items = [doc.to_dict() for doc in read_query("listings.page", query.limit(window))]
+        return self._search(items, search_text)[:limit]
+
     def get_listings_by_location(self, city: str, limit: int = 50):
-        query = self.collection.where(filter=firestore.FieldFilter("location.city", "==", city))
-        docs = query.limit(limit).stream()
+        return self._flights.do(('city', city, limit), lambda: self._query_by_location(city, limit))
+
+    def _query_by_location(self, city: str, limit: int):
+        if listing_replica.ready:
+            return listing_replica.query(limit, city=city, status=FEED_STATUS)
+        query = (self.collection
+                 .where(filter=firestore.FieldFilter("location.city", "==", city))
+                 .where(filter=firestore.FieldFilter("status", "==", FEED_STATUS)))
+        docs = read_query("listings.city", query.limit(limit), stale_key=(city, limit))
         return [doc.to_dict() for doc in docs]
 
     def get_random_listings(self, limit: int = 50):
         # Fetch a larger pool of recent listings (e.g. 100) and sample from them
         # Note: This is a simple implementation. For large datasets, use a better approach.
-        query = self.collection.order_by("created_at", direction=firestore.Query.DESCENDING).limit(100)
-        docs = query.stream()
-        all_listings = [doc.to_dict() for doc in docs]
+        if listing_replica.ready:
+            all_listings = listing_replica.newest(100, status=FEED_STATUS)
+        else:
+            query = (self.collection
+                     .where(filter=firestore.FieldFilter("status", "==", FEED_STATUS))
+                     .order_by("created_at", direction=firestore.Query.DESCENDING).limit(100))
+            docs = read_query("listings.newest", query, stale_key="newest")
+            all_listings = [doc.to_dict() for doc in docs]
         
         if len(all_listings) <= limit:
             return all_listings
@@ -68,47 +209,165 @@ class ListingService:
         return random.sample(all_listings, limit)
 
     def get_listing(self, listing_id: str):
-        doc = self.collection.document(listing_id).get()
+        if listing_replica.ready:
+            listing = listing_replica.get(listing_id)
+            if listing is not None:
+                return listing
+        return self._flights.do(('doc', listing_id), lambda: self._fetch_listing(listing_id))
+
+    def _fetch_listing(self, listing_id: str):
+        doc = read_doc("listings.get", self.collection.document(listing_id), stale=True)
+        if doc.exists:
+            return doc.to_dict()
+        # Archived listings keep their id, so old links and favorites still resolve
+        doc = read_doc("archived_listings.get", self.archive.document(listing_id), stale=True)
         if doc.exists:
             return doc.to_dict()
         return None
 
-    def create_listing(self, listing: ListingCreate, owner_uid: str):
-        # Fetch user details for denormalization
-        owner = user_service.get_user(owner_uid)
-        if not owner:
-            # Fallback or error? Let's assume user must exist
-            raise ValueError("User not found")
+    @staticmethod
+    def _set_images(data: dict, image_ids: Optional[List[str]]):
+        # Stored `images` are the feed card variant; detail views map image_ids to full size
+        if image_ids is not None:
+            data['image_ids'] = image_ids
+            data['images'] = image_urls(data, "card")
 
+    def get_many(self, listing_ids: List[str]) -> List[dict]:
+        """Existing listings among listing_ids, in the given order, in one batched read (two if some are archived)."""
+        if not listing_ids:
+            return []
+        found = {}
+        if listing_replica.ready:
+            found = {i: doc for i in listing_ids if (doc := listing_replica.get(i)) is not None}
+        missing = [self.collection.document(i) for i in listing_ids if i not in found]
+        if missing:
+            found.update({snap.id: snap.to_dict() for snap in read_all("listings.get_many", self.db, missing) if snap.exists})
+        archived = [self.archive.document(i) for i in listing_ids if i not in found]
+        if archived:
+            found.update({snap.id: snap.to_dict() for snap in read_all("archived_listings.get_many", self.db, archived) if snap.exists})
+        return [found[i] for i in listing_ids if i in found]
+
+    def _build_listing(self, listing: ListingCreate, owner: dict, image_ids: Optional[List[str]] = None):
         listing_data = listing.model_dump()
         listing_id = f"listing_{uuid.uuid4().hex[:8]}"
         
+        self._set_images(listing_data, image_ids)
         listing_data['id'] = listing_id
-        listing_data['owner_id'] = owner_uid
+        listing_data['owner_id'] = owner['uid']
         listing_data['owner_name'] = owner.get('display_name', 'Unknown')
         listing_data['owner_avatar'] = owner.get('photo_url')
         listing_data['created_at'] = datetime.utcnow()
         listing_data['updated_at'] = datetime.utcnow()
-        
-        self.collection.document(listing_id).set(listing_data)
         return listing_data
 
-    def update_listing(self, listing_id: str, listing_update: ListingUpdate, owner_uid: str):
-        doc_ref = self.collection.document(listing_id)
-        doc = doc_ref.get()
-        
-        if not doc.exists:
-            return None
-            
-        current_data = doc.to_dict()
-        if current_data['owner_id'] != owner_uid:
-            raise PermissionError("Not authorized to update this listing")
+    def create_listing(self, listing: ListingCreate, owner_uid: str, image_ids: Optional[List[str]] = None,
+                       image_versions: Optional[Dict[str, datetime]] = None):
+        # Fetch user details for denormalization
+        owner = user_service.get_user(owner_uid)
+        if not owner:
+            # Fallback or error? Let's assume user must exist
+            raise ValueError("User not found")
+
+        listing_data = self._build_listing(listing, owner, image_ids)
+        batch = self.db.batch()
+        batch.set(self.collection.document(listing_data['id']), listing_data)
+        image_service.attach_to_batch(batch, image_ids or [], listing_data['id'], image_versions)
+        facet_service.add_to_batch(batch, facet_service.deltas(None, listing_data))
+        self._commit_claiming(batch)
+        self._after_write()
+        return listing_data
 
+    def create_listings_bulk(self, listings: List[ListingCreate], owner: dict, image_ids: Optional[List[List[str]]] = None,
+                             image_versions: Optional[Dict[str, datetime]] = None):
+        """
+        Write already-validated listings for one (already resolved) owner,
+        in batched commits of up to BATCH_LIMIT. Returns the new ids in input order.
+        image_ids, if given, holds each listing's stored images; image_versions is
+        check_usable's result for the ones that were already uploaded.
+        """
+        ids = []
+        batch, writes, deltas = self.db.batch(), 0, {}
+        for i, listing in enumerate(listings):
+            listing_images = image_ids[i] if image_ids else []
+            # The listing itself plus one write per image it claims
+            if writes and writes + 1 + len(listing_images) > BULK_CHUNK:
+                facet_service.add_to_batch(batch, deltas)
+                self._commit_claiming(batch)
+                batch, writes, deltas = self.db.batch(), 0, {}
+            listing_data = self._build_listing(listing, owner, image_ids[i] if image_ids else None)
+            batch.set(self.collection.document(listing_data['id']), listing_data)
+            image_service.attach_to_batch(batch, listing_images, listing_data['id'], image_versions)
+            facet_service.merge(deltas, facet_service.deltas(None, listing_data))
+            writes += 1 + len(listing_images)
+            ids.append(listing_data['id'])
+        if writes:
+            facet_service.add_to_batch(batch, deltas)
+            self._commit_claiming(batch)
+        if ids:
+            self._after_write()
+        return ids
+
+    def iter_listings(self, owner_id: str):
+        """
+        An owner's listings (archived ones last), one doc at a time. Read in pages of
+        EXPORT_PAGE, each under the query deadline and breaker, so a long export holds
+        one page in memory and no single RPC runs unbounded.
+        """
+        for collection in (self.collection, self.archive):
+            query = (collection.where(filter=firestore.FieldFilter("owner_id", "==", owner_id))
+                     .order_by("__name__").limit(EXPORT_PAGE))
+            page = read_query(f"{collection.id}.export", query)
+            while page:
+                for doc in page:
+                    yield doc.to_dict()
+                if len(page) < EXPORT_PAGE:
+                    break
+                page = read_query(f"{collection.id}.export", query.start_after(page[-1]))
+
+    def update_listing(self, listing_id: str, listing_update: ListingUpdate, owner_uid: str, image_ids: Optional[List[str]] = None,
+                       image_versions: Optional[Dict[str, datetime]] = None):
         update_data = listing_update.model_dump(exclude_unset=True)
-        if update_data:
-            update_data['updated_at'] = datetime.utcnow()
-            doc_ref.update(update_data)
-            
-        return doc_ref.get().to_dict()
+        self._set_images(update_data, image_ids)
+
+        def build_patch(current_data):
+            if current_data['owner_id'] != owner_uid:
+                raise PermissionError("Not authorized to update this listing")
+            if not update_data:
+                return {}
+            return {**update_data, 'updated_at': datetime.utcnow()}
+
+        def side_writes(batch, current_data, patch):
+            facet_service.add_to_batch(batch, facet_service.deltas(current_data, apply_patch(current_data, patch)))
+            if 'image_ids' in patch:
+                # Images dropped from the listing aren't referenced anywhere else
+                before, after = current_data.get('image_ids', []), patch['image_ids']
+                image_service.delete_to_batch(batch, [i for i in before if i not in after])
+                image_service.attach_to_batch(batch, [i for i in after if i not in before], listing_id, image_versions)
+
+        # Ownership check + write in one conditional update; the response is pre-image + patch
+        result = guarded_update(self.collection.document(listing_id), build_patch, extra_writes=side_writes)
+        if result is None:
+            # Archived listings are read-only; say so instead of 404ing a listing the owner can still see
+            archived = read_doc("archived_listings.get", self.archive.document(listing_id), field_paths=['owner_id'])
+            if archived.exists and archived.to_dict().get('owner_id') == owner_uid:
+                raise ValueError("Archived listings can't be edited")
+            return None
+        current_data, patch = result
+        if patch:
+            self._after_write()
+        return apply_patch(current_data, patch)
+
+    @staticmethod
+    def _commit_claiming(batch):
+        # A claimed image changed since check_usable read it (another listing took it)
+        try:
+            batch.commit(**write_deadline())
+        except exceptions.FailedPrecondition:
+            raise WriteConflict("Images were claimed concurrently")
+
+    def _after_write(self):
+        # Reads already in flight may predate this write; don't hand them to new callers
+        self._flights.forget()
+        feed_cache.clear()
 
 listing_service = ListingService()
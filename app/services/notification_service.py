@@ -1,6 +1,7 @@
 from firebase_admin import firestore
 from app.core.config import get_db
 from app.models.notification import NotificationCreate
+from app.core.db import guarded_update, apply_patch, read_query, write_deadline
 from datetime import datetime
 import uuid
 
@@ -25,26 +26,26 @@ class NotificationService:
         notif_data = notification.model_dump()
         notif_data['id'] = f"notif_{uuid.uuid4().hex[:8]}"
         notif_data['is_read'] = False
-        notif_data['created_at'] = datetime.utcnow()
+        notif_data['created_at'] = notif_data['updated_at'] = datetime.utcnow()
         
-        self.collection.document(notif_data['id']).set(notif_data)
+        self.collection.document(notif_data['id']).set(notif_data, **write_deadline())
         return notif_data
 
     def get_notifications(self, uid: str):
         query = self.collection.where(filter=firestore.FieldFilter("recipient_id", "==", uid)).order_by("created_at", direction=firestore.Query.DESCENDING)
-        docs = query.stream()
+        docs = read_query("notifications.list", query)
         return [doc.to_dict() for doc in docs]
 
     def mark_as_read(self, notification_id: str, uid: str):
-        doc_ref = self.collection.document(notification_id)
-        doc = doc_ref.get()
-        if not doc.exists:
+        def build_patch(data):
+            if data.get('recipient_id') != uid:
+                raise PermissionError("Not authorized")
+            # Already read: nothing to write
+            return {} if data.get('is_read') else {"is_read": True, "updated_at": datetime.utcnow()}
+
+        result = guarded_update(self.collection.document(notification_id), build_patch)
+        if result is None:
             return None
-        
-        if doc.get('recipient_id') != uid:
-            raise PermissionError("Not authorized")
-            
-        doc_ref.update({"is_read": True})
-        return doc_ref.get().to_dict()
+        return apply_patch(*result)
 
 notification_service = NotificationService()
@@ -0,0 +1,35 @@
+from app.core.config import get_db
+from app.core.db import read_doc
+from app.services.listing_service import listing_service
+
+class RecommendationService:
+    """
+    Serves the similar-listings lists precomputed by app.jobs.similar_listings.
+    No scoring happens here: one doc read plus one batched read of the listings.
+    """
+    def __init__(self):
+        self._db = None
+        self._collection = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = get_db()
+        return self._db
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = self.db.collection('listing_similar')
+        return self._collection
+
+    def get_similar(self, listing_id: str, limit: int = 10):
+        snap = read_doc("listing_similar.get", self.collection.document(listing_id), stale=True)
+        if not snap.exists:
+            return []
+        ids = snap.to_dict().get('ids', [])
+        # Lists are refreshed offline; skip listings that stopped being active since
+        listings = listing_service.get_many(ids)
+        return [l for l in listings if l.get('status', 'active') == 'active'][:limit]
+
+recommendation_service = RecommendationService()
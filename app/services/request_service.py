@@ -3,11 +3,19 @@ from app.core.config import get_db
 from app.models.request import RequestCreate, ListingSnapshot
 from app.services.user_service import user_service
 from app.services.listing_service import listing_service
-# cyclic import risk if chat_service imports request_service.
-# for now we will just use db directly or import inside method
+from app.services.image_service import listing_thumbnail
+# chat_service must never import request_service, or this becomes a cycle
+from app.services.chat_service import chat_service
+from app.services.stats_service import stats_service, COUNTED_STATUSES
+from app.core.db import guarded_update, apply_patch, read_doc, read_query, write_deadline
+from app.core.pagination import page_cursor
+from app.core import events
 from datetime import datetime
+from typing import Optional
 import uuid
 
+PENDING = "pending"
+
 class RequestService:
     def __init__(self):
         self._db = None
@@ -25,6 +33,13 @@ class RequestService:
             self._collection = self.db.collection('requests')
         return self._collection
 
+    def _counter_ref(self, seller_id: str):
+        # request_counters/{seller_id} = {"pending": n}, the seller's inbox badge
+        return self.db.collection('request_counters').document(seller_id)
+
+    def _count_pending(self, batch, seller_id: str, n: int):
+        batch.set(self._counter_ref(seller_id), {"pending": firestore.Increment(n)}, merge=True)
+
     def create_request(self, request_in: RequestCreate, requester_uid: str):
         # 1. Get requester info
         requester = user_service.get_user(requester_uid)
@@ -44,10 +59,12 @@ class RequestService:
         
         snapshot = ListingSnapshot(
             title=listing['title'],
-            image=listing['images'][0] if listing.get('images') else None,
-            price=listing.get('price', 0)
+            image=listing_thumbnail(listing),
+            price=listing.get('price', 0),
+            category=listing.get('category')
         )
 
+        now = datetime.utcnow()
         req_data = {
             "id": req_id,
             "listing_id": request_in.listing_id,
@@ -58,44 +75,82 @@ class RequestService:
             "seller_id": listing['owner_id'], # Optimization
             "listing_snapshot": snapshot.model_dump(),
             "message": request_in.message,
-            "status": "pending",
-            "created_at": datetime.utcnow()
+            "status": PENDING,
+            "created_at": now,
+            "updated_at": now,
         }
         
-        self.collection.document(req_id).set(req_data)
+        batch = self.db.batch()
+        batch.set(self.collection.document(req_id), req_data)
+        self._count_pending(batch, req_data['seller_id'], 1)
+        batch.commit(**write_deadline())
         return req_data
 
-    def get_requests(self, role: str, uid: str):
+    def get_requests(self, role: str, uid: str, status: Optional[str] = None, limit: int = 50, cursor: Optional[dict] = None):
+        """
+        One page of a user's requests, newest first. Returns (items, next_cursor);
+        next_cursor is None on the last page. Each (role, status) combination is
+        served by a composite index in firestore.indexes.json.
+        """
         # role: "requester" (outbound) or "seller" (inbound)
         if role == "requester":
             query = self.collection.where(filter=firestore.FieldFilter("requester_id", "==", uid))
         elif role == "seller":
             query = self.collection.where(filter=firestore.FieldFilter("seller_id", "==", uid))
         else:
-            return []
-            
-        docs = query.stream()
-        return [doc.to_dict() for doc in docs]
+            return [], None
+        if status:
+            query = query.where(filter=firestore.FieldFilter("status", "==", status))
+
+        # Doc id breaks ties between requests created in the same instant
+        query = query.order_by("created_at", direction=firestore.Query.DESCENDING)
+        query = query.order_by("__name__", direction=firestore.Query.DESCENDING)
+        if cursor:
+            query = query.start_after(cursor)
+        items = [doc.to_dict() for doc in read_query("requests.list", query.limit(limit))]
+        return items, page_cursor(items, limit, ["created_at"])
+
+    def get_pending_count(self, seller_id: str) -> int:
+        snap = read_doc("request_counters.get", self._counter_ref(seller_id))
+        if not snap.exists:
+            return 0
+        return max(0, snap.to_dict().get('pending', 0))
 
     def update_status(self, request_id: str, status: str, user_uid: str):
-        doc_ref = self.collection.document(request_id)
-        doc = doc_ref.get()
-        if not doc.exists:
+        def build_patch(data):
+            # Only seller can approve/reject
+            if data['seller_id'] != user_uid:
+                raise PermissionError("Not authorized")
+            if data.get('status') == status:
+                return {}
+            return {"status": status, "updated_at": datetime.utcnow()}
+
+        def side_writes(batch, data, patch):
+            # Moving into or out of pending adjusts the seller's badge in the same commit
+            was_pending = data.get('status') == PENDING
+            if was_pending != (patch['status'] == PENDING):
+                self._count_pending(batch, data['seller_id'], -1 if was_pending else 1)
+            # So is the stats credit owed for a completed exchange
+            if patch['status'] in COUNTED_STATUSES and data.get('status') not in COUNTED_STATUSES:
+                stats_service.queue_exchange(batch, data)
+
+        result = guarded_update(self.collection.document(request_id), build_patch, extra_writes=side_writes)
+        if result is None:
             return None
-        
-        data = doc.to_dict()
-        
-        # Only seller can approve/reject
-        if data['seller_id'] != user_uid:
-            raise PermissionError("Not authorized")
-            
-        doc_ref.update({"status": status})
+        data, patch = result
+        updated = apply_patch(data, patch)
         
         # If approved, trigger chat creation
         if status == "approved":
-            from app.services.chat_service import chat_service
             chat_service.create_chat(data)
+
+        if data.get('status') != status:
+            events.emit(events.REQUEST_STATUS_CHANGED, {
+                "request": updated,
+                "previous_status": data.get('status'),
+                "status": status,
+            })
             
-        return doc_ref.get().to_dict()
+        return updated
 
 request_service = RequestService()
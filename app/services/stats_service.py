@@ -0,0 +1,115 @@
+from firebase_admin import firestore
+from google.api_core import exceptions
+from app.core.config import get_db
+from app.core.db import write_deadline
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rough kg CO2e avoided by reusing an item instead of buying new, per listing category
+CARBON_KG_BY_CATEGORY = {
+    "furniture": 45.0,
+    "electronics": 25.0,
+    "clothing": 6.0,
+    "books": 1.5,
+}
+DEFAULT_CARBON_KG = 3.0
+
+# A request counts towards stats the first time it reaches one of these
+COUNTED_STATUSES = {"approved", "completed"}
+
+class StatsService:
+    def __init__(self):
+        self._db = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = get_db()
+        return self._db
+
+    @staticmethod
+    def estimate_carbon(category: str) -> float:
+        return CARBON_KG_BY_CATEGORY.get((category or "").lower(), DEFAULT_CARBON_KG)
+
+    def _category(self, request: dict):
+        category = (request.get('listing_snapshot') or {}).get('category')
+        if category:
+            return category
+        # Requests created before the snapshot carried the category
+        from app.services.listing_service import listing_service
+        listing = listing_service.get_listing(request['listing_id'])
+        return listing.get('category') if listing else None
+
+    def _outbox_ref(self, request_id: str):
+        return self.db.collection('stats_outbox').document(request_id)
+
+    def queue_exchange(self, batch, request: dict):
+        """
+        Queue stats_outbox/{request_id} in the caller's batch (the status change itself),
+        so an exchange is owed as soon as the status commits, whatever happens to the
+        event handler. record_exchange settles it; app/jobs/credit_exchanges.py
+        retries whatever is left.
+        """
+        batch.set(self._outbox_ref(request['id']), {
+            "id": request['id'],
+            "seller_id": request['seller_id'],
+            "requester_id": request['requester_id'],
+            "listing_id": request.get('listing_id'),
+            "listing_snapshot": request.get('listing_snapshot'),
+            "created_at": datetime.utcnow(),
+        })
+
+    def record_exchange(self, request: dict) -> bool:
+        """
+        Credit the seller (donated) and the requester (received) for one request.
+        The ledger doc stats_ledger/{request_id} is created in the same batch as the
+        increments, so a replay fails on create() and nothing is counted twice.
+        Either way the request's outbox entry is cleared.
+        Returns False if this request was already counted.
+        """
+        carbon = self.estimate_carbon(self._category(request))
+        users = self.db.collection('users')
+        batch = self.db.batch()
+        batch.create(self.db.collection('stats_ledger').document(request['id']), {
+            "request_id": request['id'],
+            "seller_id": request['seller_id'],
+            "requester_id": request['requester_id'],
+            "carbon_saved": carbon,
+            "created_at": datetime.utcnow(),
+        })
+        now = datetime.utcnow()
+        batch.update(users.document(request['seller_id']), {
+            "stats.items_donated": firestore.Increment(1),
+            "stats.carbon_saved": firestore.Increment(carbon),
+            "updated_at": now,
+        })
+        batch.update(users.document(request['requester_id']), {
+            "stats.items_received": firestore.Increment(1),
+            "stats.carbon_saved": firestore.Increment(carbon),
+            "updated_at": now,
+        })
+        batch.delete(self._outbox_ref(request['id']))
+        try:
+            batch.commit(**write_deadline())
+        except exceptions.AlreadyExists:
+            self._outbox_ref(request['id']).delete(**write_deadline())
+            return False
+        return True
+
+    def settle(self, request: dict) -> bool:
+        """record_exchange for an outbox entry; one that can never be credited is dropped."""
+        try:
+            return self.record_exchange(request)
+        except exceptions.NotFound:
+            logger.warning("Stats not recorded for %s: a participant's user doc is missing", request['id'])
+            self._outbox_ref(request['id']).delete(**write_deadline())
+            return False
+
+    def on_request_status_changed(self, event: dict):
+        # Only a fast path: a failure here leaves the outbox entry for the job
+        if event['status'] in COUNTED_STATUSES:
+            self.settle(event['request'])
+
+stats_service = StatsService()
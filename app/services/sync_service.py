@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from firebase_admin import firestore
+from app.core.config import get_db, settings
+from app.core.db import executor, read_query, TOMBSTONES
+from app.core.pagination import encode_cursor
+from app.services.listing_service import listing_service
+from app.services.image_service import listing_thumbnail
+
+def _changed(query, after: Optional[datetime]):
+    if after is not None:
+        query = query.where(filter=firestore.FieldFilter("updated_at", ">", after))
+    return [doc.to_dict() for doc in read_query("sync.changed", query)]
+
+class SyncService:
+    """
+    Delta sync for offline-first clients. Every synced doc carries updated_at and
+    every delete leaves a tombstone, so one sync costs a read per changed doc
+    (plus one per query when nothing changed) instead of a read per item.
+    """
+    def __init__(self):
+        self._db = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = get_db()
+        return self._db
+
+    def _where(self, collection: str, field: str, op: str, value):
+        return self.db.collection(collection).where(filter=firestore.FieldFilter(field, op, value))
+
+    def _listings(self, uid: str, after: Optional[datetime]) -> List[dict]:
+        return _changed(self._where('listings', 'owner_id', '==', uid), after)
+
+    def _favorites(self, uid: str, after: Optional[datetime]) -> List[dict]:
+        # Membership changes only; edits to a favorited listing show up on its next read
+        favorites = _changed(self.db.collection('users').document(uid).collection('favorites'), after)
+        favorites.sort(key=lambda f: f.get('created_at') or datetime.min, reverse=True)
+        return listing_service.get_many([f['listing_id'] for f in favorites])
+
+    def _chats(self, uid: str, after: Optional[datetime]) -> List[dict]:
+        chats = _changed(self._where('chats', 'participants', 'array_contains', uid), after)
+        listings = {l['id']: l for l in listing_service.get_many(list({c['listing_id'] for c in chats if c.get('listing_id')}))}
+        for chat in chats:
+            listing = listings.get(chat.get('listing_id'))
+            if listing:
+                chat['listing_title'] = listing.get('title')
+                chat['listing_image'] = listing_thumbnail(listing)
+        return chats
+
+    def _requests(self, uid: str, after: Optional[datetime]) -> List[dict]:
+        # Outbound and inbound; a request is never both
+        return (_changed(self._where('requests', 'requester_id', '==', uid), after)
+                + _changed(self._where('requests', 'seller_id', '==', uid), after))
+
+    def _notifications(self, uid: str, after: Optional[datetime]) -> List[dict]:
+        return _changed(self._where('notifications', 'recipient_id', '==', uid), after)
+
+    def _deleted(self, uid: str, after: datetime) -> Dict[str, List[str]]:
+        query = (self._where(TOMBSTONES, 'uid', '==', uid)
+                 .where(filter=firestore.FieldFilter("deleted_at", ">", after)))
+        deleted: Dict[str, List[str]] = {}
+        for doc in read_query("tombstones.since", query):
+            data = doc.to_dict()
+            deleted.setdefault(data['collection'], []).append(data['doc_id'])
+        return deleted
+
+    def sync(self, uid: str, since: Optional[datetime]) -> dict:
+        """
+        Everything in the user's scope created, updated or deleted after `since`
+        (the as_of of their previous sync), plus the token for the next call.
+        No since, or one older than the tombstone retention, gets a full sync:
+        every doc and no deletions, and the client replaces its local copy.
+        Changes are upserts; the overlap window means a doc can come back twice.
+        """
+        as_of = datetime.utcnow()
+        if since is not None and since.tzinfo is not None:
+            # Tokens we issue are naive UTC; a hand-made one may carry an offset
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        full = since is None or since < as_of - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+        # Writers stamp updated_at with their own clock, so look a little further back than the token
+        after = None if full else since - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+
+        scopes = {
+            "listings": self._listings,
+            "favorites": self._favorites,
+            "chats": self._chats,
+            "requests": self._requests,
+            "notifications": self._notifications,
+        }
+        futures = {name: executor.submit(fn, uid, after) for name, fn in scopes.items()}
+        deleted = executor.submit(self._deleted, uid, after) if not full else None
+        return {
+            "token": encode_cursor({"as_of": as_of}),
+            "full": full,
+            "changes": {name: future.result() for name, future in futures.items()},
+            "deleted": deleted.result() if deleted else {},
+        }
+
+sync_service = SyncService()
@@ -1,4 +1,6 @@
+from google.api_core import exceptions
 from app.core.config import get_db
+from app.core.db import apply_patch, delete_with_tombstone, clear_tombstone, guarded_update, read_doc, read_query, write_deadline
 from app.models.user import UserCreate, UserUpdate
 from datetime import datetime
 
@@ -19,15 +21,16 @@ class UserService:
             self._collection = self.db.collection('users')
         return self._collection
 
-    def get_user(self, uid: str):
-        doc = self.collection.document(uid).get()
+    def get_user(self, uid: str, stale: bool = True):
+        """The user doc, or None. stale=False never answers from the last good copy (authorization)."""
+        doc = read_doc("users.get", self.collection.document(uid), stale=stale)
         if doc.exists:
             return doc.to_dict()
         return None
 
     def create_user(self, user: UserCreate):
         user_data = user.model_dump()
-        user_data['created_at'] = datetime.utcnow()
+        user_data['created_at'] = user_data['updated_at'] = datetime.utcnow()
         user_data['is_verified'] = False
         user_data['stats'] = {
             "carbon_saved": 0,
@@ -35,37 +38,49 @@ class UserService:
             "items_received": 0
         }
         
-        self.collection.document(user.uid).set(user_data)
+        self.collection.document(user.uid).set(user_data, **write_deadline())
         return user_data
 
     def update_user(self, uid: str, user_update: UserUpdate):
-        doc_ref = self.collection.document(uid)
         update_data = user_update.model_dump(exclude_unset=True)
         
-        if update_data:
-            doc_ref.update(update_data)
-        
-        return self.get_user(uid)
+        if not update_data:
+            return self.get_user(uid)
+        update_data['updated_at'] = datetime.utcnow()
+
+        # The response is pre-image + patch, read and written like the other services' updates
+        result = guarded_update(self.collection.document(uid), lambda current: update_data)
+        if result is None:
+            return None
+        return apply_patch(*result)
 
     def toggle_favorite(self, uid: str, listing_id: str):
         fav_ref = self.collection.document(uid).collection('favorites').document(listing_id)
-        doc = fav_ref.get()
-        
-        if doc.exists:
-            fav_ref.delete()
-            return False # Unliked
-        else:
-            fav_ref.set({
-                "listing_id": listing_id,
-                "created_at": datetime.utcnow()
-            })
+        now = datetime.utcnow()
+        # create() only succeeds if the doc is absent, so a like is a single commit
+        # and the existence check can't race with a concurrent toggle.
+        batch = self.db.batch()
+        batch.create(fav_ref, {
+            "listing_id": listing_id,
+            "created_at": now,
+            "updated_at": now,
+        })
+        clear_tombstone(batch, fav_ref, uid)
+        try:
+            batch.commit(**write_deadline())
             return True # Liked
+        except exceptions.AlreadyExists:
+            batch = self.db.batch()
+            delete_with_tombstone(batch, fav_ref, uid, now)
+            batch.commit(**write_deadline())
+            return False # Unliked
 
     def get_favorites(self, uid: str):
         fav_ref = self.collection.document(uid).collection('favorites').order_by('created_at', direction='DESCENDING')
-        docs = fav_ref.stream()
+        docs = read_query("favorites.list", fav_ref)
         
         favorites = []
+        # Deferred: listing_service imports user_service at module level
         from app.services.listing_service import listing_service
         
         for doc in docs:
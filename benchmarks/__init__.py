@@ -0,0 +1,20 @@
+"""
+Offline load tests for the API hot paths.
+
+    python -m benchmarks.run                                  # every scenario, default scale
+    python -m benchmarks.run -s feed_browse,search -c 32 -n 2000
+    python -m benchmarks.run --rpc-ms 5 --set CHAT_MESSAGE_BUCKETS=true
+    python -m benchmarks.compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+
+The real FastAPI app runs in-process against benchmarks.fake_firestore, seeded
+deterministically (--seed) with listings and their images, users with chats,
+messages, favorites, requests and notifications. Each scenario runs in a fresh
+process: seed, warm up, then --requests calls from --concurrency clients.
+login_storm is bcrypt bound (a few hundred ms per login), so give it a smaller -n.
+
+Reports (JSON, one per run) hold throughput, p50/p95/p99 latency, Firestore
+reads/queries/writes/commits per request and peak RSS per scenario, plus the
+commit, settings and arguments they were made with. Compare runs made with the
+same arguments on the same machine; the fake answers from memory, so --rpc-ms
+is the knob for how much Firestore round-trips should weigh.
+"""
@@ -0,0 +1,70 @@
+"""
+Compare two benchmark reports scenario by scenario:
+
+    python -m benchmarks.compare BASE.json HEAD.json
+
+Prints each metric as base -> head with the relative change. Reports made with
+different arguments, settings or machines are still compared, with a warning.
+"""
+import json
+import sys
+from typing import List, Optional, Tuple
+
+# (label, path into a scenario result, higher is better)
+METRICS: List[Tuple[str, Tuple[str, ...], bool]] = [
+    ("req/s", ("throughput_rps",), True),
+    ("p50 ms", ("latency_ms", "p50"), False),
+    ("p95 ms", ("latency_ms", "p95"), False),
+    ("p99 ms", ("latency_ms", "p99"), False),
+    ("reads/req", ("firestore_per_request", "read"), False),
+    ("writes/req", ("firestore_per_request", "write"), False),
+    ("rss MB", ("peak_rss_mb",), False),
+]
+# Changes smaller than this are reported as noise
+NOISE = 0.05
+
+def _value(result: dict, path: Tuple[str, ...]) -> Optional[float]:
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+def _change(base: float, head: float, higher_is_better: bool) -> str:
+    if base == head:
+        return "="
+    if not base:
+        return "new"
+    delta = (head - base) / base
+    if abs(delta) < NOISE:
+        return f"{delta:+.1%}"
+    better = (delta > 0) == higher_is_better
+    return f"{delta:+.1%} {'better' if better else 'WORSE'}"
+
+def main():
+    if len(sys.argv) != 3:
+        raise SystemExit(__doc__.strip())
+    with open(sys.argv[1]) as f:
+        base = json.load(f)
+    with open(sys.argv[2]) as f:
+        head = json.load(f)
+
+    print(f"base {base['meta']['commit']}{' (dirty)' if base['meta']['dirty'] else ''}  "
+          f"head {head['meta']['commit']}{' (dirty)' if head['meta']['dirty'] else ''}")
+    for key in ("args", "settings", "cpus", "python"):
+        if base["meta"].get(key) != head["meta"].get(key):
+            print(f"warning: {key} differ: {base['meta'].get(key)} vs {head['meta'].get(key)}")
+
+    for scenario in sorted(set(base["scenarios"]) | set(head["scenarios"])):
+        print(f"\n{scenario}")
+        if scenario not in base["scenarios"] or scenario not in head["scenarios"]:
+            print(f"  only in {'head' if scenario in head['scenarios'] else 'base'}")
+            continue
+        for label, path, higher_is_better in METRICS:
+            b, h = _value(base["scenarios"][scenario], path), _value(head["scenarios"][scenario], path)
+            if b is None or h is None:
+                continue
+            print(f"  {label:<11} {b:>10} -> {h:<10} {_change(b, h, higher_is_better)}")
+
+if __name__ == "__main__":
+    main()
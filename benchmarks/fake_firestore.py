@@ -0,0 +1,679 @@
+"""
+In-memory stand-in for the subset of the Firestore client the services use.
+
+Good enough to run the API offline: queries, cursors, transforms, batches,
+transactions, preconditions, collection groups and snapshot listeners.
+Every document read and write is counted in ``client.ops`` the way Firestore
+bills them (a query reads at least one document). ``latency`` adds a fixed
+delay per RPC to stand in for the network round-trip.
+
+Stored documents are never mutated in place (writes replace them), so
+snapshots share them and only to_dict()/get() copy.
+"""
+import copy
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1._helpers import ExistsOption, LastUpdateOption
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath, split_field_path
+
+DESCENDING = "DESCENDING"
+_MISSING = object()
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _split(path):
+    if isinstance(path, FieldPath):
+        return list(path.parts)
+    if path == "__name__":
+        return ["__name__"]
+    return split_field_path(path)
+
+
+def _lookup(data, parts):
+    cur = data
+    for part in parts:
+        if not isinstance(cur, dict) or part not in cur:
+            return _MISSING
+        cur = cur[part]
+    return cur
+
+
+def _sort_key(value):
+    # Firestore type ordering: null < bool < number < timestamp < string < bytes < ref < array < map
+    if value is None or value is _MISSING:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return (3, value.timestamp())
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    if isinstance(value, FakeDocumentReference):
+        return (6, value.path)
+    if isinstance(value, (list, tuple)):
+        return (7, tuple(_sort_key(v) for v in value))
+    return (8, str(value))
+
+
+def _matches(value, op, target):
+    if op == "==":
+        return value is not _MISSING and _sort_key(value) == _sort_key(target)
+    if op == "!=":
+        return value is not _MISSING and value is not None and _sort_key(value) != _sort_key(target)
+    if op == "array_contains":
+        return isinstance(value, list) and any(_sort_key(v) == _sort_key(target) for v in value)
+    if op == "array_contains_any":
+        return isinstance(value, list) and any(_sort_key(v) == _sort_key(t) for v in value for t in target)
+    if op == "in":
+        return value is not _MISSING and any(_sort_key(value) == _sort_key(t) for t in target)
+    if op == "not-in":
+        return value is not _MISSING and value is not None and all(_sort_key(value) != _sort_key(t) for t in target)
+    if value is _MISSING or value is None:
+        return False
+    a, b = _sort_key(value), _sort_key(target)
+    if a[0] != b[0]:
+        return False
+    return {"<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data, create_time=None, update_time=None):
+        self.reference = reference
+        self._data = data
+        self.create_time = create_time
+        self.update_time = update_time
+        self.read_time = _now()
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        if self._data is None:
+            return None
+        value = _lookup(self._data, _split(field))
+        if value is _MISSING:
+            raise KeyError(field)
+        return copy.deepcopy(value)
+
+    def _field(self, parts):
+        if parts == ["__name__"]:
+            return self.reference
+        return _lookup(self._data, parts)
+
+
+class _Store:
+    def __init__(self, latency=0.0):
+        self.docs = {}  # path -> (data, create_time, update_time)
+        # collection path -> {doc path: entry}, so a query only scans its own collection
+        self.by_parent = defaultdict(dict)
+        self.lock = threading.RLock()
+        self.ops = Counter()
+        self.listeners = []
+        self.latency = latency
+
+    def rpc(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def put(self, path, entry):
+        self.docs[path] = entry
+        self.by_parent[path.rpartition("/")[0]][path] = entry
+
+    def remove(self, path):
+        if self.docs.pop(path, None) is not None:
+            parent = path.rpartition("/")[0]
+            children = self.by_parent[parent]
+            children.pop(path, None)
+            if not children:
+                del self.by_parent[parent]
+
+
+class FakeDocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+
+    def __repr__(self):
+        return f"<FakeDocumentReference {self.path}>"
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    @property
+    def id(self):
+        return self.path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, name):
+        return FakeCollectionReference(self._client, f"{self.path}/{name}")
+
+    def collections(self):
+        prefix = self.path + "/"
+        names = set()
+        for path in list(self._client._store.docs):
+            if path.startswith(prefix):
+                names.add(path[len(prefix):].split("/", 1)[0])
+        return [self.collection(n) for n in sorted(names)]
+
+    def get(self, field_paths=None, transaction=None, retry=None, timeout=None):
+        if transaction is not None:
+            return next(transaction.get(self))
+        self._client._store.rpc()
+        return self._client._get(self)
+
+    def set(self, document_data, merge=False, retry=None, timeout=None):
+        return self._client._commit([("set", self, document_data, merge)])[0]
+
+    def create(self, document_data, retry=None, timeout=None):
+        return self._client._commit([("create", self, document_data, None)])[0]
+
+    def update(self, field_updates, option=None, retry=None, timeout=None):
+        return self._client._commit([("update", self, field_updates, option)])[0]
+
+    def delete(self, option=None, retry=None, timeout=None):
+        return self._client._commit([("delete", self, None, option)])[0]
+
+    def on_snapshot(self, callback):
+        return self._client._listen(FakeQuery(self.parent, filters=[(["__name__"], "==", self)]), callback, single=True)
+
+
+class FakeQuery:
+    def __init__(self, collection, filters=None, orders=None, limit=None, start=None, all_descendants=False, offset=0):
+        self._collection = collection
+        self._filters = filters or []
+        self._orders = orders or []
+        self._limit = limit
+        self._start = start
+        self._offset = offset
+        self._all_descendants = all_descendants
+
+    def _copy(self, **kw):
+        args = dict(filters=list(self._filters), orders=list(self._orders), limit=self._limit,
+                    start=self._start, all_descendants=self._all_descendants, offset=self._offset)
+        args.update(kw)
+        return FakeQuery(self._collection, **args)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if not isinstance(op_string, str):
+            # FieldFilter turns == None / != None into unary IS_NULL / IS_NOT_NULL
+            op_string = "!=" if "NOT" in op_string.name else "=="
+        return self._copy(filters=self._filters + [(_split(field_path), op_string, value)])
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(orders=self._orders + [(_split(field_path), direction)])
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def offset(self, num_to_skip):
+        return self._copy(offset=num_to_skip)
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, False))
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, True))
+
+    def select(self, field_paths):
+        return self
+
+    def _candidates(self):
+        client = self._collection._client
+        store = client._store
+        base = self._collection._path
+        out = []
+        with store.lock:
+            if self._all_descendants:
+                parents = [p for p in store.by_parent if p.rsplit("/", 1)[-1] == base]
+            else:
+                parents = [base] if base in store.by_parent else []
+            for parent in parents:
+                for path, (data, ctime, utime) in store.by_parent[parent].items():
+                    out.append(FakeDocumentSnapshot(FakeDocumentReference(client, path), data, ctime, utime))
+        return out
+
+    def _order_values(self, snap, orders):
+        return tuple(_sort_key(snap._field(parts)) for parts, _ in orders)
+
+    def _effective_orders(self):
+        orders = list(self._orders)
+        for parts, op, _ in self._filters:
+            if op in ("<", "<=", ">", ">=", "!=", "not-in") and not any(o[0] == parts for o in orders):
+                orders.insert(0, (parts, "ASCENDING"))
+        if not any(o[0] == ["__name__"] for o in orders):
+            last_dir = orders[-1][1] if orders else "ASCENDING"
+            orders.append((["__name__"], last_dir))
+        return orders
+
+    def _run(self):
+        docs = self._candidates()
+        for parts, op, value in self._filters:
+            docs = [d for d in docs if _matches(d._field(parts), op, value)]
+        for parts, _ in self._orders:
+            docs = [d for d in docs if d._field(parts) is not _MISSING]
+        orders = self._effective_orders()
+        for parts, direction in reversed(orders):
+            docs.sort(key=lambda d: _sort_key(d._field(parts)), reverse=(direction == DESCENDING))
+        if self._start is not None:
+            docs = self._apply_cursor(docs, orders)
+        docs = docs[self._offset:]
+        if self._limit is not None:
+            docs = docs[: self._limit]
+        return docs
+
+    def _apply_cursor(self, docs, orders):
+        cursor, inclusive = self._start
+        if isinstance(cursor, FakeDocumentSnapshot):
+            values = [cursor._field(parts) for parts, _ in orders]
+        elif isinstance(cursor, dict):
+            values = []
+            for parts, _ in orders:
+                value = cursor.get("__name__", _MISSING) if parts == ["__name__"] else _lookup(cursor, parts)
+                if value is _MISSING:
+                    break
+                values.append(value)
+        else:
+            values = list(cursor)
+        values = [self._collection.document(v) if parts == ["__name__"] and isinstance(v, str) else v
+                  for (parts, _), v in zip(orders, values)]
+        out = []
+        for d in docs:
+            cmp = 0
+            for (parts, direction), v in zip(orders, values):
+                if v is _MISSING:
+                    break
+                a, b = _sort_key(d._field(parts)), _sort_key(v)
+                if a != b:
+                    cmp = (1 if a > b else -1) * (-1 if direction == DESCENDING else 1)
+                    break
+            if cmp > 0 or (cmp == 0 and inclusive):
+                out.append(d)
+        return out
+
+    def stream(self, transaction=None, retry=None, timeout=None):
+        store = self._collection._client._store
+        store.rpc()
+        docs = self._run()
+        with store.lock:
+            store.ops["read"] += max(len(docs), 1)
+            store.ops["query"] += 1
+        yield from docs
+
+    def get(self, transaction=None, retry=None, timeout=None):
+        return list(self.stream())
+
+    def count(self, alias=None):
+        return _FakeCount(self)
+
+    def on_snapshot(self, callback):
+        return self._collection._client._listen(self, callback)
+
+
+class _FakeCount:
+    def __init__(self, query):
+        self._query = query
+
+    def get(self, **kwargs):
+        self._query._collection._client._store.rpc()
+        n = len(self._query._run())
+        self._query._collection._client._store.ops["read"] += 1
+
+        class _Result:
+            value = n
+        return [[_Result()]]
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, path):
+        self._client = client
+        self._path = path
+        super().__init__(self)
+
+    @property
+    def id(self):
+        return self._path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        if "/" not in self._path:
+            return None
+        return FakeDocumentReference(self._client, self._path.rsplit("/", 1)[0])
+
+    def document(self, document_id=None):
+        return FakeDocumentReference(self._client, f"{self._path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, document_data):
+        ref = self.document()
+        return ref.set(document_data), ref
+
+    def list_documents(self):
+        return [d.reference for d in self._candidates()]
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(("set", reference, document_data, merge))
+
+    def create(self, reference, document_data):
+        self._writes.append(("create", reference, document_data, None))
+
+    def update(self, reference, field_updates, option=None):
+        self._writes.append(("update", reference, field_updates, option))
+
+    def delete(self, reference, option=None):
+        self._writes.append(("delete", reference, None, option))
+
+    def commit(self, retry=None, timeout=None):
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+    def __len__(self):
+        return len(self._writes)
+
+
+class FakeTransaction(FakeWriteBatch):
+    """Works with the real ``firestore.transactional`` decorator."""
+
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._read_versions = {}
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    def _clean_up(self):
+        self._writes = []
+        self._read_versions = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().bytes
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        store = self._client._store
+        with store.lock:
+            for path, utime in self._read_versions.items():
+                current = store.docs.get(path)
+                if (current[2] if current else None) != utime:
+                    self._clean_up()
+                    raise exceptions.Aborted("Transaction contention")
+            writes = self._writes
+            self._clean_up()
+            return self._client._commit(writes)
+
+    def get(self, ref_or_query, **kwargs):
+        if isinstance(ref_or_query, FakeDocumentReference):
+            snap = self._client._get(ref_or_query)
+            self._read_versions[ref_or_query.path] = snap.update_time
+            return iter([snap])
+        return ref_or_query.stream()
+
+    def get_all(self, references, **kwargs):
+        for ref in references:
+            yield from self.get(ref)
+
+
+class FakeClient:
+    def __init__(self, latency=0.0):
+        self._store = _Store(latency)
+
+    @property
+    def ops(self):
+        return self._store.ops
+
+    def collection(self, path):
+        return FakeCollectionReference(self, path)
+
+    def collection_group(self, collection_id):
+        return FakeQuery(FakeCollectionReference(self, collection_id), all_descendants=True)
+
+    def document(self, path):
+        return FakeDocumentReference(self, path)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def bulk_writer(self):
+        return FakeWriteBatch(self)
+
+    def transaction(self, max_attempts=5, read_only=False):
+        return FakeTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def get_all(self, references, field_paths=None, transaction=None, retry=None, timeout=None):
+        self._store.rpc()
+        for ref in references:
+            yield self._get(ref)
+
+    def collections(self):
+        names = {p.split("/", 1)[0] for p in self._store.docs}
+        return [self.collection(n) for n in sorted(names)]
+
+    @staticmethod
+    def write_option(**kwargs):
+        if "last_update_time" in kwargs:
+            return LastUpdateOption(kwargs["last_update_time"])
+        return ExistsOption(kwargs["exists"])
+
+    # -- internals ---------------------------------------------------------
+
+    def _get(self, ref):
+        store = self._store
+        with store.lock:
+            store.ops["read"] += 1
+            entry = store.docs.get(ref.path)
+            if entry is None:
+                return FakeDocumentSnapshot(ref, None)
+            data, ctime, utime = entry
+            return FakeDocumentSnapshot(ref, data, ctime, utime)
+
+    def _commit(self, writes):
+        store = self._store
+        results = []
+        store.rpc()
+        with store.lock:
+            # Changes on top of store.docs (None = deleted), applied once every write checked out
+            staged = _Overlay(store.docs)
+            now = _now()
+            changed = []
+            for kind, ref, data, option in writes:
+                current = staged.get(ref.path)
+                self._check_option(ref, current, option)
+                if kind == "delete":
+                    staged.pop(ref.path, None)
+                    changed.append(ref.path)
+                    results.append(_WriteResult(now))
+                    continue
+                if kind == "create" and current is not None:
+                    raise exceptions.AlreadyExists(f"Document already exists: {ref.path}")
+                if kind == "update" and current is None:
+                    raise exceptions.NotFound(f"No document to update: {ref.path}")
+                if kind == "create" or (kind == "set" and not option):
+                    doc = {}
+                elif current is not None:
+                    doc = copy.deepcopy(current[0])
+                else:
+                    doc = {}
+                if kind == "update":
+                    for key, value in data.items():
+                        self._apply(doc, _split(key), value, now)
+                else:
+                    self._merge(doc, data, now)
+                ctime = current[1] if current is not None else now
+                staged[ref.path] = (doc, ctime, now)
+                changed.append(ref.path)
+                results.append(_WriteResult(now))
+            for path, entry in staged.changes.items():
+                if entry is None:
+                    store.remove(path)
+                else:
+                    store.put(path, entry)
+            store.ops["write"] += len(writes)
+            store.ops["commit"] += 1
+        self._notify(changed)
+        return results
+
+    @staticmethod
+    def _check_option(ref, current, option):
+        if isinstance(option, LastUpdateOption):
+            if current is None or current[2] != option._last_update_time:
+                raise exceptions.FailedPrecondition(f"Document was modified: {ref.path}")
+        elif isinstance(option, ExistsOption):
+            if option._exists and current is None:
+                raise exceptions.NotFound(f"No document: {ref.path}")
+            if not option._exists and current is not None:
+                raise exceptions.AlreadyExists(f"Document exists: {ref.path}")
+
+    def _merge(self, doc, data, now):
+        for key, value in data.items():
+            if isinstance(value, dict) and isinstance(doc.get(key), dict):
+                self._merge(doc[key], value, now)
+            elif isinstance(value, dict):
+                doc[key] = {}
+                self._merge(doc[key], value, now)
+            else:
+                self._apply(doc, [key], value, now)
+
+    def _apply(self, doc, parts, value, now):
+        cur = doc
+        for part in parts[:-1]:
+            if not isinstance(cur.get(part), dict):
+                cur[part] = {}
+            cur = cur[part]
+        key = parts[-1]
+        if value is transforms.DELETE_FIELD:
+            cur.pop(key, None)
+        elif value is transforms.SERVER_TIMESTAMP:
+            cur[key] = now
+        elif isinstance(value, transforms.Increment):
+            old = cur.get(key, 0)
+            cur[key] = (old if isinstance(old, (int, float)) else 0) + value.value
+        elif isinstance(value, transforms.ArrayUnion):
+            arr = list(cur.get(key) or [])
+            for v in value.values:
+                if v not in arr:
+                    arr.append(copy.deepcopy(v))
+            cur[key] = arr
+        elif isinstance(value, transforms.ArrayRemove):
+            cur[key] = [v for v in (cur.get(key) or []) if v not in value.values]
+        elif isinstance(value, dict):
+            cur[key] = {}
+            self._merge(cur[key], value, now)
+        else:
+            cur[key] = copy.deepcopy(value)
+
+    def _listen(self, query, callback, single=False):
+        watch = _FakeWatch(self, query, callback, single)
+        with self._store.lock:
+            self._store.listeners.append(watch)
+        watch._fire(initial=True)
+        return watch
+
+    def _notify(self, paths):
+        for watch in list(self._store.listeners):
+            watch._fire(paths=paths)
+
+
+class _Overlay:
+    """Pending writes of one commit over the stored docs: reads see them, the store doesn't until applied."""
+    _DELETED = None
+
+    def __init__(self, docs):
+        self._docs = docs
+        self.changes = {}
+
+    def get(self, path):
+        if path in self.changes:
+            return self.changes[path]
+        return self._docs.get(path)
+
+    def pop(self, path, default=None):
+        current = self.get(path)
+        self.changes[path] = self._DELETED
+        return current if current is not None else default
+
+    def __setitem__(self, path, entry):
+        self.changes[path] = entry
+
+
+class _WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class _Change:
+    def __init__(self, type_name, document):
+        self.type = type("ChangeType", (), {"name": type_name})()
+        self.document = document
+
+
+class _FakeWatch:
+    def __init__(self, client, query, callback, single):
+        self._client = client
+        self._query = query
+        self._callback = callback
+        self._single = single
+        self._known = {}
+
+    def _fire(self, initial=False, paths=None):
+        docs = self._query._run()
+        current = {d.reference.path: d for d in docs}
+        changes = []
+        for path, snap in current.items():
+            if path not in self._known:
+                changes.append(_Change("ADDED", snap))
+            elif snap.update_time != self._known[path]:
+                changes.append(_Change("MODIFIED", snap))
+        for path in self._known:
+            if path not in current:
+                changes.append(_Change("REMOVED", FakeDocumentSnapshot(FakeDocumentReference(self._client, path), None)))
+        self._known = {p: s.update_time for p, s in current.items()}
+        if changes or initial:
+            self._callback(list(current.values()), changes, _now())
+
+    def unsubscribe(self):
+        with self._client._store.lock:
+            if self in self._client._store.listeners:
+                self._client._store.listeners.remove(self)
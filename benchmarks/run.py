@@ -0,0 +1,199 @@
+"""
+Run benchmark scenarios and write a JSON report; see the benchmarks package docstring.
+Each scenario runs in its own process, seeding included, so peak RSS and caches
+are per scenario.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+RESULTS = ROOT / "benchmarks" / "results"
+# Settings every run uses unless --set overrides them: the per-caller rate limit
+# and load shedding would measure the limiter, not the code behind it
+DEFAULT_ENV = {"RATE_LIMIT_ENABLED": "false", "MAX_IN_FLIGHT": "0"}
+OPS = ("read", "query", "write", "commit")
+
+# The fake the current process runs against
+_client = None
+
+def percentile(ordered: List[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+def _install_fake(latency: float):
+    """Point firebase_admin at the in-memory fake; must run before the app is imported."""
+    import firebase_admin
+    from firebase_admin import firestore
+    from benchmarks.fake_firestore import FakeClient
+    client = FakeClient(latency=latency)
+    firestore.client = lambda *args, **kwargs: client
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    # Readiness probes the credential; there is none offline
+    firebase_admin.get_app = lambda *args, **kwargs: SimpleNamespace(credential=SimpleNamespace(get_access_token=lambda: None))
+    return client
+
+async def _drive(app, data, scenario, concurrency: int, requests: int, warmup: int, seed: int) -> dict:
+    import httpx
+    from app.core.security import create_access_token
+    from benchmarks.scenarios import SCENARIOS, Session
+
+    action = SCENARIOS[scenario]
+    users = [uid for uid in data.users if data.chats.get(uid)]
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as http:
+        sessions = []
+        for n in range(concurrency):
+            rng = random.Random(seed * 1000 + n)
+            uid = rng.choice(users)
+            sessions.append(Session(http, data, uid, create_access_token({"sub": uid}), rng))
+
+        async def run(target: int):
+            done = 0
+
+            async def client(session):
+                nonlocal done
+                while done < target:
+                    before = len(session.latencies)
+                    await action(session)
+                    done += len(session.latencies) - before
+
+            await asyncio.gather(*(client(s) for s in sessions))
+
+        await run(warmup)
+        for s in sessions:
+            s.latencies, s.errors = [], 0
+        ops_before = dict(_client.ops)
+        started = time.perf_counter()
+        await run(requests)
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(l for s in sessions for l in s.latencies)
+    count = len(latencies)
+    ops = {op: (_client.ops[op] - ops_before.get(op, 0)) / count for op in OPS}
+    return {
+        "requests": count,
+        "errors": sum(s.errors for s in sessions),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(count / elapsed, 1),
+        "latency_ms": {
+            "mean": round(sum(latencies) / count * 1000, 2),
+            **{f"p{p}": round(percentile(latencies, p) * 1000, 2) for p in (50, 95, 99)},
+            "max": round(latencies[-1] * 1000, 2),
+        },
+        "firestore_per_request": {op: round(value, 2) for op, value in ops.items()},
+    }
+
+def run_scenario(scenario: str, args) -> dict:
+    """Seed a fresh fake and run one scenario in this process."""
+    global _client
+    _client = _install_fake(args.rpc_ms / 1000)
+    from app.main import app
+    from app.core.config import get_db
+    from benchmarks.seed import SCALES, seed
+
+    started = time.perf_counter()
+    data = seed(get_db(), random.Random(args.seed), **SCALES[args.scale])
+    seeded = time.perf_counter() - started
+
+    async def main():
+        async with app.router.lifespan_context(app):
+            return await _drive(app, data, scenario, args.concurrency, args.requests, args.warmup, args.seed)
+
+    result = asyncio.run(main())
+    result["seed_seconds"] = round(seeded, 2)
+    result["docs"] = len(_client._store.docs)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["peak_rss_mb"] = round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return result
+
+def _git(*cmd) -> str:
+    try:
+        return subprocess.run(["git", *cmd], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def _child_args(args, scenario: str) -> List[str]:
+    argv = [sys.executable, "-m", "benchmarks.run", "--child", scenario,
+            "-c", str(args.concurrency), "-n", str(args.requests), "--warmup", str(args.warmup),
+            "--seed", str(args.seed), "--scale", args.scale, "--rpc-ms", str(args.rpc_ms)]
+    for item in args.set:
+        argv += ["--set", item]
+    return argv
+
+def main():
+    from benchmarks.scenarios import SCENARIOS
+    from benchmarks.seed import SCALES
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-s", "--scenarios", default=",".join(SCENARIOS), help="comma separated, default all")
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-n", "--requests", type=int, default=1000, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scale", choices=SCALES, default="default")
+    parser.add_argument("--rpc-ms", type=float, default=0.0, help="simulated Firestore round-trip per RPC")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="app setting, e.g. LISTING_REPLICA=true")
+    parser.add_argument("--out", help="report path (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    env = {**DEFAULT_ENV, **dict(item.split("=", 1) for item in args.set)}
+    os.environ.update(env)
+
+    if args.child:
+        print(json.dumps(run_scenario(args.child, args)))
+        return
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    results: Dict[str, dict] = {}
+    for scenario in scenarios:
+        print(f"{scenario} ...", file=sys.stderr, flush=True)
+        out = subprocess.run(_child_args(args, scenario), cwd=ROOT, capture_output=True, text=True)
+        if out.returncode != 0:
+            sys.stderr.write(out.stderr)
+            raise SystemExit(f"{scenario} failed")
+        results[scenario] = json.loads(out.stdout.strip().splitlines()[-1])
+        r = results[scenario]
+        print(f"  {r['throughput_rps']:>8} req/s  p50 {r['latency_ms']['p50']} ms  p95 {r['latency_ms']['p95']} ms  "
+              f"p99 {r['latency_ms']['p99']} ms  reads/req {r['firestore_per_request']['read']}  "
+              f"rss {r['peak_rss_mb']} MB  errors {r['errors']}", file=sys.stderr, flush=True)
+
+    commit = _git("rev-parse", "--short", "HEAD")
+    dirty = bool(_git("status", "--porcelain", "--untracked-files=no"))
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "child", "scenarios")},
+            "settings": env,
+        },
+        "scenarios": results,
+    }
+    path = Path(args.out) if args.out else RESULTS / f"{commit or 'nogit'}{'-dirty' if dirty else ''}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"Report written to {path}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Scripted client behaviour. A scenario is one user action (one or more API calls)
+made by a simulated client; the runner repeats it from every client until the
+request count is reached. Each client is one seeded user with its own RNG.
+"""
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.seed import CATEGORIES, CITIES, PASSWORD, Dataset
+
+class Session:
+    """One simulated client: its user, auth header and state between actions, and timings of every call."""
+    def __init__(self, http: httpx.AsyncClient, data: Dataset, uid: str, token: str, rng: random.Random):
+        self.http = http
+        self.data = data
+        self.uid = uid
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.rng = rng
+        self.category: Optional[str] = None
+        self.cursor: Optional[str] = None
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    async def call(self, method: str, path: str, auth: bool = True, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self.http.request(method, path, headers=self.headers if auth else None, **kwargs)
+        self.latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors += 1
+        return response
+
+async def feed_browse(s: Session):
+    """Home feed or a filtered, sorted feed paged by cursor, then a few card thumbnails."""
+    choice = s.rng.random()
+    if choice < 0.3:
+        response = await s.call("GET", "/listings/")
+    elif choice < 0.6:
+        response = await s.call("GET", "/listings/", params={"city": s.rng.choice(list(CITIES))})
+    else:
+        # Keep paging the same category until it runs out, then pick another
+        if not s.cursor:
+            s.category = s.rng.choice(CATEGORIES)
+        params = {"category": s.category, "sort": "-created_at", "limit": 20}
+        if s.cursor:
+            params["cursor"] = s.cursor
+        response = await s.call("GET", "/listings/", params=params)
+        s.cursor = response.headers.get("x-next-cursor")
+    cards = response.json() if response.status_code == 200 else []
+    for card in cards[:3]:
+        if card.get("images"):
+            await s.call("GET", card["images"][0].rsplit("/", 1)[0] + "/thumb", auth=False)
+
+async def search(s: Session):
+    await s.call("GET", "/listings/", params={"q": s.rng.choice(s.data.words)})
+
+async def listing_detail(s: Session):
+    listing_id = s.rng.choice(s.data.listings)
+    await s.call("GET", f"/listings/{listing_id}")
+    await s.call("GET", f"/listings/{listing_id}/similar")
+
+async def open_chat(s: Session):
+    """The chat list, then one conversation."""
+    await s.call("GET", "/chats/")
+    chats = s.data.chats.get(s.uid)
+    if chats:
+        await s.call("GET", f"/chats/{s.rng.choice(chats)}/messages")
+
+async def send_message(s: Session):
+    chats = s.data.chats.get(s.uid)
+    if chats:
+        await s.call("POST", f"/chats/{s.rng.choice(chats)}/messages", json={"text": "benchmark message"})
+
+async def login_storm(s: Session):
+    await s.call("POST", "/auth/login", auth=False, json={"identifier": s.data.usernames[s.uid], "password": PASSWORD})
+
+async def inbox(s: Session):
+    """What the app loads on open besides the feed."""
+    await s.call("GET", "/notifications/")
+    await s.call("GET", "/listings/favorites")
+
+SCENARIOS: Dict[str, Callable[[Session], Awaitable[None]]] = {
+    "feed_browse": feed_browse,
+    "search": search,
+    "listing_detail": listing_detail,
+    "open_chat": open_chat,
+    "send_message": send_message,
+    "login_storm": login_storm,
+    "inbox": inbox,
+}
@@ -0,0 +1,171 @@
+"""
+Deterministic benchmark dataset, written through the services where they own a
+document's shape (listings, images, chats, requests, notifications) and as plain
+batched writes where a service would only add per-call overhead (users,
+favorites, message history).
+"""
+import io
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from PIL import Image
+
+# Every seeded account logs in with this password (hashed once: bcrypt is slow on purpose)
+PASSWORD = "benchmark-pw"
+BATCH = 400
+
+CITIES = {
+    "Istanbul": ["Kadikoy", "Besiktas", "Uskudar", "Sisli", "Fatih"],
+    "Ankara": ["Cankaya", "Kecioren", "Yenimahalle"],
+    "Izmir": ["Konak", "Karsiyaka", "Bornova"],
+    "Bursa": ["Nilufer", "Osmangazi"],
+}
+CATEGORIES = ["furniture", "electronics", "clothing", "books", "kitchen", "toys"]
+TYPES = ["donation", "sale", "support"]
+STATUSES = ["active"] * 17 + ["reserved", "completed", "archived"]
+ADJECTIVES = ["vintage", "wooden", "small", "large", "red", "blue", "used", "new", "antique", "modern"]
+NOUNS = ["sofa", "table", "lamp", "jacket", "laptop", "kettle", "bookshelf", "bicycle", "chair", "novel", "blender", "stroller"]
+PHRASES = ["hi, is this still available?", "can I pick it up tomorrow?", "sure", "thanks!", "what size is it?", "ok, see you then"]
+
+SCALES = {
+    "small": dict(users=50, listings=500, chats=4, messages=20, favorites=10, notifications=10, requests=2),
+    "default": dict(users=200, listings=3000, chats=8, messages=30, favorites=20, notifications=30, requests=3),
+    "large": dict(users=500, listings=10000, chats=12, messages=40, favorites=40, notifications=50, requests=4),
+}
+
+@dataclass
+class Dataset:
+    users: List[str] = field(default_factory=list)
+    usernames: Dict[str, str] = field(default_factory=dict)
+    listings: List[str] = field(default_factory=list)
+    # uid -> chat ids the user takes part in
+    chats: Dict[str, List[str]] = field(default_factory=dict)
+    words: List[str] = field(default_factory=lambda: ADJECTIVES + NOUNS)
+
+def _sample_image(rng: random.Random) -> bytes:
+    # Noise compresses badly, like a photo; 1200x900 is a typical phone upload after resizing
+    img = Image.frombytes("RGB", (1200, 900), rng.randbytes(1200 * 900 * 3))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+def _batched(db, items, write):
+    batch, n = db.batch(), 0
+    for item in items:
+        write(batch, item)
+        n += 1
+        if n % BATCH == 0:
+            batch.commit()
+            batch = db.batch()
+    if n % BATCH:
+        batch.commit()
+
+def seed(db, rng: random.Random, users: int, listings: int, chats: int, messages: int,
+         favorites: int, notifications: int, requests: int) -> Dataset:
+    from app.core import images
+    from app.core.security import get_password_hash
+    from app.models.chat import MessageCreate
+    from app.models.listing import ListingCreate, Location
+    from app.models.notification import NotificationCreate
+    from app.models.request import RequestCreate
+    from app.jobs.bucket_messages import convert, delete_old
+    from app.services.chat_service import BUCKETS, DOCS, chat_service
+    from app.services.image_service import image_service
+    from app.services.listing_service import listing_service
+    from app.services.notification_service import notification_service
+    from app.services.request_service import request_service
+
+    data = Dataset()
+    now = datetime.utcnow()
+    hashed = get_password_hash(PASSWORD)
+    owners: Dict[str, dict] = {}
+    for n in range(users):
+        uid = f"user_bench{n:05d}"
+        owners[uid] = {
+            "uid": uid, "email": f"bench{n}@example.com", "username": f"bench{n}",
+            "display_name": f"Bench User {n}", "hashed_password": hashed, "role": "standard",
+            "created_at": now, "updated_at": now, "is_verified": False,
+            "stats": {"carbon_saved": 0, "items_donated": 0, "items_received": 0},
+        }
+        data.users.append(uid)
+        data.usernames[uid] = f"bench{n}"
+    _batched(db, owners.values(), lambda batch, user: batch.set(db.collection('users').document(user['uid']), user))
+
+    # One transcode, stored once per listing: the bytes are shared, the documents aren't
+    variants = images.transcode(_sample_image(rng))
+    by_owner: Dict[str, List[Tuple[ListingCreate, List[str]]]] = {}
+    for n in range(listings):
+        owner = rng.choice(data.users)
+        city = rng.choice(list(CITIES))
+        title = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}"
+        listing = ListingCreate(
+            title=title.capitalize(),
+            description=f"{title} in good condition, {rng.choice(ADJECTIVES)} and {rng.choice(ADJECTIVES)}",
+            category=rng.choice(CATEGORIES), type=rng.choice(TYPES),
+            price=float(rng.randrange(0, 5000, 10)), status=rng.choice(STATUSES),
+            location=Location(lat=rng.uniform(36, 42), lng=rng.uniform(26, 45), city=city, district=rng.choice(CITIES[city])),
+        )
+        image_ids = [image_service.store(variants, owner) for _ in range(rng.choice([1, 1, 2, 3]))]
+        by_owner.setdefault(owner, []).append((listing, image_ids))
+    for owner, items in by_owner.items():
+        data.listings += listing_service.create_listings_bulk(
+            [listing for listing, _ in items], owners[owner], [ids for _, ids in items],
+        )
+
+    favorite_docs = []
+    for uid in data.users:
+        for listing_id in rng.sample(data.listings, min(favorites, len(data.listings))):
+            favorite_docs.append((uid, listing_id))
+    _batched(db, favorite_docs, lambda batch, fav: batch.set(
+        db.collection('users').document(fav[0]).collection('favorites').document(fav[1]),
+        {"listing_id": fav[1], "created_at": now, "updated_at": now},
+    ))
+
+    listing_owner = {i: listing_service.get_listing(i)['owner_id'] for i in data.listings}
+    history = []
+    for uid in data.users:
+        for listing_id in rng.sample(data.listings, min(chats, len(data.listings))):
+            seller = listing_owner[listing_id]
+            if seller == uid:
+                continue
+            chat = chat_service.create_chat(listing_id=listing_id, requester_id=uid, seller_id=seller)
+            data.chats.setdefault(uid, []).append(chat['id'])
+            data.chats.setdefault(seller, []).append(chat['id'])
+            history.append((chat['id'], [uid, seller]))
+    # Older history as plain writes; each chat's last message through the service, so
+    # the chat doc (last message, unread counts, newest bucket) ends up as it would in use
+    message_docs = []
+    for chat_id, participants in history:
+        started = now - timedelta(days=rng.randrange(1, 60))
+        for m in range(messages - 1):
+            message_docs.append((chat_id, {
+                "text": rng.choice(PHRASES), "type": "text", "media_url": None,
+                "sender_id": participants[m % 2], "created_at": started + timedelta(minutes=m),
+            }))
+    chat_messages = db.collection('chats')
+    _batched(db, message_docs, lambda batch, msg: batch.set(
+        chat_messages.document(msg[0]).collection('messages').document(), msg[1],
+    ))
+    for chat_id, participants in history:
+        chat_ref = chat_messages.document(chat_id)
+        if chat_ref.get().to_dict().get('message_layout') == BUCKETS:
+            # History older than the bucket layout, moved over by the migration job
+            chat_ref.update({"message_layout": DOCS})
+            convert(db, chat_ref)
+            delete_old(db, chat_ref)
+        chat_service.send_message(chat_id, MessageCreate(text=rng.choice(PHRASES)), rng.choice(participants))
+
+    for uid in data.users:
+        for listing_id in rng.sample(data.listings, min(requests, len(data.listings))):
+            if listing_owner[listing_id] != uid:
+                try:
+                    request_service.create_request(RequestCreate(listing_id=listing_id, message="I'd like this"), uid)
+                except ValueError:
+                    # Listing not requestable (e.g. completed) or already requested
+                    pass
+        for n in range(notifications):
+            notification_service.create_notification(NotificationCreate(
+                recipient_id=uid, type="new_message", title="New message", body=rng.choice(PHRASES),
+            ))
+    return data